@@ -1,13 +1,14 @@
 # ai/ai_module.py
 from __future__ import annotations
 
+import asyncio
 import json
 import time
 import unicodedata
 from typing import Optional, Dict, Any, List, Iterable
 
 from pydantic import BaseModel, Field, ValidationError
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from openai._exceptions import (
     APIError,
     RateLimitError,
@@ -15,15 +16,30 @@ from openai._exceptions import (
     APIConnectionError,
 )
 from config import OPENAI_API_KEY
+from ai.translation_cache import translation_cache, cache_key
 
 # ============ Конфигурация ============
 OPENAI_MODEL = "gpt-5-mini"   # ← как просил
+PROMPT_VERSION = "listing-v1"  # менять при правке промптов листингов — старый кэш перестанет совпадать
 
 if not OPENAI_API_KEY:
     raise RuntimeError("Set OPENAI_API_KEY in environment")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
 
+# AsyncOpenAI держит httpx-пул, привязанный к event loop — клиент создаётся на каждый loop
+_aclient: Optional[AsyncOpenAI] = None
+_aclient_loop = None
+
+
+def _get_aclient() -> AsyncOpenAI:
+    global _aclient, _aclient_loop
+    loop = asyncio.get_running_loop()
+    if _aclient is None or _aclient_loop is not loop:
+        _aclient = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        _aclient_loop = loop
+    return _aclient
+
 
 # ============ Схемы данных ============
 class InputData(BaseModel):
@@ -83,6 +99,10 @@ def _json_call(messages) -> dict:
             messages=messages,
         )
     )
+    return _parse_json_answer(resp)
+
+
+def _parse_json_answer(resp) -> dict:
     raw = resp.choices[0].message.content or "{}"
     try:
         return json.loads(raw)
@@ -90,6 +110,30 @@ def _json_call(messages) -> dict:
         return {}
 
 
+async def _awith_retries(fn, max_retries: int = 3, base_delay: float = 0.8):
+    attempt = 0
+    while True:
+        try:
+            return await fn()
+        except (RateLimitError, APITimeoutError, APIConnectionError, APIError):
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            await asyncio.sleep(base_delay * attempt)
+
+
+async def _ajson_call(messages) -> dict:
+    """Async-вариант _json_call (AsyncOpenAI) — не блокирует event loop на время запроса."""
+    resp = await _awith_retries(
+        lambda: _get_aclient().chat.completions.create(
+            model=OPENAI_MODEL,
+            response_format={"type": "json_object"},
+            messages=messages,
+        )
+    )
+    return _parse_json_answer(resp)
+
+
 # ============ Вспомогалки для places ============
 def _norm_key(s: str) -> str:
     return unicodedata.normalize("NFKC", s).casefold().strip()
@@ -198,38 +242,19 @@ def translate_places(places: list[str], batch_size: int = 200) -> dict[str, dict
 
 
 # ============ Основная функция: всё за один запрос ============
-def process_listing_one_call(data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Один вызов к OpenAI (без tools): извлекаем адрес/комнаты + переводы UK/EN.
-    Возвращает строго нужный JSON (приводится к Result).
-    """
-    inp = InputData(**data)
-
-    SYSTEM = (
-        "You process a Polish real-estate listing. Return ONLY JSON with keys: "
-        "{'address': str|null, 'rooms': int|null, "
-        "'translation': {'uk': {'title': str, 'description': str}, "
-        "'en': {'title': str, 'description': str}}}.\n"
-        "Address: Polish, format 'Miasto, Dzielnica, Ulica, Numer' (omit missing parts). "
-        "Rooms: integer; 'kawalerka/studio' and 'pokój do wynajęcia' = 1. "
-        "Preserve meaning, numbers, addresses in translations."
-    )
-    USER = (
-        f"City (hint): {inp.city}\n"
-        f"District (hint): {inp.district}\n"
-        f"Parsed address (hint): {inp.parsed_address}"
-        f"Title (PL): {inp.title}\n"
-        f"Description (PL): {inp.description}\n"
-        "Return ONLY the JSON object described above."
-    )
+LISTING_SYSTEM = (
+    "You process a Polish real-estate listing. Return ONLY JSON with keys: "
+    "{'address': str|null, 'rooms': int|null, "
+    "'translation': {'uk': {'title': str, 'description': str}, "
+    "'en': {'title': str, 'description': str}}}.\n"
+    "Address: Polish, format 'Miasto, Dzielnica, Ulica, Numer' (omit missing parts). "
+    "Rooms: integer; 'kawalerka/studio' and 'pokój do wynajęcia' = 1. "
+    "Preserve meaning, numbers, addresses in translations."
+)
 
-    data_json = _json_call(
-        messages=[
-            {"role": "system", "content": SYSTEM},
-            {"role": "user", "content": USER},
-        ]
-    )
 
+def _coerce_result(data_json: dict) -> Dict[str, Any]:
+    """Мягкая нормализация ответа модели и приведение к Result (бросает ValidationError)."""
     # Мягкая нормализация rooms, если пришло строкой
     rooms = data_json.get("rooms", None)
     if isinstance(rooms, str) and rooms.isdigit():
@@ -250,3 +275,234 @@ def process_listing_one_call(data: Dict[str, Any]) -> Dict[str, Any]:
         res = Result.model_validate(data_json)
 
     return res.model_dump()
+
+
+# Сокращённый промпт: адрес и комнаты уже извлечены правилами (db/pre_extract.py) — только перевод
+TRANSLATE_SYSTEM = (
+    "You translate a Polish real-estate listing. Return ONLY JSON with keys: "
+    "{'translation': {'uk': {'title': str, 'description': str}, "
+    "'en': {'title': str, 'description': str}}}.\n"
+    "Preserve meaning, numbers, addresses in translations."
+)
+
+
+def _listing_messages(data: Dict[str, Any]) -> list[dict]:
+    inp = InputData(**data)
+    if data.get("translate_only"):
+        return [
+            {"role": "system", "content": TRANSLATE_SYSTEM},
+            {"role": "user", "content": (
+                f"Title (PL): {inp.title}\n"
+                f"Description (PL): {inp.description}\n"
+                "Return ONLY the JSON object described above."
+            )},
+        ]
+
+    USER = (
+        f"City (hint): {inp.city}\n"
+        f"District (hint): {inp.district}\n"
+        f"Parsed address (hint): {inp.parsed_address}"
+        f"Title (PL): {inp.title}\n"
+        f"Description (PL): {inp.description}\n"
+        "Return ONLY the JSON object described above."
+    )
+    return [
+        {"role": "system", "content": LISTING_SYSTEM},
+        {"role": "user", "content": USER},
+    ]
+
+
+def _key_of(data: Dict[str, Any]) -> str:
+    version = PROMPT_VERSION + (":translate" if data.get("translate_only") else "")
+    return cache_key(data.get("title"), data.get("description"), version)
+
+
+def process_listing_one_call(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Один вызов к OpenAI (без tools): извлекаем адрес/комнаты + переводы UK/EN.
+    Возвращает строго нужный JSON (приводится к Result).
+    Сначала смотрит в кэш переводов по содержимому, полный результат кладёт в кэш.
+    """
+    key = _key_of(data)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+    res = _coerce_result(_json_call(messages=_listing_messages(data)))
+    if _is_complete(res):
+        translation_cache.put(key, res)
+    return res
+
+
+async def aprocess_listing_one_call(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Async-версия process_listing_one_call (AsyncOpenAI)."""
+    key = _key_of(data)
+    cached = await asyncio.to_thread(translation_cache.get, key)
+    if cached is not None:
+        return cached
+    res = _coerce_result(await _ajson_call(messages=_listing_messages(data)))
+    if _is_complete(res):
+        await asyncio.to_thread(translation_cache.put, key, res)
+    return res
+
+
+# ============ Пакетный режим: несколько листингов за один запрос ============
+BATCH_MAX_ITEMS = 6          # листингов в одном запросе
+BATCH_MAX_CHARS = 12_000     # суммарная длина title+description в одном запросе
+
+BATCH_SYSTEM = (
+    "You process several Polish real-estate listings at once. Input is a JSON array of objects "
+    "{'id', 'title', 'description', 'city', 'district', 'parsed_address'}. "
+    "Return ONLY JSON: {'items': [{'id': <same id>, 'address': str|null, 'rooms': int|null, "
+    "'translation': {'uk': {'title': str, 'description': str}, "
+    "'en': {'title': str, 'description': str}}}]} with exactly one item per input id.\n"
+    "Address: Polish, format 'Miasto, Dzielnica, Ulica, Numer' (omit missing parts). "
+    "Rooms: integer; 'kawalerka/studio' and 'pokój do wynajęcia' = 1. "
+    "Translate every listing fully and independently; never merge or shorten them. "
+    "Preserve meaning, numbers, addresses in translations."
+)
+
+TRANSLATE_BATCH_SYSTEM = (
+    "You translate several Polish real-estate listings at once. Input is a JSON array of objects "
+    "{'id', 'title', 'description'}. "
+    "Return ONLY JSON: {'items': [{'id': <same id>, "
+    "'translation': {'uk': {'title': str, 'description': str}, "
+    "'en': {'title': str, 'description': str}}}]} with exactly one item per input id.\n"
+    "Translate every listing fully and independently; never merge or shorten them. "
+    "Preserve meaning, numbers, addresses in translations."
+)
+
+
+def _pack_batches(items: List[Dict[str, Any]]) -> Iterable[List[Dict[str, Any]]]:
+    """Режем на пачки по режиму промпта, числу элементов и суммарному объёму текста."""
+    for translate_only in (True, False):
+        batch: List[Dict[str, Any]] = []
+        size = 0
+        for it in items:
+            if bool(it.get("translate_only")) is not translate_only:
+                continue
+            n = len(it.get("title") or "") + len(it.get("description") or "")
+            if batch and (len(batch) >= BATCH_MAX_ITEMS or size + n > BATCH_MAX_CHARS):
+                yield batch
+                batch, size = [], 0
+            batch.append(it)
+            size += n
+        if batch:
+            yield batch
+
+
+def _is_complete(res: Dict[str, Any]) -> bool:
+    tr = res.get("translation") or {}
+    return all((tr.get(lang) or {}).get("title") for lang in ("uk", "en"))
+
+
+def _strip_id(it: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in it.items() if k != "id"}
+
+
+def _batch_messages(batch: List[Dict[str, Any]]) -> list[dict]:
+    if batch[0].get("translate_only"):
+        payload = [{"id": str(it["id"]), "title": it.get("title") or "", "description": it.get("description") or ""}
+                   for it in batch]
+        system = TRANSLATE_BATCH_SYSTEM
+    else:
+        payload = [{"id": str(it["id"]), **InputData(**_strip_id(it)).model_dump()} for it in batch]
+        system = BATCH_SYSTEM
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+    ]
+
+
+def _split_batch_answer(batch: List[Dict[str, Any]], data_json: dict) -> tuple[Dict[Any, Dict[str, Any]], list]:
+    """
+    Разбирает ответ пакетного запроса: ({id: result} для валидных элементов, [входы для фолбэка]).
+    """
+    by_id = {str(it["id"]): it for it in batch}
+    returned: Dict[str, Any] = {}
+    for item in (data_json or {}).get("items") or []:
+        if isinstance(item, dict) and str(item.get("id")) in by_id:
+            returned[str(item["id"])] = item
+
+    ok: Dict[Any, Dict[str, Any]] = {}
+    retry: list = []
+    for key, it in by_id.items():
+        res = None
+        item = returned.get(key)
+        if item is not None:
+            try:
+                res = _coerce_result(item)
+            except ValidationError:
+                res = None
+        if res is None or not _is_complete(res):
+            retry.append(it)
+        else:
+            ok[it["id"]] = res
+    return ok, retry
+
+
+def _split_cached(items: List[Dict[str, Any]], cached: Dict[str, Dict[str, Any]]):
+    """({id: result} из кэша, [промахи], {id: ключ кэша})."""
+    keys = {it["id"]: _key_of(it) for it in items}
+    hits = {it["id"]: cached[keys[it["id"]]] for it in items if keys[it["id"]] in cached}
+    misses = [it for it in items if it["id"] not in hits]
+    return hits, misses, keys
+
+
+def _to_store(results: Dict[Any, Dict[str, Any]], keys: Dict[Any, str]) -> Dict[str, Dict[str, Any]]:
+    return {keys[i]: r for i, r in results.items() if i in keys and _is_complete(r)}
+
+
+def process_listings_batch(items: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """
+    Пакетный вариант process_listing_one_call.
+    items: [{"id": ..., <поля InputData>}]. Возвращает {id: result}; id, которые не удалось
+    перевести даже одиночным запросом, в ответе отсутствуют.
+    Попадания в кэш переводов в запрос не идут. Элементы, которые модель пропустила
+    или вернула невалидными/пустыми, переводятся по одному.
+    """
+    hits, misses, keys = _split_cached(items, translation_cache.get_many(_key_of(it) for it in items))
+    out: Dict[Any, Dict[str, Any]] = dict(hits)
+    fresh: Dict[Any, Dict[str, Any]] = {}
+    for batch in _pack_batches(misses):
+        data_json: dict = {}
+        if len(batch) > 1:
+            try:
+                data_json = _json_call(messages=_batch_messages(batch))
+            except (RateLimitError, APITimeoutError, APIConnectionError, APIError):
+                data_json = {}
+        ok, retry = _split_batch_answer(batch, data_json)
+        fresh.update(ok)
+        for it in retry:
+            # фолбэк: одиночный запрос; если и он упал — id просто не попадает в out
+            try:
+                fresh[it["id"]] = _coerce_result(_json_call(messages=_listing_messages(_strip_id(it))))
+            except Exception:
+                continue
+    translation_cache.put_many(_to_store(fresh, keys))
+    out.update(fresh)
+    return out
+
+
+async def aprocess_listings_batch(items: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """Async-версия process_listings_batch (AsyncOpenAI), те же правила кэша и фолбэка."""
+    cached = await asyncio.to_thread(translation_cache.get_many, [_key_of(it) for it in items])
+    hits, misses, keys = _split_cached(items, cached)
+    out: Dict[Any, Dict[str, Any]] = dict(hits)
+    fresh: Dict[Any, Dict[str, Any]] = {}
+    for batch in _pack_batches(misses):
+        data_json: dict = {}
+        if len(batch) > 1:
+            try:
+                data_json = await _ajson_call(messages=_batch_messages(batch))
+            except (RateLimitError, APITimeoutError, APIConnectionError, APIError):
+                data_json = {}
+        ok, retry = _split_batch_answer(batch, data_json)
+        fresh.update(ok)
+        for it in retry:
+            try:
+                fresh[it["id"]] = _coerce_result(await _ajson_call(messages=_listing_messages(_strip_id(it))))
+            except Exception:
+                continue
+    await asyncio.to_thread(translation_cache.put_many, _to_store(fresh, keys))
+    out.update(fresh)
+    return out
@@ -0,0 +1,126 @@
+# ai/translation_cache.py
+from __future__ import annotations
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from db.session import get_sync_tx
+from db.models import TranslationCache
+
+logger = logging.getLogger("translator")
+
+CACHE_TTL_DAYS = 90          # запись без попаданий дольше этого — удаляется
+CACHE_MAX_ROWS = 200_000     # сверх лимита удаляются самые давно использованные
+
+
+def cache_key(title: Optional[str], description: Optional[str], prompt_version: str) -> str:
+    h = hashlib.sha256()
+    for part in (prompt_version, title or "", description or ""):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class TranslationCacheStore:
+    """
+    Персистентный кэш переводов в Postgres (таблица translation_cache).
+    get_many/put_many — по одному запросу на пачку; счётчики попаданий — в процессе и в строке.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        try:
+            with get_sync_tx() as session:
+                rows = session.execute(
+                    select(TranslationCache.key, TranslationCache.result)
+                    .where(TranslationCache.key.in_(keys))
+                ).all()
+                found = {k: r for k, r in rows}
+                if found:
+                    session.execute(
+                        update(TranslationCache)
+                        .where(TranslationCache.key.in_(list(found)))
+                        .values(hits=TranslationCache.hits + 1, last_hit_at=datetime.now(timezone.utc))
+                        .execution_options(synchronize_session=False)
+                    )
+        except Exception:
+            logger.exception("translation cache read failed", exc_info=False)
+            with self._lock:
+                self.errors += 1
+            return {}
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        if not items:
+            return
+        now = datetime.now(timezone.utc)
+        rows = [
+            {"key": k, "result": v, "hits": 0, "created_at": now, "last_hit_at": now}
+            for k, v in items.items()
+        ]
+        try:
+            with get_sync_tx() as session:
+                session.execute(
+                    insert(TranslationCache).values(rows)
+                    .on_conflict_do_nothing(index_elements=[TranslationCache.key])
+                )
+        except Exception:
+            logger.exception("translation cache write failed", exc_info=False)
+            with self._lock:
+                self.errors += 1
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        self.put_many({key: result})
+
+    def evict(self, ttl_days: int = CACHE_TTL_DAYS, max_rows: int = CACHE_MAX_ROWS) -> int:
+        """Удаляет записи старше ttl по last_hit_at и самые старые сверх max_rows."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=ttl_days)
+        with get_sync_tx() as session:
+            removed = session.execute(
+                delete(TranslationCache).where(TranslationCache.last_hit_at < cutoff)
+            ).rowcount or 0
+            total = session.execute(select(func.count()).select_from(TranslationCache)).scalar_one()
+            if total > max_rows:
+                oldest = (
+                    select(TranslationCache.key)
+                    .order_by(TranslationCache.last_hit_at.asc())
+                    .limit(total - max_rows)
+                    .scalar_subquery()
+                )
+                removed += session.execute(
+                    delete(TranslationCache).where(TranslationCache.key.in_(oldest))
+                    .execution_options(synchronize_session=False)
+                ).rowcount or 0
+        return removed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+                "errors": self.errors,
+            }
+
+
+translation_cache = TranslationCacheStore()
@@ -0,0 +1,30 @@
+"""listing url indexes
+
+Revision ID: a1c4e7b2d9f0
+Revises: 6d055c59b60a
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c4e7b2d9f0'
+down_revision: Union[str, Sequence[str], None] = '6d055c59b60a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_listings_url', 'listings', ['url'], unique=False)
+    op.create_index('ix_listings_external_url', 'listings', ['external_url'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_listings_external_url', table_name='listings')
+    op.drop_index('ix_listings_url', table_name='listings')
@@ -0,0 +1,36 @@
+"""crawl frontier
+
+Revision ID: a7c4e1f9d035
+Revises: f6b3d0e7a924
+Create Date: 2026-10-18 18:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e1f9d035'
+down_revision: Union[str, Sequence[str], None] = 'f6b3d0e7a924'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('crawl_frontier',
+    sa.Column('source', sa.String(length=32), nullable=False),
+    sa.Column('key', sa.String(length=256), nullable=False),
+    sa.Column('seen', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('watermark', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('source', 'key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('crawl_frontier')
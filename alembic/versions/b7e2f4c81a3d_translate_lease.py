@@ -0,0 +1,32 @@
+"""translate lease
+
+Revision ID: b7e2f4c81a3d
+Revises: a1c4e7b2d9f0
+Create Date: 2026-10-18 13:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4c81a3d'
+down_revision: Union[str, Sequence[str], None] = 'a1c4e7b2d9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('listings', sa.Column('translate_lease_until', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_listings_untranslated', 'listings', ['id'], unique=False,
+                    postgresql_where=sa.text('NOT is_translated'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_listings_untranslated', table_name='listings',
+                  postgresql_where=sa.text('NOT is_translated'))
+    op.drop_column('listings', 'translate_lease_until')
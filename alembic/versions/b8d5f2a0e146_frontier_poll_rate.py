@@ -0,0 +1,30 @@
+"""frontier poll rate
+
+Revision ID: b8d5f2a0e146
+Revises: a7c4e1f9d035
+Create Date: 2026-10-18 18:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d5f2a0e146'
+down_revision: Union[str, Sequence[str], None] = 'a7c4e1f9d035'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('crawl_frontier', sa.Column('rate', sa.Float(), server_default='0', nullable=False))
+    op.add_column('crawl_frontier', sa.Column('polled_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('crawl_frontier', 'polled_at')
+    op.drop_column('crawl_frontier', 'rate')
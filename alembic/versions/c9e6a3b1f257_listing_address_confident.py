@@ -0,0 +1,28 @@
+"""listing address_confident
+
+Revision ID: c9e6a3b1f257
+Revises: b8d5f2a0e146
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e6a3b1f257'
+down_revision: Union[str, Sequence[str], None] = 'b8d5f2a0e146'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('listings', sa.Column('address_confident', sa.Boolean(), server_default='false', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('listings', 'address_confident')
@@ -0,0 +1,43 @@
+"""listing messages
+
+Revision ID: d4e8b1a7c2f6
+Revises: c3d9a6e5f172
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8b1a7c2f6'
+down_revision: Union[str, Sequence[str], None] = 'c3d9a6e5f172'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('listing_messages',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('listing_id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('message_id', sa.BigInteger(), nullable=False),
+    sa.Column('lang', sa.String(length=8), nullable=True),
+    sa.Column('has_photo', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['listing_id'], ['listings.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_listing_messages_listing', 'listing_messages', ['listing_id'], unique=False)
+    op.create_index('ix_listing_messages_created', 'listing_messages', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_listing_messages_created', table_name='listing_messages')
+    op.drop_index('ix_listing_messages_listing', table_name='listing_messages')
+    op.drop_table('listing_messages')
@@ -0,0 +1,33 @@
+"""listing next_check
+
+Revision ID: e5a2c9d4b813
+Revises: d4e8b1a7c2f6
+Create Date: 2026-10-18 16:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a2c9d4b813'
+down_revision: Union[str, Sequence[str], None] = 'd4e8b1a7c2f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('listings', sa.Column('next_check', sa.BigInteger(), nullable=True))
+    # существующие строки — по старому правилу: last_check + CHECK_INTERVAL_HOURS (2 ч)
+    op.execute("UPDATE listings SET next_check = last_check + 7200")
+    op.alter_column('listings', 'next_check', nullable=False)
+    op.create_index('ix_listings_next_check', 'listings', ['next_check'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_listings_next_check', table_name='listings')
+    op.drop_column('listings', 'next_check')
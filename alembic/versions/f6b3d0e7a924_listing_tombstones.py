@@ -0,0 +1,68 @@
+"""listing tombstones
+
+Revision ID: f6b3d0e7a924
+Revises: e5a2c9d4b813
+Create Date: 2026-10-18 17:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b3d0e7a924'
+down_revision: Union[str, Sequence[str], None] = 'e5a2c9d4b813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('listings', sa.Column('removed_at', sa.DateTime(timezone=True), nullable=True))
+
+    # частичные индексы: снятые строки не участвуют в поиске и очередях
+    op.drop_index('ix_listings_city_deal', table_name='listings')
+    op.create_index('ix_listings_city_deal', 'listings', ['city_id', 'deal_type'], unique=False,
+                    postgresql_where=sa.text('removed_at IS NULL'))
+    op.drop_index('ix_listings_untranslated', table_name='listings')
+    op.create_index('ix_listings_untranslated', 'listings', ['id'], unique=False,
+                    postgresql_where=sa.text('NOT is_translated AND removed_at IS NULL'))
+    op.drop_index('ix_listings_next_check', table_name='listings')
+    op.create_index('ix_listings_next_check', 'listings', ['next_check'], unique=False,
+                    postgresql_where=sa.text('removed_at IS NULL'))
+    op.create_index('ix_listings_removed_at', 'listings', ['removed_at'], unique=False,
+                    postgresql_where=sa.text('removed_at IS NOT NULL'))
+
+    op.create_table('listing_tombstones',
+    sa.Column('source', sa.String(length=32), nullable=False),
+    sa.Column('source_ad_id', sa.String(length=128), nullable=False),
+    sa.Column('url', sa.Text(), nullable=True),
+    sa.Column('external_url', sa.Text(), nullable=True),
+    sa.Column('removed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('source', 'source_ad_id')
+    )
+    op.create_index('ix_listing_tombstones_url', 'listing_tombstones', ['url'], unique=False)
+    op.create_index('ix_listing_tombstones_external_url', 'listing_tombstones', ['external_url'], unique=False)
+    op.create_index('ix_listing_tombstones_removed_at', 'listing_tombstones', ['removed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_listing_tombstones_removed_at', table_name='listing_tombstones')
+    op.drop_index('ix_listing_tombstones_external_url', table_name='listing_tombstones')
+    op.drop_index('ix_listing_tombstones_url', table_name='listing_tombstones')
+    op.drop_table('listing_tombstones')
+
+    op.drop_index('ix_listings_removed_at', table_name='listings')
+    op.drop_index('ix_listings_next_check', table_name='listings')
+    op.create_index('ix_listings_next_check', 'listings', ['next_check'], unique=False)
+    op.drop_index('ix_listings_untranslated', table_name='listings')
+    op.create_index('ix_listings_untranslated', 'listings', ['id'], unique=False,
+                    postgresql_where=sa.text('NOT is_translated'))
+    op.drop_index('ix_listings_city_deal', table_name='listings')
+    op.create_index('ix_listings_city_deal', 'listings', ['city_id', 'deal_type'], unique=False)
+    # снятые строки снова становятся обычными — удаляем их, как делал старый чекер
+    op.execute("DELETE FROM listings WHERE removed_at IS NOT NULL")
+    op.drop_column('listings', 'removed_at')
@@ -10,7 +10,7 @@ from db.fsm_storage import PostgresFSMStorage
 from bot.middlewares import DBSessionMiddleware, UserActivityMiddleware, PrivateChatOnlyMiddleware, FileEchoMiddleware
 from bot.handlers import start, menu, search, settings, other, admin
 from config import BOT_TOKEN
-from bot.workers import newsletter_worker
+from bot.workers import newsletter_worker, P_DRAIN_TIMEOUT
 import contextlib
 
 
@@ -70,10 +70,12 @@ async def run_bot(stop_event: Event) -> None:
         with contextlib.suppress(asyncio.CancelledError):
             await polling_task
 
-        # воркер завершаем мягко
-        worker_task.cancel()
-        with contextlib.suppress(asyncio.CancelledError):
-            await worker_task
+        # воркер завершаем мягко: shutdown_event уже стоит, он сам дошлёт очередь
+        # (P_DRAIN_TIMEOUT); не уложился — отменяем, недоставленное вернётся в claim
+        try:
+            await asyncio.wait_for(worker_task, timeout=P_DRAIN_TIMEOUT + 15)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            pass
 
     except Exception as e:
         logger.exception(f"💥 Bot crashed: {e}")
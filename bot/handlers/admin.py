@@ -1,4 +1,6 @@
 # bot/handlers/search.py
+import html
+
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
@@ -11,6 +13,9 @@ from bot.texts import alert_t
 from bot.utils.messages import *
 
 from config import ADMIN_IDS
+from parser.supervisor import scrapers
+from parser.parse_pool import parse_service
+from net.http_client import pools_snapshot
 
 admin_menu_btns = (
     "Активувати ✅",
@@ -43,3 +48,48 @@ async def admin_cmd(msg: Message, command: CommandObject, session: AsyncSession,
         text="Admin меню:",
         reply_markup=admin_menu_markup()
     )
+
+
+def _sources_text() -> str:
+    snap = scrapers.snapshot()
+    if not snap:
+        return "Парсери не запущені."
+    lines = []
+    for name, st in snap.items():
+        rounds = st["round_sec"]
+        lines.append(
+            f"<b>{name}</b>: {st['status']} · раундів {st['rounds']} · падінь {st['crashes']}"
+            f" (поспіль {st['crashes_in_row']}) · наступний через {st['next_in']}s"
+            f" · раунд avg {rounds['avg']}s / max {rounds['max']}s"
+        )
+        if st["last_error"]:
+            lines.append(f"   ↳ {html.escape(st['last_error'][:200])}")
+    pool = parse_service.snapshot()
+    lines.append(f"Розбір HTML: {pool['workers']} процесів · викликів {pool['calls']} · рестартів {pool['restarts']}")
+    http = pools_snapshot()
+    lines.append(
+        f"HTTP keep-alive: запитів {http['requests']} · reuse {http['reuse_rate']}"
+        f" · нових з'єднань {http['new_connections']} · handshake avg {http['avg_handshake_ms']}ms"
+    )
+    return "\n".join(lines)
+
+
+@router.message(Command("sources"))
+async def sources_cmd(msg: Message):
+    """
+    стан парсерів: статус, раунди, падіння, тривалість раундів
+    """
+    await msg.answer(_sources_text())
+
+
+@router.message(Command("pause", "resume"))
+async def pause_resume_cmd(msg: Message, command: CommandObject):
+    """
+    /pause source | /resume source — без перезапуску бота
+    """
+    name = (command.args or "").strip().lower()
+    action = scrapers.pause if command.command == "pause" else scrapers.resume
+    if not name or not action(name):
+        await msg.answer(f"Джерела: {', '.join(scrapers.names()) or '—'}\nФормат: /{command.command} &lt;source&gt;")
+        return
+    await msg.answer(f"{name}: {'пауза ⏸' if command.command == 'pause' else 'відновлено ▶️'}")
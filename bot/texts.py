@@ -928,7 +928,13 @@ Domio właśnie znalazł dla Ciebie świeżą ofertę bezpośrednio od właścic
 🛏 <b>Pokoje:</b> {rooms}
 📄 <b>Opis:</b>
 {description}'''
-    }
+    },
+    # приписка к сообщению, отправленному до готовности перевода (заменится при редактировании)
+    "listing_translation_pending": {
+        "uk": "⏳ <i>Переклад опису з'явиться за хвилину</i>",
+        "en": "⏳ <i>The translated description will appear in a minute</i>",
+        "pl": "",
+    },
 }
 
 
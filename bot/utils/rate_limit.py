@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from typing import Union
+
+logger = logging.getLogger("bot")
+
+# --- Лимиты Telegram Bot API ---
+GLOBAL_RATE = 30.0            # сообщений в секунду на бота
+GLOBAL_BURST = 30.0
+CHAT_RATE = 1.0               # сообщений в секунду в один приватный чат
+CHAT_BURST = 3.0              # небольшой запас, чтобы интерактив (edit + send) не тормозил
+CHANNEL_RATE = 20.0 / 60.0    # 20 сообщений в минуту в группу/канал
+CHANNEL_BURST = 5.0
+MAX_CHAT_BUCKETS = 50_000     # сколько per-chat ведёр держим до чистки простаивающих
+
+
+class TokenBucket:
+    """
+    Ведро токенов с резервированием: reserve() сразу списывает токен (баланс может уйти в минус)
+    и возвращает, сколько ждать до «своего» токена — без циклов опроса и с честной очередностью.
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def reserve(self, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1.0
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def drain(self, now: float | None = None) -> None:
+        """Обнуляет запас (после FloodWait не выпускаем сразу пачку)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+    def is_idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def _is_group_chat(chat_id: Union[int, str]) -> bool:
+    """Группы/каналы — отрицательные id или @username."""
+    if isinstance(chat_id, str):
+        return chat_id.startswith("@") or chat_id.startswith("-")
+    return chat_id < 0
+
+
+class TelegramRateLimiter:
+    """
+    Общий лимитер отправок: глобальное ведро + ведро на чат (приватный/канал).
+    При TelegramRetryAfter вызывается pause(): ставится на паузу ГЛОБАЛЬНОЕ ведро,
+    и все отправители ждут одну общую паузу, а не спят каждый сам по себе.
+    """
+
+    def __init__(self) -> None:
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats: dict[Union[int, str], TokenBucket] = {}
+        self._paused_until = 0.0
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_CHAT_BUCKETS:
+                self._evict_idle()
+            if _is_group_chat(chat_id):
+                bucket = TokenBucket(CHANNEL_RATE, CHANNEL_BURST)
+            else:
+                bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        idle = [cid for cid, b in self._chats.items() if b.is_idle(now)]
+        for cid in idle:
+            del self._chats[cid]
+
+    def pause(self, seconds: float) -> None:
+        """Глобальная пауза (FloodWait). Повторные вызовы только продлевают паузу."""
+        now = time.monotonic()
+        until = now + max(0.0, seconds)
+        if until > self._paused_until:
+            logger.warning(f"[RATE] global pause for {seconds:.1f}s (FloodWait)")
+            self._paused_until = until
+        self._global.drain(now)
+
+    async def acquire(self, chat_id: Union[int, str, None] = None) -> None:
+        """Ждёт разрешения на одну отправку в chat_id."""
+        if chat_id is not None:
+            wait = self._chat_bucket(chat_id).reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            wait = self._global.reserve(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "paused_for": max(0.0, self._paused_until - now),
+            "global_tokens": round(self._global.tokens, 2),
+            "chat_buckets": len(self._chats),
+        }
+
+
+# единственный лимитер на процесс (один бот-токен)
+rate_limiter = TelegramRateLimiter()
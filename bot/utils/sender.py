@@ -6,7 +6,8 @@ from aiogram.types import (
     InlineKeyboardMarkup, ReplyKeyboardMarkup,
     InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAnimation,
 )
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from bot.utils.rate_limit import rate_limiter
 
 logger = logging.getLogger("bot")
 
@@ -35,6 +36,7 @@ async def send_or_edit_message(
     document_file_id: Optional[str] = None,
     animation_file_id: Optional[str] = None,
     chat_id: int = None,
+    _retry_after_left: int = 1,
 ) -> Message:
     """
     Универсальная функция для отправки/редактирования сообщений Telegram.
@@ -76,7 +78,10 @@ async def send_or_edit_message(
     # если file_id нет — создаём FSInputFile из пути (если путь есть)
     media_file = None if file_id else (FSInputFile(media_path) if media_path else None)
     # --- редактирование ---
+    # токен лимитера, взятый под неудавшийся edit, переходит к отправке нового сообщения
+    token_taken = False
     if try_edit:
+        await rate_limiter.acquire(chat_id)
         try:
             # ⚙️ если меняется тип клавиатуры — не редактируем
             if msg.reply_markup and keyboard:
@@ -98,14 +103,41 @@ async def send_or_edit_message(
                 await msg.edit_text(caption, reply_markup=keyboard)
             return msg
 
+        except TelegramRetryAfter as e:
+            # FloodWait на edit — как на отправке: общая пауза лимитера и ещё одна попытка edit
+            rate_limiter.pause(max(1.0, float(getattr(e, "retry_after", 3.0))))
+            if _retry_after_left <= 0:
+                raise
+            return await send_or_edit_message(
+                target=target,
+                key=key,
+                lang=lang,
+                text=text,
+                keyboard=keyboard,
+                bot=bot,
+                try_edit=True,
+                photo=photo,
+                video=video,
+                document=document,
+                animation=animation,
+                photo_file_id=photo_file_id,
+                video_file_id=video_file_id,
+                document_file_id=document_file_id,
+                animation_file_id=animation_file_id,
+                chat_id=chat_id,
+                _retry_after_left=_retry_after_left - 1,
+            )
         except (TelegramBadRequest, ValueError) as e:
             logger.debug(f"Edit failed for {key} ({media_type}): {e}")
             try:
                 await msg.delete()
             except TelegramBadRequest:
                 pass
+            token_taken = True
 
     # --- отправка нового сообщения ---
+    if not token_taken:
+        await rate_limiter.acquire(chat_id)
     try:
         if media_type and (file_id or media_file):
             sender = {
@@ -134,6 +166,30 @@ async def send_or_edit_message(
         else:
             sent = await bot.send_message(chat_id=chat_id, text=caption, reply_markup=keyboard)
 
+    except TelegramRetryAfter as e:
+        # FloodWait: ставим на паузу общий лимитер и пробуем ещё раз (acquire дождётся паузы)
+        rate_limiter.pause(max(1.0, float(getattr(e, "retry_after", 3.0))))
+        if _retry_after_left <= 0:
+            raise
+        return await send_or_edit_message(
+            target=target,
+            key=key,
+            lang=lang,
+            text=text,
+            keyboard=keyboard,
+            bot=bot,
+            try_edit=False,
+            photo=photo,
+            video=video,
+            document=document,
+            animation=animation,
+            photo_file_id=photo_file_id,
+            video_file_id=video_file_id,
+            document_file_id=document_file_id,
+            animation_file_id=animation_file_id,
+            chat_id=chat_id,
+            _retry_after_left=_retry_after_left - 1,
+        )
     except TelegramBadRequest as e:
         if "file not found" in str(e).lower():
             _media_cache.pop(cache_key, None)
@@ -2,7 +2,7 @@
 from __future__ import annotations
 import asyncio
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from aiogram import Bot
@@ -12,21 +12,25 @@ from aiogram.exceptions import (
     TelegramBadRequest,
 )
 from aiogram.types import Message
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, insert, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from db.session import get_async_session
-from db.models import Listing, User, ScheduledMessage, MessageType, ChatType  # предполагается
+from db.models import Listing, ListingMessage, User, ScheduledMessage, MessageType, ChatType  # предполагается
 from db.repo_async import (
     get_users_for_listing,
+    get_users_by_ids,
     claim_due_messages,
     mark_sending,
     mark_sent,
     mark_retry,
     get_saved_listing_ids,
+    get_saved_listing_ids_bulk,
 )  # замените на ваш путь
+from db.match_index import match_index
 from bot.keyboards.listing import get_under_listing_btns
+from bot.utils.rate_limit import rate_limiter
 from bot.texts import listing_t
 from bot.utils.messages import (
     trigger_invoice,
@@ -42,12 +46,28 @@ from bot.utils.messages import (
 logger = logging.getLogger("bot.worker")
 
 # --- Настройки пайплайна рассылки листингов ---
-P_CONCURRENCY = 20         # параллельных отправок
-P_PER_CHAT_DELAY = 0.8     # пауза между отправками в разные чаты
+P_CONCURRENCY = 20         # параллельных отправок (темп задаёт rate_limiter)
 P_EMPTY_SLEEP = 3          # пауза, если не нашли ни одного листинга
+P_CLAIM_BATCH = 50         # сколько листингов забирать за один round-trip
+P_QUEUE_SIZE = 1000        # ёмкость очереди отправки (backpressure для claim)
+P_DRAIN_TIMEOUT = 30       # остановка: сколько ждать, пока воркеры дошлют очередь, сек
 MAX_RETRIES = 3            # кол-во попыток на FloodWait
 SCHED_CHECK_INTERVAL = 2.0   # как часто проверять очередь, сек
 SCHED_BATCH_LIMIT = 50       # сколько задач за раз забирать
+# режим подбора получателей листинга:
+#   "index"  — резидентный матч-индекс (db/match_index.py), без запроса по user_searches
+#   "sql"    — старый путь через find_searches_for_listing
+#   "verify" — считаем оба, логируем расхождения, рассылаем по SQL
+LISTING_MATCH_MODE = "index"
+# режим доставки листингов:
+#   "translated" — рассылаем только переведённые (is_translated), как раньше
+#   "fast"       — рассылаем сразу (описание на польском), id сообщений сохраняем в listing_messages,
+#                  а после перевода pipeline_listing_edits редактирует их на месте
+LISTING_DELIVERY_MODE = "translated"
+EDIT_CHECK_INTERVAL = 5.0    # как часто искать сообщения, которые пора перерисовать, сек
+EDIT_BATCH_LIMIT = 100       # сколько сообщений редактировать за один проход
+EDIT_TTL_HOURS = 24          # перевод так и не появился — перестаём ждать и забываем сообщение
+EDIT_PURGE_INTERVAL = 600.0  # как часто чистить просроченные записи, сек
 
 
 async def _deactivate_user(session: AsyncSession, user: User, reason: str):
@@ -62,6 +82,22 @@ async def _deactivate_user(session: AsyncSession, user: User, reason: str):
         logger.exception(f"Failed to deactivate user {user.id}: {e}")
 
 
+def _claimable_filter():
+    """
+    Условие листинга, готового к рассылке, с учётом LISTING_DELIVERY_MODE.
+    В "fast" до перевода берём только листинги, у которых поля матчинга уже известны
+    (rooms из источника или db/pre_extract): rooms IS NULL не матчится с фильтром комнат,
+    а is_sended=True закрыл бы листинг для таких пользователей навсегда. Остальные ждут перевода.
+    """
+    if LISTING_DELIVERY_MODE == "fast":
+        return and_(
+            Listing.is_sended.is_(False),
+            Listing.removed_at.is_(None),
+            or_(Listing.is_translated.is_(True), Listing.rooms.is_not(None)),
+        )
+    return and_(Listing.is_translated.is_(True), Listing.is_sended.is_(False), Listing.removed_at.is_(None))
+
+
 def _is_block_or_missing_chat_error(e: TelegramBadRequest) -> bool:
     """
     Эвристика под частые тексты ошибок:
@@ -82,40 +118,48 @@ def _is_block_or_missing_chat_error(e: TelegramBadRequest) -> bool:
 
 
 # ==========================
-# CLAIM одного листинга
+# CLAIM пачки листингов
 # ==========================
-async def claim_one_listing(session: AsyncSession) -> Listing | None:
+async def claim_listings_batch(session: AsyncSession, limit: int = P_CLAIM_BATCH) -> list[Listing]:
     """
-    Атомарно забирает ОДИН листинг для рассылки:
-      - WHERE is_translated AND NOT is_sended
-      - FOR UPDATE SKIP LOCKED
-      - сразу is_sended = TRUE
+    Атомарно забирает до `limit` листингов для рассылки одним UPDATE ... RETURNING:
+      - WHERE id IN (SELECT ... NOT is_sended [AND is_translated] FOR UPDATE SKIP LOCKED)
+      - is_sended = TRUE
       - COMMIT
-    Возвращает листинг (уже помеченный) или None.
+    Возвращает листинги (уже помеченные) с подгруженными city/district, в порядке scraped_at.
     """
     now = datetime.now(timezone.utc)
 
-    stmt = (
-        select(Listing)
-        .where(Listing.is_translated.is_(True), Listing.is_sended.is_(False))
+    ids_subq = (
+        select(Listing.id)
+        .where(_claimable_filter())
         .order_by(Listing.scraped_at.asc())
-        .limit(1)
+        .limit(limit)
         .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    res = await session.execute(
+        update(Listing)
+        .where(Listing.id.in_(ids_subq))
+        .values(is_sended=True, updated_at=now)
+        .returning(Listing.id)
+        .execution_options(synchronize_session=False)
+    )
+    ids = list(res.scalars().all())
+    await session.commit()
+    if not ids:
+        return []
+
+    result = await session.scalars(
+        select(Listing)
+        .where(Listing.id.in_(ids))
         .options(
             selectinload(Listing.city),
             selectinload(Listing.district),
         )
+        .order_by(Listing.scraped_at.asc(), Listing.id.asc())
     )
-    res = await session.execute(stmt)
-    listing = res.scalars().first()
-    if not listing:
-        return None
-
-    listing.is_sended = True
-    listing.updated_at = now
-    await session.commit()
-    await session.refresh(listing)
-    return listing
+    return list(result)
 
 
 # ==========================
@@ -126,27 +170,29 @@ async def _send_message_with_retries(
     chat_id: int | str,
     text: str,
     reply_markup=None,
-    per_chat_delay: float = P_PER_CHAT_DELAY,
-) -> bool:
+) -> Message | None:
+    """
+    Возвращает Message при успехе (нужен message_id для последующего редактирования), иначе None.
+    """
     attempt = 0
     while True:
+        await rate_limiter.acquire(chat_id)
         try:
-            await bot.send_message(chat_id, text, disable_web_page_preview=True, reply_markup=reply_markup)
-            await asyncio.sleep(per_chat_delay)
-            return True
+            return await bot.send_message(chat_id, text, disable_web_page_preview=True, reply_markup=reply_markup)
         except TelegramRetryAfter as e:
             attempt += 1
             wait_for = float(getattr(e, "retry_after", 3.0))
             logger.warning(f"[send_message] FloodWait {wait_for:.1f}s (attempt {attempt}/{MAX_RETRIES}) for chat {chat_id}")
-            await asyncio.sleep(max(1.0, wait_for))
+            # общая пауза для всех отправителей; следующий acquire() её дождётся
+            rate_limiter.pause(max(1.0, wait_for))
             if attempt >= MAX_RETRIES:
-                return False
+                return None
         except (TelegramForbiddenError, TelegramBadRequest):
             # выше обработаем и деактивируем юзера
             raise
         except Exception as e:
             logger.exception(f"[send_message] Unexpected error for {chat_id}: {e}")
-            return False
+            return None
 
 
 async def _send_photo_with_retries(
@@ -155,22 +201,20 @@ async def _send_photo_with_retries(
     photo: str,
     caption: str | None = None,
     reply_markup=None,
-    per_chat_delay: float = P_PER_CHAT_DELAY,
 ) -> Message | None:
     """
     Возвращает Message при успехе (чтобы достать file_id), иначе None.
     """
     attempt = 0
     while True:
+        await rate_limiter.acquire(chat_id)
         try:
-            msg = await bot.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup)
-            await asyncio.sleep(per_chat_delay)
-            return msg
+            return await bot.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup)
         except TelegramRetryAfter as e:
             attempt += 1
             wait_for = float(getattr(e, "retry_after", 3.0))
             logger.warning(f"[send_photo] FloodWait {wait_for:.1f}s (attempt {attempt}/{MAX_RETRIES}) for chat {chat_id}")
-            await asyncio.sleep(max(1.0, wait_for))
+            rate_limiter.pause(max(1.0, wait_for))
             if attempt >= MAX_RETRIES:
                 return None
         except (TelegramForbiddenError, TelegramBadRequest):
@@ -184,7 +228,39 @@ async def _send_photo_with_retries(
 # ==========================
 # ОТПРАВКА ЛИСТИНГА ЮЗЕРУ
 # ==========================
-async def send_listing_to_user(bot: Bot, user: User, listing: Listing) -> bool:
+_EMPTY_FIELD = "\x00"   # маркер незаполненного поля: строка шаблона с ним выбрасывается
+
+
+def _listing_caption(listing: Listing, lang: str | None) -> str:
+    """
+    Текст сообщения листинга: строки с незаполненными полями (цена/площадь/комнаты ещё
+    не известны) не показываем; пока перевода нет — с припиской, что он скоро появится.
+    """
+    def val(v):
+        return _EMPTY_FIELD if v is None else v
+
+    caption = listing_t(lang, "listing_new_text").format(
+        city=listing.city.get_name_local(lang),
+        price=val(listing.price),
+        area=val(listing.area_m2),
+        rooms=val(listing.rooms),
+        description=listing.get_description_local(lang, 250),
+    )
+    caption = "\n".join(line for line in caption.split("\n") if _EMPTY_FIELD not in line)
+    if not listing.is_translated:
+        note = listing_t(lang, "listing_translation_pending")
+        if note:
+            caption += "\n\n" + note
+    return caption
+
+
+async def send_listing_to_user(
+    bot: Bot,
+    user: User,
+    listing: Listing,
+    saved_ids: set[int] | list[int] | None = None,
+    sent: list[dict] | None = None,
+) -> bool:
     """
     Отправляет листинг юзеру.
     - есть tg_photo_id -> отправляем фото+caption
@@ -192,30 +268,41 @@ async def send_listing_to_user(bot: Bot, user: User, listing: Listing) -> bool:
     - иначе шлём текстом
     - FloodWait -> ретраи
     - Forbidden/BadRequest -> деактивируем юзера
+    saved_ids — заранее выбранные сохранённые id (пакетная рассылка); None -> запрос в БД.
+    sent — если передан и листинг ещё не переведён, сюда добавляется строка для listing_messages
+    (сообщение перерисуется после перевода).
     """
     chat_id = user.id
     lang = user.language_code
-    template = listing_t(lang, "listing_new_text")
-    caption = template.format(
-        city=listing.city.get_name_local(lang),
-        price=listing.price,
-        area=listing.area_m2,
-        rooms=listing.rooms,
-        description=listing.get_description_local(lang, 250),
-    )
-    # saved_ids — забираем отдельной короткой сессией
-    async with get_async_session() as s:
-        saved_ids = await get_saved_listing_ids(s, user)
+    caption = _listing_caption(listing, lang)
+    # saved_ids — если не передали заранее, забираем отдельной короткой сессией
+    if saved_ids is None:
+        async with get_async_session() as s:
+            saved_ids = await get_saved_listing_ids(s, user)
     btns = get_under_listing_btns(listing, user, saved_ids)
 
+    def _delivered(msg: Message | None) -> bool:
+        if msg is None:
+            return False
+        if sent is not None and not listing.is_translated:
+            sent.append({
+                "listing_id": listing.id,
+                "user_id": user.id,
+                "message_id": msg.message_id,
+                "lang": lang,
+                "has_photo": bool(msg.photo),
+                "created_at": datetime.now(timezone.utc),
+            })
+        return True
+
     try:
         # 1) tg_photo_id уже есть
         if listing.tg_photo_id:
             msg = await _send_photo_with_retries(bot, chat_id, listing.tg_photo_id, caption=caption, reply_markup=btns)
             if msg:
-                return True
+                return _delivered(msg)
             # если не удалось фото (например, file_id устарел), попробуем текстом
-            return await _send_message_with_retries(bot, chat_id, caption, reply_markup=btns)
+            return _delivered(await _send_message_with_retries(bot, chat_id, caption, reply_markup=btns))
 
         # 2) tg_photo_id нет — попробуем взять первый URL из listing.photos
         photo_url = None
@@ -242,12 +329,12 @@ async def send_listing_to_user(bot: Bot, user: User, listing: Listing) -> bool:
                             await s.commit()
                 except Exception as e:
                     logger.exception(f"Failed to save tg_photo_id for listing {listing.id}: {e}")
-                return True
+                return _delivered(msg)
             # если с URL не вышло — отправим текстом
-            return await _send_message_with_retries(bot, chat_id, caption, reply_markup=btns)
+            return _delivered(await _send_message_with_retries(bot, chat_id, caption, reply_markup=btns))
 
         # 3) фото нет вообще — только текст
-        return await _send_message_with_retries(bot, chat_id, caption, reply_markup=btns)
+        return _delivered(await _send_message_with_retries(bot, chat_id, caption, reply_markup=btns))
 
     except TelegramForbiddenError as e:
         # пользователь заблокировал бота / нет прав писать
@@ -273,27 +360,177 @@ async def send_listing_to_user(bot: Bot, user: User, listing: Listing) -> bool:
 
 
 # ==========================
-# ОБРАБОТКА ОДНОГО ЛИСТИНГА
+# ПОДБОР ПОЛУЧАТЕЛЕЙ
 # ==========================
-async def process_claimed_listing(bot: Bot, users: list[User], listing: Listing) -> tuple[int, int]:
+async def resolve_listing_users(session: AsyncSession, listing: Listing) -> list[User]:
     """
-    Рассылает listing всем релевантным пользователям.
+    Получатели листинга согласно LISTING_MATCH_MODE.
+    При любой ошибке индекса — откат на SQL-путь.
     """
-    if not users:
-        logger.info(f"[LISTING] {listing.id}: no recipients")
-        return (0, 0)
+    if LISTING_MATCH_MODE == "sql":
+        return await get_users_for_listing(session, listing)
 
-    sem = asyncio.Semaphore(P_CONCURRENCY)
+    try:
+        await match_index.sync(session)
+        user_ids = match_index.match(listing)
+    except Exception as e:
+        logger.exception(f"[MATCH] index failed for listing {listing.id}, fallback to SQL: {e}")
+        return await get_users_for_listing(session, listing)
+
+    if LISTING_MATCH_MODE == "verify":
+        users = await get_users_for_listing(session, listing)
+        sql_ids = {u.id for u in users}
+        idx_ids = set(user_ids)
+        if sql_ids != idx_ids:
+            logger.warning(
+                f"[MATCH] mismatch for listing {listing.id}: "
+                f"only_sql={sorted(sql_ids - idx_ids)[:20]} only_index={sorted(idx_ids - sql_ids)[:20]}"
+            )
+        return users
+
+    return await get_users_by_ids(session, user_ids)
+
+
+async def resolve_batch_recipients(
+    session: AsyncSession,
+    listings: list[Listing],
+) -> dict[int, tuple[User, list[Listing]]]:
+    """
+    Агрегация по пользователям для пачки листингов:
+      user_id -> (User, [листинги для него в порядке claim]).
+    В режиме "index" — один матчинг в памяти на листинг и ОДИН запрос пользователей на всю пачку.
+    """
+    per_user: dict[int, tuple[User, list[Listing]]] = {}
 
-    async def worker(u: User):
-        async with sem:
-            return await send_listing_to_user(bot, u, listing)
+    if LISTING_MATCH_MODE == "index":
+        try:
+            await match_index.sync(session)
+            matched = [(l, match_index.match(l)) for l in listings]
+        except Exception as e:
+            logger.exception(f"[MATCH] index failed for batch, fallback to SQL: {e}")
+            matched = None
+
+        if matched is not None:
+            all_ids = sorted({uid for _, ids in matched for uid in ids})
+            users = {u.id: u for u in await get_users_by_ids(session, all_ids)}
+            for listing, ids in matched:
+                for uid in ids:
+                    user = users.get(uid)
+                    if user is not None:
+                        per_user.setdefault(uid, (user, []))[1].append(listing)
+            return per_user
+
+    for listing in listings:
+        for user in await resolve_listing_users(session, listing):
+            per_user.setdefault(user.id, (user, []))[1].append(listing)
+    return per_user
+
+
+class _BatchStats:
+    """
+    Счётчики отправок одной claimed-пачки — логируем, когда её последняя задача отработала.
+    touched — id листингов, которые хоть кому-то уже начали слать (их при остановке не возвращаем).
+    """
+    __slots__ = ("listing_ids", "pending", "ok", "fail", "started", "touched")
+
+    def __init__(self, listing_ids: list[int], pending: int):
+        self.listing_ids = listing_ids
+        self.pending = pending
+        self.ok = 0
+        self.fail = 0
+        self.started = asyncio.get_running_loop().time()
+        self.touched: set[int] = set()
+
+    def done(self, ok: int, fail: int) -> None:
+        self.ok += ok
+        self.fail += fail
+        self.pending -= 1
+        if self.pending <= 0:
+            elapsed = asyncio.get_running_loop().time() - self.started
+            logger.info(
+                f"[LISTING] batch {self.listing_ids[0]}..{self.listing_ids[-1]} "
+                f"({len(self.listing_ids)} listings): sent={self.ok}, failed={self.fail}, {elapsed:.1f}s"
+            )
+
+
+async def _save_listing_messages(rows: list[dict]) -> None:
+    """Запоминает id сообщений с непереведёнными листингами (одним INSERT на задачу отправки)."""
+    try:
+        async with get_async_session() as s:
+            await s.execute(insert(ListingMessage), rows)
+            await s.commit()
+    except Exception as e:
+        logger.exception(f"[LISTING] failed to store {len(rows)} message ids: {e}")
+
+
+async def _send_queue_worker(bot: Bot, queue: asyncio.Queue, left: list[tuple[Listing, _BatchStats]]):
+    """
+    Потребитель общей очереди отправки: одна задача = один пользователь и его листинги пачки
+    (листинги одному чату идут последовательно, разные чаты — параллельно).
+    left — при отмене сюда уходят листинги задачи, до которых очередь не дошла.
+    """
+    while True:
+        user, listings, saved_ids, stats = await queue.get()
+        ok = fail = 0
+        sent: list[dict] = []
+        i = 0
+        try:
+            for i, listing in enumerate(listings):
+                stats.touched.add(listing.id)
+                if await send_listing_to_user(bot, user, listing, saved_ids, sent):
+                    ok += 1
+                else:
+                    fail += 1
+        except asyncio.CancelledError:
+            left.extend((l, stats) for l in listings[i + 1:])
+            raise
+        except Exception as e:
+            logger.exception(f"[LISTING] send job failed for user {user.id}: {e}")
+        finally:
+            if sent:
+                await _save_listing_messages(sent)
+            stats.done(ok, fail)
+            queue.task_done()
 
-    results = await asyncio.gather(*(worker(u) for u in users), return_exceptions=False)
-    ok = sum(1 for r in results if r)
-    fail = len(results) - ok
-    logger.info(f"[LISTING] {listing.id}: sent={ok}, failed={fail}")
-    return ok, fail
+
+async def _release_listings(listing_ids: list[int]) -> None:
+    """Возвращает недоставленные листинги в claim (is_sended = FALSE) — их разошлёт следующий запуск."""
+    try:
+        async with get_async_session() as s:
+            await s.execute(
+                update(Listing)
+                .where(Listing.id.in_(listing_ids))
+                .values(is_sended=False, updated_at=datetime.now(timezone.utc))
+            )
+            await s.commit()
+        logger.info(f"[LISTING] released {len(listing_ids)} undelivered listings")
+    except Exception as e:
+        logger.exception(f"[LISTING] failed to release {len(listing_ids)} listings: {e}")
+
+
+async def _drain_send_queue(queue: asyncio.Queue, senders: list[asyncio.Task], left: list) -> None:
+    """
+    Остановка очереди отправки (claim к этому моменту уже не идёт):
+      - ждём до P_DRAIN_TIMEOUT, пока воркеры дошлют всё, что в очереди;
+      - гасим воркеров;
+      - не успели — листинги, которые никому из пачки ещё не начали слать, возвращаем в claim
+        (начатые не трогаем: повторный claim разослал бы их всем получателям заново).
+    """
+    try:
+        await asyncio.wait_for(queue.join(), timeout=P_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"[LISTING] send queue not drained in {P_DRAIN_TIMEOUT}s ({queue.qsize()} jobs left)")
+    finally:
+        for t in senders:
+            t.cancel()
+        await asyncio.gather(*senders, return_exceptions=True)
+        while not queue.empty():
+            _, listings, _, stats = queue.get_nowait()
+            queue.task_done()
+            left.extend((l, stats) for l in listings)
+        release = sorted({l.id for l, stats in left if l.id not in stats.touched})
+        if release:
+            await _release_listings(release)
 
 
 # ==========================
@@ -302,39 +539,211 @@ async def process_claimed_listing(bot: Bot, users: list[User], listing: Listing)
 async def pipeline_new_listings_users(bot: Bot, shutdown_event: asyncio.Event):
     """
     Бесконечный цикл:
-      - claim_one_listing() -> is_sended = TRUE
-      - разослать
+      - claim_listings_batch() -> до P_CLAIM_BATCH листингов, is_sended = TRUE
+      - агрегируем пары (user, listing) по всей пачке
+      - кладём задачи в общую ограниченную очередь (P_QUEUE_SIZE), её разбирают P_CONCURRENCY воркеров
       - если нечего слать — спим P_EMPTY_SLEEP
+    При остановке claim прекращается, очередь дорабатывается (см. _drain_send_queue).
     """
     logger.info("▶️ Pipeline:listings started")
+    queue: asyncio.Queue = asyncio.Queue(maxsize=P_QUEUE_SIZE)
+    left: list[tuple[Listing, _BatchStats]] = []
+    senders = [asyncio.create_task(_send_queue_worker(bot, queue, left)) for _ in range(P_CONCURRENCY)]
     try:
         while not shutdown_event.is_set():
             async with get_async_session() as session:
-                listing = await claim_one_listing(session)
-                if not listing:
-                    try:
-                        await asyncio.wait_for(asyncio.sleep(P_EMPTY_SLEEP), timeout=P_EMPTY_SLEEP + 1)
-                    except asyncio.CancelledError:
-                        raise
-                    continue
-
+                listings = await claim_listings_batch(session)
+            if not listings:
                 try:
-                    # получаем юзеров (и всё нужное) с отдельной сессией
-                    async with get_async_session() as s:
-                        users: list[User] = await get_users_for_listing(s, listing)
+                    await asyncio.wait_for(asyncio.sleep(P_EMPTY_SLEEP), timeout=P_EMPTY_SLEEP + 1)
+                except asyncio.CancelledError:
+                    raise
+                continue
 
-                    # а рассылку делаем уже без «общей» сессии
-                    await process_claimed_listing(bot, users, listing)
-                except Exception as e:
-                    logger.exception(f"[LISTING] processing failed (id={listing.id}): {e}")
-                    # не откатываем is_sended, чтобы избежать дублей
+            try:
+                async with get_async_session() as s:
+                    per_user = await resolve_batch_recipients(s, listings)
+                    # сохранённые — одним запросом на всю пачку, а не сессией на каждого получателя
+                    saved = await get_saved_listing_ids_bulk(
+                        s, list(per_user.keys()), [l.id for l in listings]
+                    )
+            except Exception as e:
+                logger.exception(f"[LISTING] recipients failed for batch {[l.id for l in listings]}: {e}")
+                # не откатываем is_sended, чтобы избежать дублей
+                continue
+
+            if not per_user:
+                logger.info(f"[LISTING] {len(listings)} listings: no recipients")
+                continue
+
+            stats = _BatchStats([l.id for l in listings], pending=len(per_user))
+            for user, user_listings in per_user.values():
+                # при полной очереди ждём — claim не убегает вперёд отправки
+                await queue.put((user, user_listings, saved.get(user.id, set()), stats))
     except asyncio.CancelledError:
         logger.info("⏹ Pipeline:listings cancelled")
         raise
     finally:
+        await _drain_send_queue(queue, senders, left)
         logger.info("⏹ Pipeline:listings stopped")
 
 
+# ==========================
+# РЕДАКТИРОВАНИЕ ПОСЛЕ ПЕРЕВОДА
+# ==========================
+async def claim_listing_edits(session: AsyncSession, limit: int = EDIT_BATCH_LIMIT) -> list:
+    """
+    Забирает до `limit` сообщений, чьи листинги уже переведены, одним DELETE ... RETURNING
+    (FOR UPDATE SKIP LOCKED — параллельные воркеры не получат одно сообщение дважды).
+    Возвращает строки (listing_id, user_id, message_id, lang, has_photo).
+    """
+    ids_subq = (
+        select(ListingMessage.id)
+        .join(Listing, Listing.id == ListingMessage.listing_id)
+        .where(Listing.is_translated.is_(True))
+        .order_by(ListingMessage.id.asc())
+        .limit(limit)
+        .with_for_update(of=ListingMessage, skip_locked=True)
+        .scalar_subquery()
+    )
+    res = await session.execute(
+        delete(ListingMessage)
+        .where(ListingMessage.id.in_(ids_subq))
+        .returning(
+            ListingMessage.listing_id,
+            ListingMessage.user_id,
+            ListingMessage.message_id,
+            ListingMessage.lang,
+            ListingMessage.has_photo,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    rows = list(res.all())
+    await session.commit()
+    return rows
+
+
+async def purge_stale_listing_messages(session: AsyncSession) -> int:
+    """Удаляет записи старше EDIT_TTL_HOURS — перевод для них так и не появился."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=EDIT_TTL_HOURS)
+    res = await session.execute(
+        delete(ListingMessage)
+        .where(ListingMessage.created_at < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return res.rowcount or 0
+
+
+async def _edit_listing_message(
+    bot: Bot,
+    chat_id: int,
+    message_id: int,
+    has_photo: bool,
+    text: str,
+    reply_markup=None,
+) -> bool:
+    """
+    Перерисовывает ранее отправленное сообщение листинга (caption у фото, text у текстового).
+    Удалённое сообщение / заблокированный бот / «message is not modified» — просто False, без ретраев.
+    """
+    attempt = 0
+    while True:
+        await rate_limiter.acquire(chat_id)
+        try:
+            if has_photo:
+                await bot.edit_message_caption(
+                    chat_id=chat_id, message_id=message_id, caption=text, reply_markup=reply_markup,
+                )
+            else:
+                await bot.edit_message_text(
+                    text, chat_id=chat_id, message_id=message_id,
+                    disable_web_page_preview=True, reply_markup=reply_markup,
+                )
+            return True
+        except TelegramRetryAfter as e:
+            attempt += 1
+            wait_for = float(getattr(e, "retry_after", 3.0))
+            logger.warning(f"[edit_message] FloodWait {wait_for:.1f}s (attempt {attempt}/{MAX_RETRIES}) for chat {chat_id}")
+            rate_limiter.pause(max(1.0, wait_for))
+            if attempt >= MAX_RETRIES:
+                return False
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            logger.debug(f"[edit_message] skip {chat_id}/{message_id}: {e}")
+            return False
+        except Exception as e:
+            logger.exception(f"[edit_message] Unexpected error for {chat_id}: {e}")
+            return False
+
+
+async def pipeline_listing_edits(bot: Bot, shutdown_event: asyncio.Event):
+    """
+    Бесконечный цикл (нужен для LISTING_DELIVERY_MODE = "fast"):
+      - claim_listing_edits() -> сообщения, чьи листинги уже переведены
+      - подгружаем листинги/пользователей/сохранённые одной сессией
+      - редактируем на месте на языке пользователя (кнопки пересобираем — карта могла появиться)
+      - раз в EDIT_PURGE_INTERVAL чистим записи, не дождавшиеся перевода
+    """
+    logger.info("▶️ Pipeline:edits started")
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(P_CONCURRENCY)
+    last_purge = 0.0
+    try:
+        while not shutdown_event.is_set():
+            if loop.time() - last_purge >= EDIT_PURGE_INTERVAL:
+                last_purge = loop.time()
+                try:
+                    async with get_async_session() as s:
+                        purged = await purge_stale_listing_messages(s)
+                    if purged:
+                        logger.info(f"[EDIT] purged {purged} stale listing messages")
+                except Exception as e:
+                    logger.exception(f"[EDIT] purge failed: {e}")
+
+            try:
+                async with get_async_session() as s:
+                    rows = await claim_listing_edits(s)
+                    if rows:
+                        listing_ids = sorted({r.listing_id for r in rows})
+                        user_ids = sorted({r.user_id for r in rows})
+                        listings = {
+                            l.id: l for l in await s.scalars(
+                                select(Listing)
+                                .where(Listing.id.in_(listing_ids))
+                                .options(selectinload(Listing.city), selectinload(Listing.district))
+                            )
+                        }
+                        users = {u.id: u for u in await s.scalars(select(User).where(User.id.in_(user_ids)))}
+                        saved = await get_saved_listing_ids_bulk(s, user_ids, listing_ids)
+            except Exception as e:
+                logger.exception(f"[EDIT] claim failed: {e}")
+                rows = []
+
+            if not rows:
+                await asyncio.sleep(EDIT_CHECK_INTERVAL)
+                continue
+
+            async def edit_one(r) -> bool:
+                listing, user = listings.get(r.listing_id), users.get(r.user_id)
+                if listing is None or user is None:
+                    return False
+                async with sem:
+                    return await _edit_listing_message(
+                        bot, user.id, r.message_id, r.has_photo,
+                        _listing_caption(listing, r.lang),
+                        reply_markup=get_under_listing_btns(listing, user, saved.get(user.id, set())),
+                    )
+
+            results = await asyncio.gather(*(edit_one(r) for r in rows))
+            edited = sum(1 for ok in results if ok)
+            logger.info(f"[EDIT] {len(rows)} messages: edited={edited}, skipped={len(rows) - edited}")
+    except asyncio.CancelledError:
+        logger.info("⏹ Pipeline:edits cancelled")
+        raise
+    finally:
+        logger.info("⏹ Pipeline:edits stopped")
+
+
 async def pipeline_scheduled_messages(bot: Bot, shutdown_event: asyncio.Event):
     """
     Бесконечный цикл:
@@ -407,6 +816,10 @@ async def send_scheduled_message(bot: Bot, msg: ScheduledMessage) -> bool:
     # Пример: разные типы сообщений
     mtype = msg.message_type
     try:
+        # приватные сообщения лимитируются внутри send_or_edit_message,
+        # в каналы messages.py шлёт напрямую через bot.send_message
+        if msg.chat_type == ChatType.CHANNEL:
+            await rate_limiter.acquire(chat_id)
         # Можно разветвить логику по типу (пример)
         if mtype == MessageType.INVOICE and sub_type=="done":
             # юзеру и в канал про подписку
@@ -450,6 +863,11 @@ async def send_scheduled_message(bot: Bot, msg: ScheduledMessage) -> bool:
         return True
     
 
+    except TelegramRetryAfter as e:
+        # общая пауза для всех отправителей, сообщение уйдёт в retry
+        rate_limiter.pause(max(1.0, float(getattr(e, "retry_after", 3.0))))
+        logger.warning(f"[SCHED] FloodWait for {chat_id}: {e}")
+        return False
     except TelegramForbiddenError as e:
         # Если пользователь есть и это приватный чат — деактивируем
         if msg.chat_type == ChatType.PRIVATE and msg.user:
@@ -479,18 +897,24 @@ async def send_scheduled_message(bot: Bot, msg: ScheduledMessage) -> bool:
 # ==========================
 async def newsletter_worker(bot: Bot, shutdown_event: asyncio.Event) -> None:
     """
-    Главный воркер: поднимает два параллельных пайплайна —
+    Главный воркер: поднимает параллельные пайплайны —
       1) рассылка новых листингов;
-      2) отправка запланированных сообщений (ScheduledMessage).
+      2) отправка запланированных сообщений (ScheduledMessage);
+      3) редактирование сообщений, отправленных до перевода (режим "fast").
     """
     logger.info("📨 Newsletter worker started")
     task_listings = asyncio.create_task(pipeline_new_listings_users(bot, shutdown_event))
     task_sched = asyncio.create_task(pipeline_scheduled_messages(bot, shutdown_event))
+    # работает при любом режиме: после переключения "fast" -> "translated" досылаем правки
+    task_edits = asyncio.create_task(pipeline_listing_edits(bot, shutdown_event))
     try:
-        await asyncio.gather(task_listings, task_sched)
+        await asyncio.gather(task_listings, task_sched, task_edits)
     except asyncio.CancelledError:
         task_listings.cancel()
         task_sched.cancel()
+        task_edits.cancel()
+        # пайплайн листингов в finally дорабатывает очередь отправки — дожидаемся
+        await asyncio.gather(task_listings, task_sched, task_edits, return_exceptions=True)
         raise
     finally:
         logger.info("📨 Newsletter worker stopped")
@@ -23,6 +23,65 @@ HTTP_MAX_RETRIES: int = 3
 HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
 HTTP_SKEEP_STATUSES = (404, 410, )
 HTTP_BACKOFF_BASE: float = 1.0   # сек (экспоненциальный с джиттером)
+# пулы keep-alive сессий (ключ — прокси-эндпоинт), net/http_client.py
+HTTP_POOL_MAX_PER_KEY: int = 4    # sync: свободных сессий на один прокси
+HTTP_POOL_MAX_KEYS: int = 64      # async: сессий (прокси) на event loop
+HTTP_POOL_MAX_CLIENTS: int = 10   # async: параллельных curl-хэндлов на сессию
+HTTP_POOL_IDLE_TTL: int = 90      # сек простоя, после которых сессия закрывается
+# TLS/ALPN-профиль браузера для сессий пулов (напр. "chrome" -> HTTP/2, где сайт умеет);
+# None — обычный curl, как раньше
+HTTP_IMPERSONATE: str | None = None
+
+# бюджет вежливости crawl-движка по источникам:
+#   concurrency  — одновременных запросов к хосту источника
+#   min_interval — минимум секунд между стартами запросов к одному хосту
+#   jitter       — случайная добавка к интервалу, сек
+CRAWL_BUDGETS: dict[str, dict[str, float]] = {
+    "olx":     {"concurrency": 4, "min_interval": 0.5, "jitter": 0.5},
+    "otodom":  {"concurrency": 4, "min_interval": 0.4, "jitter": 0.4},
+    "morizon": {"concurrency": 3, "min_interval": 0.6, "jitter": 0.6},
+    "nieruch": {"concurrency": 3, "min_interval": 0.6, "jitter": 0.6},
+}
+
+# проверка актуальности (parser/actual_cheker.py): тот же формат, что CRAWL_BUDGETS,
+# но запросы лёгкие (HEAD / GET на 1 байт) — держим сотни проверок в полёте
+CHECK_BUDGETS: dict[str, dict[str, float]] = {
+    "olx":     {"concurrency": 60, "min_interval": 0.03, "jitter": 0.03},
+    "otodom":  {"concurrency": 60, "min_interval": 0.03, "jitter": 0.03},
+    "morizon": {"concurrency": 30, "min_interval": 0.06, "jitter": 0.06},
+    "nieruch": {"concurrency": 30, "min_interval": 0.06, "jitter": 0.06},
+}
+CHECK_BATCH: int = 2000          # объявлений на один проход чекера
+CHECK_FLUSH_EVERY: int = 200     # результатов между bulk-записями last_check / DELETE
+CHECK_TIMEOUT: int = 15          # сек на один HEAD/GET
+# приоритет проверок: интервал = CHECK_INTERVAL_HOURS × множители (возраст, churn источника,
+# сохранения, недавняя рассылка), зажатый в [CHECK_MIN_INTERVAL_MIN, CHECK_MAX_INTERVAL_HOURS]
+CHECK_FIRST_DELAY_MIN: int = 60       # первая проверка свежего объявления
+CHECK_MIN_INTERVAL_MIN: int = 20
+CHECK_MAX_INTERVAL_HOURS: int = 48
+CHECK_CHURN_REF: float = 0.02         # «обычная» доля снятых за проход; выше — проверяем источник чаще
+
+# crawl-frontier парсеров: сколько последних URL помнить на ключ (source, город, тип, сделка)
+FRONTIER_CAP_PER_KEY: int = 5000
+# сколько раундов подряд объявление может не дойти до записи (сбой карточки/маппера/БД),
+# прежде чем frontier запомнит его как виденное и перестанет перекачивать
+FRONTIER_MAX_ATTEMPTS: int = 5
+# инкрементальный пейджер выдачи: листаем от новых, пока страница не окажется целиком известной
+PAGER_MAX_PAGES: int = 5             # не глубже (на пустом frontier ключа — только 1 страница)
+PAGER_TARGET_FILL: float = 0.5       # опрашиваем так, чтобы за интервал приходило ~полстраницы
+PAGER_MIN_INTERVAL: int = 60         # сек, не чаще
+PAGER_MAX_INTERVAL: int = 1800       # сек, не реже
+# планировщик опроса (parser/scheduler.py): бюджет опросов сегментов выдачи в минуту по источнику;
+# нет источника — столько же, сколько давал цикл «все сегменты раз в parser_pause»
+POLL_BUDGETS: dict[str, float] = {}
+# супервизор парсеров (parser/supervisor.py) и watchdog потоков в main.py:
+# после падения — пауза BASE·2^(n-1) (n — падений подряд) с джиттером, не больше MAX
+SUPERVISOR_BACKOFF_BASE: float = 10.0   # сек
+SUPERVISOR_BACKOFF_MAX: float = 900.0   # сек
+SUPERVISOR_ROUND_BUCKETS: tuple[float, ...] = (1, 5, 15, 30, 60, 120, 300, 600)  # сек, гистограмма раундов
+# разбор HTML (BeautifulSoup+lxml) парсеров — в пуле процессов (parser/parse_pool.py),
+# чтобы не делить GIL с ботом; 0 — разбирать в потоке (asyncio.to_thread)
+PARSE_WORKERS: int = max(1, (os.cpu_count() or 2) - 1)
 
 PROXIES_POOL: list[str] = [
     "193.28.191.99",
@@ -32,6 +91,12 @@ PROXIES_HOST = os.getenv("PROXIES_HOST")
 PROXIES_PORT = os.getenv("PROXIES_PORT")
 PROXIES_USERNAME = os.getenv("PROXIES_USERNAME")
 PROXIES_PASS = os.getenv("PROXIES_PASS")
+# здоровье прокси
+PROXY_EWMA_ALPHA: float = 0.3            # вес нового замера в EWMA задержки/ошибок
+PROXY_FAIL_THRESHOLD: int = 3            # ошибок подряд до карантина
+PROXY_COOLDOWN_BASE: float = 30.0        # сек, удваивается с каждым карантином/баном подряд
+PROXY_COOLDOWN_MAX: float = 1800.0
+PROXY_BAN_STATUSES = {403, 429}          # статусы = бан прокси на этом сайте
 
 DOMAIN = os.getenv("DOMAIN")
 MINIAPP_URL = f"{DOMAIN}/miniapp/"
@@ -128,8 +193,6 @@ PRIVACI_URLS = {
 }
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-# максимальное число одновременных запросов
-MAX_CONCURRENT_CHECKS = len(PROXIES_POOL)
 
 
 PAYU_POS_ID = os.getenv("PAYU_POS_ID")
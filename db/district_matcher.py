@@ -0,0 +1,185 @@
+# db/district_matcher.py
+from __future__ import annotations
+import bisect
+import math
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import CITY_DISTRICTS
+from db.text_match import AhoCorasick, fold
+
+LRU_SIZE = 4096       # недавние «сырые» строки районов
+_SEP = "\x00"         # разделитель в склейке имён для поиска input-in-name
+
+
+def normalize_text(text: str) -> str:
+    # удаляем диакритику, приводим к нижнему регистру, дефисы/запятые -> пробел
+    text = fold(text).strip().replace("-", " ").replace(",", " ")
+    return " ".join(text.split())  # убрать двойные пробелы
+
+
+class DistrictMatcher:
+    """
+    Предкомпилированный матчер районов одного города (строится один раз):
+      - exact: нормализованное имя -> оригинал;
+      - Ахо–Корасик по нормализованным именам (имя района внутри входной строки);
+      - склейка имён через \\x00 для обратного случая (входная строка внутри имени);
+      - имена, отсортированные по длине, для нечёткого сравнения.
+    Порядок приоритета тот же, что у прежнего normalize_district:
+    точное -> первое по списку частичное -> лучший fuzzy с ratio >= cutoff.
+    Нечёткий шаг даёт ровно то же, что get_close_matches(n=1, cutoff) по нормализованным именам:
+    отсев по длине — это real_quick_ratio (2·min(la, lb) / (la + lb) >= cutoff), точный,
+    а не эвристика; при равном ratio выигрывает большая строка, как у heapq.nlargest.
+    Имена с одинаковой нормализованной формой сведены, как dict в прежнем коде: место —
+    первого, оригинал — последнего. Отличия от прежнего кода: нормализация через
+    db.text_match.fold (ł -> l), поэтому «Białołęka» и «Bialoleka» совпадают точно, и пустая
+    после нормализации строка даёт None (прежний код находил "" в первом же имени).
+    """
+
+    def __init__(self, districts: Sequence[str]):
+        self.names: List[str] = list(districts)
+        by_norm: Dict[str, str] = {}
+        for d in self.names:
+            by_norm[normalize_text(d)] = d
+        self.norms: List[str] = list(by_norm)
+        self.origs: List[str] = list(by_norm.values())
+        self.exact: Dict[str, int] = {n: i for i, n in enumerate(self.norms)}
+        self.norm_ac = AhoCorasick((n, i) for i, n in enumerate(self.norms))
+        self.raw_ac = AhoCorasick((d, i) for i, d in enumerate(self.names))
+        # склейка для поиска input внутри имён
+        self._joined = _SEP.join(self.norms)
+        self._starts: List[int] = []
+        pos = 0
+        for n in self.norms:
+            self._starts.append(pos)
+            pos += len(n) + 1
+        # имена по длине: кандидаты fuzzy — окно длин, где real_quick_ratio >= cutoff
+        self._by_len: List[int] = sorted(range(len(self.norms)), key=lambda i: len(self.norms[i]))
+        self._lens: List[int] = [len(self.norms[i]) for i in self._by_len]
+
+    def _contained_in(self, needle: str) -> Optional[int]:
+        """Минимальный индекс имени, содержащего needle (имена склеены по порядку — первое вхождение и есть минимум)."""
+        start = self._joined.find(needle)
+        if start == -1:
+            return None
+        return bisect.bisect_right(self._starts, start) - 1
+
+    def _fuzzy(self, normalized: str, cutoff: float) -> Optional[int]:
+        la = len(normalized)
+        if cutoff > 0:
+            # 2·min(la, lb) / (la + lb) >= c  <=>  la·c / (2 − c) <= lb <= la·(2 − c) / c;
+            # окно берём с запасом на округление, точную проверку делает real_quick_ratio
+            lo = bisect.bisect_left(self._lens, math.floor(la * cutoff / (2 - cutoff)))
+            hi = bisect.bisect_right(self._lens, math.ceil(la * (2 - cutoff) / cutoff))
+        else:
+            lo, hi = 0, len(self._lens)
+        best: Optional[Tuple[float, str, int]] = None
+        sm = SequenceMatcher()
+        sm.set_seq2(normalized)
+        for i in self._by_len[lo:hi]:
+            name = self.norms[i]
+            sm.set_seq1(name)
+            floor = cutoff if best is None else max(cutoff, best[0])
+            if sm.real_quick_ratio() < floor or sm.quick_ratio() < floor:
+                continue
+            r = sm.ratio()
+            if r >= floor and (best is None or (r, name) > best[:2]):
+                best = (r, name, i)
+        return best[2] if best is not None else None
+
+    def match(self, district_str: str, cutoff: float = 0.7) -> Optional[str]:
+        normalized = normalize_text(district_str)
+        if not normalized:
+            return None
+        # прямое совпадение (идеальное)
+        i = self.exact.get(normalized)
+        if i is not None:
+            return self.origs[i]
+        # частичное совпадение (например, "mokotow sadyba" → "mokotow") — за один проход
+        hits = [idx for _, idx in self.norm_ac.iter(normalized)]
+        inner = self._contained_in(normalized)
+        if inner is not None:
+            hits.append(inner)
+        if hits:
+            return self.origs[min(hits)]
+        # fuzzy-поиск (нечёткое сравнение)
+        i = self._fuzzy(normalized, cutoff)
+        return self.origs[i] if i is not None else None
+
+    def find_in_address(self, address: str) -> Optional[str]:
+        """Первый по списку район, чьё имя (как есть) встречается в адресе."""
+        hits = [idx for _, idx in self.raw_ac.iter(address)]
+        return self.names[min(hits)] if hits else None
+
+
+_matchers: Dict[int, Tuple[Sequence[str], DistrictMatcher]] = {}
+
+
+def matcher_for(districts: Sequence[str]) -> DistrictMatcher:
+    """Матчер для списка районов (списки из CITY_DISTRICTS живут весь процесс — ключ по id)."""
+    cached = _matchers.get(id(districts))
+    if cached is not None and cached[0] is districts:
+        return cached[1]
+    m = DistrictMatcher(districts)
+    _matchers[id(districts)] = (districts, m)
+    return m
+
+
+@lru_cache(maxsize=LRU_SIZE)
+def match_city_district(city_name_pl: str, district_str: str, cutoff: float = 0.7) -> Optional[str]:
+    districts = CITY_DISTRICTS.get(city_name_pl)
+    if not districts or not district_str:
+        return None
+    return matcher_for(districts).match(district_str, cutoff)
+
+
+@lru_cache(maxsize=LRU_SIZE)
+def find_city_district_in_address(city_name_pl: str, address: str) -> Optional[str]:
+    districts = CITY_DISTRICTS.get(city_name_pl)
+    if not districts or not address:
+        return None
+    return matcher_for(districts).find_in_address(address)
+
+
+# -------------------------------
+#    micro-benchmark: python -m db.district_matcher
+# -------------------------------
+if __name__ == "__main__":
+    import timeit
+    from difflib import get_close_matches
+    import unicodedata
+
+    def _legacy(district_str, possible_distr_list, cutoff=0.7):
+        # прежняя реализация normalize_district (для сравнения)
+        def _normalize(text):
+            text = unicodedata.normalize("NFKD", text)
+            text = "".join(c for c in text if not unicodedata.combining(c))
+            text = text.lower().strip().replace("-", " ").replace(",", " ")
+            return " ".join(text.split())
+        normalized_input = _normalize(district_str)
+        normalized_map = {_normalize(d): d for d in possible_distr_list}
+        if normalized_input in normalized_map:
+            return normalized_map[normalized_input]
+        for norm_name, orig_name in normalized_map.items():
+            if norm_name in normalized_input or normalized_input in norm_name:
+                return orig_name
+        matches = get_close_matches(normalized_input, normalized_map.keys(), n=1, cutoff=cutoff)
+        return normalized_map[matches[0]] if matches else None
+
+    city = "Warszawa"
+    districts = CITY_DISTRICTS[city]
+    samples = ["Mokotów", "mokotow sadyba", "Zoliborz", "Praga Poludnie", "Wilanow Królikarnia", "Bemovo", "Nowhere"]
+    m = matcher_for(districts)
+    n = 2000
+
+    for s in samples:
+        print(f"{s!r:26} legacy={_legacy(s, districts)!r:18} matcher={m.match(s)!r}")
+
+    t_legacy = timeit.timeit(lambda: [_legacy(s, districts) for s in samples], number=n)
+    t_matcher = timeit.timeit(lambda: [m.match(s) for s in samples], number=n)
+    t_cached = timeit.timeit(lambda: [match_city_district(city, s) for s in samples], number=n)
+    per = n * len(samples)
+    print(f"legacy   {t_legacy / per * 1e6:8.2f} us/call")
+    print(f"matcher  {t_matcher / per * 1e6:8.2f} us/call (no LRU)")
+    print(f"cached   {t_cached / per * 1e6:8.2f} us/call (LRU)")
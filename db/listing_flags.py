@@ -0,0 +1,102 @@
+# db/listing_flags.py
+from __future__ import annotations
+import logging
+from typing import Optional, Tuple
+
+from sqlalchemy import select, update, or_
+from sqlalchemy.orm import Session
+
+from config import PETS_PHRASE, CHILD_PHRASE, PETS_CHILD_PHRASE, NO_COMISSION_PHRASE
+from db.models import Listing
+from db.text_match import AhoCorasick, fold
+
+logger = logging.getLogger("main")
+
+PETS = "pets"
+CHILD = "child"
+PETS_CHILD = "pets_child"
+NO_COMISSION = "no_comission"
+
+# один автомат на все четыре набора фраз (фразы и текст — без диакритики и в нижнем регистре)
+_SCANNER = AhoCorasick(
+    (fold(phrase), flag)
+    for flag, phrases in (
+        (PETS, PETS_PHRASE),
+        (CHILD, CHILD_PHRASE),
+        (PETS_CHILD, PETS_CHILD_PHRASE),
+        (NO_COMISSION, NO_COMISSION_PHRASE),
+    )
+    for phrase in phrases
+)
+
+Flags = Tuple[Optional[bool], Optional[bool], Optional[bool]]
+
+
+def extract_flags(desc: str | None, title: str | None) -> Flags:
+    """
+    (pets_allowed, child_allowed, no_comission) за один проход по описанию+названию.
+    Найдена запрещающая фраза — False, фраза «без комиссии» — True, иначе None.
+    """
+    hits = _SCANNER.payloads(fold(f"{desc or ''} {title or ''}"))
+    if not hits:
+        return None, None, None
+    no_comission = True if NO_COMISSION in hits else None
+    if PETS_CHILD in hits:
+        return False, False, no_comission
+    pets_allowed = False if PETS in hits else None
+    child_allowed = False if CHILD in hits else None
+    return pets_allowed, child_allowed, no_comission
+
+
+def reclassify_listings(session: Session, *, batch_size: int = 1000) -> int:
+    """
+    Пакетно прогоняет extract_flags по уже сохранённым объявлениям (например, после
+    пополнения списков фраз в config). Заполняются только пустые (NULL) флаги —
+    значения из структурированных полей источника (OLX params и т.п.) не трогаем.
+    Keyset-пагинация по id, один bulk UPDATE и commit на пачку. Возвращает число обновлённых строк.
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        rows = session.execute(
+            select(
+                Listing.id, Listing.description, Listing.title,
+                Listing.pets_allowed, Listing.child_allowed, Listing.no_comission,
+            )
+            .where(
+                Listing.id > last_id,
+                or_(
+                    Listing.pets_allowed.is_(None),
+                    Listing.child_allowed.is_(None),
+                    Listing.no_comission.is_(None),
+                ),
+            )
+            .order_by(Listing.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        changes = []
+        for lid, desc, title, pets, child, comm in rows:
+            new_pets, new_child, new_comm = extract_flags(desc, title)
+            vals = (
+                pets if pets is not None else new_pets,
+                child if child is not None else new_child,
+                comm if comm is not None else new_comm,
+            )
+            if vals != (pets, child, comm):
+                changes.append({
+                    "id": lid,
+                    "pets_allowed": vals[0],
+                    "child_allowed": vals[1],
+                    "no_comission": vals[2],
+                })
+        if changes:
+            session.execute(update(Listing), changes)
+            session.commit()
+            updated += len(changes)
+    logger.info("Reclassified flags for %d listings", updated)
+    return updated
+
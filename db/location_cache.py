@@ -0,0 +1,97 @@
+# db/location_cache.py
+from __future__ import annotations
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db.models import City, District
+from db.repo import upsert_city_by_name_pl, upsert_district_by_name_pl
+
+logger = logging.getLogger("main")
+
+
+class LocationResolver:
+    """
+    Кэш справочников городов/районов на процесс:
+      name_pl -> city_id, (city_id, name_pl) -> district_id.
+    Прогревается одним запросом из cities/districts; в БД идём только при промахе
+    (upsert_* как и раньше), после чего id кладётся в кэш.
+    Справочники только растут (ondelete=RESTRICT), поэтому инвалидация не нужна.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cities: Dict[str, int] = {}
+        self._districts: Dict[Tuple[int, str], int] = {}
+        self._warm = False
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self, session: Session) -> None:
+        cities = {name: cid for cid, name in session.execute(select(City.id, City.name_pl)).all()}
+        districts = {
+            (city_id, name): did
+            for did, city_id, name in session.execute(
+                select(District.id, District.city_id, District.name_pl)
+            ).all()
+        }
+        with self._lock:
+            self._cities.update(cities)
+            self._districts.update(districts)
+            self._warm = True
+        logger.info("Location cache warmed: %d cities, %d districts", len(cities), len(districts))
+
+    def _ensure_warm(self, session: Session) -> None:
+        if not self._warm:
+            try:
+                self.warm(session)
+            except Exception:
+                logger.exception("Location cache warm failed", exc_info=False)
+                self._warm = True  # не повторяем на каждом вызове, дальше — miss-only
+
+    def city_id(self, session: Session, name_pl: str) -> int:
+        self._ensure_warm(session)
+        cid = self._cities.get(name_pl)
+        if cid is not None:
+            self.hits += 1
+            return cid
+        self.misses += 1
+        cid = upsert_city_by_name_pl(session, name_pl=name_pl)
+        with self._lock:
+            self._cities[name_pl] = cid
+        return cid
+
+    def district_id(self, session: Session, city_id: int, name_pl: str) -> int:
+        self._ensure_warm(session)
+        key = (city_id, name_pl)
+        did = self._districts.get(key)
+        if did is not None:
+            self.hits += 1
+            return did
+        self.misses += 1
+        did = upsert_district_by_name_pl(session, city_id=city_id, name_pl=name_pl)
+        with self._lock:
+            self._districts[key] = did
+        return did
+
+    def snapshot(self) -> dict:
+        return {
+            "cities": len(self._cities),
+            "districts": len(self._districts),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# единый кэш на процесс (его используют все мапперы из всех парсерных потоков)
+location_cache = LocationResolver()
+
+
+def warm_location_cache() -> None:
+    """Прогрев при старте процесса."""
+    from db.session import get_sync_session
+    with get_sync_session() as session:
+        location_cache.warm(session)
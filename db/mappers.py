@@ -5,11 +5,12 @@ import re
 from bs4 import BeautifulSoup
 
 from sqlalchemy.orm import Session
-from db.repo import upsert_city_by_name_pl, upsert_district_by_name_pl
-import unicodedata
-from difflib import get_close_matches
+from db.location_cache import location_cache
+from db.district_matcher import matcher_for, match_city_district, find_city_district_in_address
 
-from config import CITIES_STR, CITY_DISTRICTS, PETS_PHRASE, CHILD_PHRASE, PETS_CHILD_PHRASE, NO_COMISSION_PHRASE
+from config import CITIES_STR
+from db.listing_flags import extract_flags
+from db.pre_extract import extract_rooms, pre_extract_address
 
 
 def normalize_district(
@@ -17,46 +18,19 @@ def normalize_district(
         possible_distr_list: tuple[str],
         cutoff: float=0.7) -> str | None:
     '''
-    тут нужно попытаться определить, попадает ли райно в список. 
+    тут нужно попытаться определить, попадает ли райно в список.
+    Матчер списка строится один раз (см. db/district_matcher.py).
     '''
     if not district_str or not possible_distr_list:
         return None
-    def _normalize(text: str) -> str:
-        # удаляем диакритику, пробелы, приводим к нижнему регистру
-        text = unicodedata.normalize("NFKD", text)
-        text = "".join(c for c in text if not unicodedata.combining(c))
-        text = text.lower().strip().replace("-", " ").replace(",", " ")
-        return " ".join(text.split())  # убрать двойные пробелы
-
-    # нормализованные формы
-    normalized_input = _normalize(district_str)
-    normalized_map = { _normalize(d): d for d in possible_distr_list }
-
-    # прямое совпадение (идеальное)
-    if normalized_input in normalized_map:
-        return normalized_map[normalized_input]
-
-    # частичное совпадение (например, "mokotow sadyba" → "mokotow")
-    for norm_name, orig_name in normalized_map.items():
-        if norm_name in normalized_input or normalized_input in norm_name:
-            return orig_name
-
-    # fuzzy-поиск (нечёткое сравнение)
-    matches = get_close_matches(normalized_input, normalized_map.keys(), n=1, cutoff=cutoff)
-    if matches:
-        return normalized_map[matches[0]]
-    return None
+    return matcher_for(possible_distr_list).match(district_str, cutoff)
     
 def extract_district(address: str, possible_distr_list: tuple[str]) -> str | None:
     '''
     '''
     if not address or not possible_distr_list:
         return None
-    
-    for district in possible_distr_list:
-        if district in address:
-            return district
-    return None
+    return matcher_for(possible_distr_list).find_in_address(address)
 
 
 ROOMS_MAP = {
@@ -68,9 +42,14 @@ ROOMS_MAP = {
     "more": 10,  # "więcej niż 10"
 }
 
-def exctract_text_from_html(raw_text: str) -> str:
+def exctract_text_from_html(raw_text: str, cleaned: bool = False) -> str:
     '''
+    Текст без HTML-разметки.
+    cleaned=True — строка уже очищена в пуле разбора (parser/html_text.py), возвращаем как есть:
+    повторный разбор раскрыл бы сущности второй раз («&amp;lt;» -> «<»).
     '''
+    if cleaned:
+        return raw_text
     if raw_text:
         try:
             soup = BeautifulSoup(raw_text, 'lxml')
@@ -80,35 +59,13 @@ def exctract_text_from_html(raw_text: str) -> str:
     return raw_text
 
 
-def pets_child_comission_from_desc(desc: str | None, title: str | None) -> tuple[bool | None, bool | None]:
+def pets_child_comission_from_desc(desc: str | None, title: str | None) -> tuple[bool | None, bool | None, bool | None]:
     """
-    Ищет фразы из PETS_PHRASE, CHILD_PHRASE, PETS_CHILD_PHRASE
-    в описании и названии. Если фраза найдена — ставим False
-    (запрещено). Если ничего не найдено — остаётся None.
+    Ищет фразы из PETS_PHRASE, CHILD_PHRASE, PETS_CHILD_PHRASE, NO_COMISSION_PHRASE
+    в описании и названии (один проход автоматом, см. db/listing_flags.py).
+    Если запрещающая фраза найдена — ставим False, если ничего не найдено — остаётся None.
     """
-    pets_allowed = None
-    child_allowed = None
-    no_comission = None
-
-    text = f"{desc or ''} {title or ''}".lower()
-    if any(p in text for p in NO_COMISSION_PHRASE):
-        no_comission = True
-
-    # если есть фраза, где запрещено и то, и то
-    if any(p in text for p in PETS_CHILD_PHRASE):
-        pets_allowed = False
-        child_allowed = False
-        return pets_allowed, child_allowed, no_comission
-
-    # отдельно проверяем животных
-    if any(p in text for p in PETS_PHRASE):
-        pets_allowed = False
-
-    # отдельно проверяем детей
-    if any(p in text for p in CHILD_PHRASE):
-        child_allowed = False
-
-    return pets_allowed, child_allowed, no_comission
+    return extract_flags(desc, title)
 
 
 def _norm_url(u: str | None) -> str | None:
@@ -123,6 +80,7 @@ def map_olx_to_listing(
     *,
     property_type: str = "apartment",   # apartment | house | room  (совместимо с CheckConstraint)
     deal_type: str = "sale",            # rent | sale (можно менять в парсере)
+    cleaned: bool = False,              # title/description уже текстом (clean_offer_texts)
     ) -> Dict[str, Any]:
     """
     Преобразует OLX JSON-объект в dict для модели Listing.
@@ -133,8 +91,8 @@ def map_olx_to_listing(
     url = _norm_url(offer.get("url"))
     external_url = _norm_url(offer.get("external_url"))
 
-    title = exctract_text_from_html(offer.get("title"))
-    description = exctract_text_from_html(offer.get("description"))
+    title = exctract_text_from_html(offer.get("title"), cleaned)
+    description = exctract_text_from_html(offer.get("description"), cleaned)
 
     # --- Локация ---
     loc = offer.get("location") or {}
@@ -142,18 +100,16 @@ def map_olx_to_listing(
     city_name_pl = city_name_pl.strip().title()
     if city_name_pl not in CITIES_STR:
         return None
-    city_id = upsert_city_by_name_pl(session, name_pl=city_name_pl)
+    city_id = location_cache.city_id(session, city_name_pl)
 
     district_id = None
     district_str: str = (loc.get("district") or {}).get("name")
-    district_name_pl = normalize_district(district_str, CITY_DISTRICTS.get(city_name_pl))
+    district_name_pl = match_city_district(city_name_pl, district_str)
     if district_name_pl:
-        district_id = upsert_district_by_name_pl(
-            session,
-            city_id=city_id,
-            name_pl=district_name_pl)
+        district_id = location_cache.district_id(session, city_id, district_name_pl)
 
-    address = None  # определим позже через GPT
+    # улица из заголовка/описания по правилам; иначе определим позже через GPT
+    address, address_confident = pre_extract_address(city_name_pl, district_name_pl, title, description)
 
     # --- Числовые/категориальные поля ---
     area_m2: Optional[float] = None
@@ -212,6 +168,9 @@ def map_olx_to_listing(
     photos = photos or None
 
 
+    # детерминированное доизвлечение (без LLM)
+    if rooms is None:
+        rooms = extract_rooms(title, description, property_type)
     return dict(
         source=source,
         source_ad_id=source_ad_id,
@@ -224,6 +183,7 @@ def map_olx_to_listing(
         city_id=city_id,
         district_id=district_id,
         address=address,
+        address_confident=address_confident,
         area_m2=area_m2,
         rooms=rooms,
         price=price,
@@ -242,6 +202,7 @@ def map_otodom_to_listing(
     *,
     property_type: str = "apartment",   # apartment | house | room
     deal_type: str = "sale",            # sale | rent
+    cleaned: bool = False,              # title/description уже текстом (parse_ad_page)
 ) -> Dict[str, Any]:
     """
     Преобразует Otodom ad (из props.pageProps.ad) в dict для модели Listing.
@@ -257,8 +218,8 @@ def map_otodom_to_listing(
     # ---------- заголовок/описание ----------
     title_raw = ad.get("title")
     description_html = ad.get("description")
-    title = exctract_text_from_html(title_raw) if isinstance(title_raw, str) else title_raw
-    description = exctract_text_from_html(description_html)
+    title = exctract_text_from_html(title_raw, cleaned) if isinstance(title_raw, str) else title_raw
+    description = exctract_text_from_html(description_html, cleaned)
 
     # ---------- deal_type / property_type (переопределим, если точно знаем) ----------
     # ad.adCategory: {"name": "FLAT","type": "SELL"}
@@ -287,17 +248,21 @@ def map_otodom_to_listing(
     city_name_pl = city_name_pl.strip().title()
     if city_name_pl not in CITIES_STR:
         return None
-    city_id = upsert_city_by_name_pl(session, name_pl=city_name_pl)
+    city_id = location_cache.city_id(session, city_name_pl)
 
     district_id = None
     district_str = (addr.get("district") or {}).get("name")
-    district_name_pl = normalize_district(district_str, CITY_DISTRICTS.get(city_name_pl))
+    district_name_pl = match_city_district(city_name_pl, district_str)
     if district_name_pl:
-        district_id = upsert_district_by_name_pl(session, city_id=city_id, name_pl=district_name_pl)
+        district_id = location_cache.district_id(session, city_id, district_name_pl)
 
-    # address (строковое поле модели) — положим улицу, если она есть
+    # address (строковое поле модели): есть улица (поле источника или правила) — готовый адрес;
+    # иначе сырые части для LLM-шага адреса
     street_name = (addr.get("street") or {}).get("name")
-    address = ','.join([el for el in [street_name, district_str, city_name_pl] if el])
+    address, address_confident = pre_extract_address(
+        city_name_pl, district_name_pl or district_str, title, description, street=street_name)
+    if not address_confident:
+        address = ','.join([el for el in [district_str, city_name_pl] if el])
 
     # ---------- цена / валюта ----------
     price = None
@@ -390,6 +355,9 @@ def map_otodom_to_listing(
                 photos.append(u)
     photos = photos or None
 
+    # детерминированное доизвлечение (без LLM)
+    if rooms is None:
+        rooms = extract_rooms(title, description, property_type)
     return dict(
         source=source,
         source_ad_id=source_ad_id,
@@ -402,6 +370,7 @@ def map_otodom_to_listing(
         city_id=city_id,
         district_id=district_id,
         address=address,
+        address_confident=address_confident,
         area_m2=area_m2,
         rooms=rooms,
         price=price,
@@ -434,14 +403,18 @@ def map_morizon_to_listing(
 
     # --- Локация ---
     city_name_pl = offer.get("city")
-    city_id = upsert_city_by_name_pl(session, name_pl=city_name_pl)
+    city_id = location_cache.city_id(session, city_name_pl)
 
     address = offer.get("address")
-    district_name_pl = extract_district(address, CITY_DISTRICTS.get(city_name_pl))
+    district_name_pl = find_city_district_in_address(city_name_pl, address)
     district_id = None
+    # сырой адрес источника оставляем LLM; уверенный — только если правила нашли улицу
+    rule_address, address_confident = pre_extract_address(city_name_pl, district_name_pl, title, description)
+    if address_confident:
+        address = rule_address
 
     if district_name_pl:
-        district_id = upsert_district_by_name_pl(session, city_id=city_id, name_pl=district_name_pl)
+        district_id = location_cache.district_id(session, city_id, district_name_pl)
 
 
     # --- Числа ---
@@ -469,6 +442,9 @@ def map_morizon_to_listing(
 
     photos = offer.get("images") or None
 
+    # детерминированное доизвлечение (без LLM)
+    if rooms is None:
+        rooms = extract_rooms(title, description, property_type)
     return dict(
         source=source,
         source_ad_id=source_ad_id or url,
@@ -481,6 +457,7 @@ def map_morizon_to_listing(
         city_id=city_id,
         district_id=district_id,
         address=address,
+        address_confident=address_confident,
         area_m2=area_m2,
         rooms=rooms,
         price=price,
@@ -514,14 +491,18 @@ def map_nieruch_to_listing(
 
     # --- Локация ---
     city_name_pl = offer.get("city")
-    city_id = upsert_city_by_name_pl(session, name_pl=city_name_pl)
+    city_id = location_cache.city_id(session, city_name_pl)
 
     address = offer.get("address")
-    district_name_pl = extract_district(address, CITY_DISTRICTS.get(city_name_pl))
+    district_name_pl = find_city_district_in_address(city_name_pl, address)
     district_id = None
+    # сырой адрес источника оставляем LLM; уверенный — только если правила нашли улицу
+    rule_address, address_confident = pre_extract_address(city_name_pl, district_name_pl, title, description)
+    if address_confident:
+        address = rule_address
 
     if district_name_pl:
-        district_id = upsert_district_by_name_pl(session, city_id=city_id, name_pl=district_name_pl)
+        district_id = location_cache.district_id(session, city_id, district_name_pl)
 
     
 
@@ -547,6 +528,9 @@ def map_nieruch_to_listing(
     # --- Фото ---
     images = offer.get("images") or None
 
+    # детерминированное доизвлечение (без LLM)
+    if rooms is None:
+        rooms = extract_rooms(title, description, property_type)
     return dict(
         source=source,
         source_ad_id=source_ad_id or url,
@@ -559,6 +543,7 @@ def map_nieruch_to_listing(
         city_id=city_id,
         district_id=district_id,
         address=address,
+        address_confident=address_confident,
         area_m2=area_m2,
         rooms=rooms,
         price=price,
@@ -0,0 +1,437 @@
+# db/match_index.py
+from __future__ import annotations
+import logging
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import event, select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from db.models import Listing, User, UserSearch, UserSearchDistrict
+
+logger = logging.getLogger("bot.worker")
+
+# --- настройки индекса ---
+FULL_RELOAD_INTERVAL = 30 * 60   # полная перезагрузка индекса, сек (подбирает удалённые фильтры и т.п.)
+DELTA_SYNC_INTERVAL = 5.0        # как часто подтягивать изменения по updated_at/last_active_at, сек
+WATERMARK_OVERLAP = 10.0         # нахлёст водяной метки, чтобы не потерять записи на границе, сек
+CHUNK_SIZE = 1000
+
+_NEG_INF = float("-inf")
+_POS_INF = float("inf")
+
+BucketKey = tuple[int, str, str]   # (city_id, deal_type, property_type)
+
+
+def _f(value) -> Optional[float]:
+    """Numeric/Decimal -> float (None остаётся None)."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class _SearchEntry:
+    """
+    Компактный снимок подтверждённого UserSearch — только то, что нужно для матчинга.
+    """
+    search_id: int
+    user_id: int
+    deal_type: str
+    property_type: str
+    market: Optional[str]
+    district_ids: frozenset[int]
+    area_min: Optional[float]
+    area_max: Optional[float]
+    price_min: Optional[float]
+    price_max: Optional[float]
+    rooms: Optional[frozenset[int]]
+    pets_allowed: Optional[bool]
+    child_allowed: Optional[bool]
+    no_comission: Optional[bool]
+
+    def matches(
+        self,
+        *,
+        market: Optional[str],
+        district_id: Optional[int],
+        area: Optional[float],
+        price: Optional[float],
+        rooms: Optional[int],
+        pets_allowed: Optional[bool],
+        child_allowed: Optional[bool],
+        no_comission: Optional[bool],
+    ) -> bool:
+        """
+        Те же правила, что и в repo_async.find_searches_for_listing
+        (NULL у листинга при заданной границе фильтра — не совпадение, как в SQL).
+        """
+        # market: только если у фильтра sale и market задан
+        if self.deal_type == "sale" and self.market is not None and self.market != market:
+            return False
+
+        # districts: нет выбранных => любой
+        if self.district_ids and district_id not in self.district_ids:
+            return False
+
+        # area: кроме property_type='room'
+        if self.property_type != "room":
+            if self.area_min is not None and (area is None or area < self.area_min):
+                return False
+            if self.area_max is not None and (area is None or area > self.area_max):
+                return False
+
+        # price: нижняя граница уже отсечена бинпоиском, проверяем верхнюю
+        if self.price_max is not None and (price is None or price > self.price_max):
+            return False
+
+        # rooms: только если фильтр не 'room' и rooms задан; 5 == "5+"
+        if self.property_type != "room" and self.rooms is not None:
+            if rooms is None:
+                return False
+            if rooms not in self.rooms and not (rooms >= 5 and 5 in self.rooms):
+                return False
+
+        # pets/children: только для аренды; True у фильтра -> листинг НЕ False
+        if self.deal_type == "rent":
+            if self.child_allowed is True and child_allowed is False:
+                return False
+            if self.pets_allowed is True and pets_allowed is False:
+                return False
+
+        if not no_comission and self.no_comission is True:
+            return False
+
+        return True
+
+
+class _Bucket:
+    """
+    Фильтры одного ключа (city_id, deal_type, property_type),
+    отсортированные по price_min — кандидаты берутся префиксом через bisect.
+    """
+    __slots__ = ("entries", "_keys", "_sorted", "_dirty")
+
+    def __init__(self) -> None:
+        self.entries: dict[int, _SearchEntry] = {}
+        self._keys: list[float] = []
+        self._sorted: list[_SearchEntry] = []
+        self._dirty = False
+
+    def put(self, entry: _SearchEntry) -> None:
+        self.entries[entry.search_id] = entry
+        self._dirty = True
+
+    def drop(self, search_id: int) -> None:
+        if self.entries.pop(search_id, None) is not None:
+            self._dirty = True
+
+    def _rebuild(self) -> None:
+        ordered = sorted(
+            self.entries.values(),
+            key=lambda e: _NEG_INF if e.price_min is None else e.price_min,
+        )
+        self._sorted = ordered
+        self._keys = [_NEG_INF if e.price_min is None else e.price_min for e in ordered]
+        self._dirty = False
+
+    def candidates(self, price: Optional[float]) -> list[_SearchEntry]:
+        """Все фильтры с price_min <= price (без нижней границы — всегда)."""
+        if self._dirty:
+            self._rebuild()
+        hi = bisect_right(self._keys, _NEG_INF if price is None else price)
+        return self._sorted[:hi]
+
+
+class SearchMatchIndex:
+    """
+    Резидентный обратный индекс «листинг → подписчики».
+
+    Держит в памяти все подтверждённые UserSearch (+ районы, комнаты) и
+    активных пользователей с подпиской. Матчинг листинга — чистый lookup
+    без запросов к БД. Свежесть:
+      - изменения UserSearch/User в этом процессе ловятся after_flush-хуком;
+      - изменения из других процессов (миниапп, платежи) — дельтой по
+        UserSearch.updated_at / User.last_active_at;
+      - раз в FULL_RELOAD_INTERVAL — полная перезагрузка.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: dict[BucketKey, _Bucket] = {}
+        self._entry_key: dict[int, BucketKey] = {}            # search_id -> ключ корзины
+        self._subscribers: dict[int, Optional[datetime]] = {}  # user_id -> subscription_until (только активные)
+        self._dirty_searches: set[int] = set()
+        self._dirty_users: set[int] = set()
+        self._loaded_at: float = 0.0
+        self._synced_at: float = 0.0
+        self._watermark: Optional[datetime] = None
+
+    # ---------- состояние ----------
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded_at > 0
+
+    def stats(self) -> dict:
+        return {
+            "searches": len(self._entry_key),
+            "buckets": len(self._buckets),
+            "subscribers": len(self._subscribers),
+            "loaded_at": self._loaded_at,
+            "synced_at": self._synced_at,
+        }
+
+    def mark_search_dirty(self, search_id: int) -> None:
+        if search_id is not None:
+            self._dirty_searches.add(search_id)
+
+    def mark_user_dirty(self, user_id: int) -> None:
+        if user_id is not None:
+            self._dirty_users.add(user_id)
+
+    # ---------- инкрементальные обновления ----------
+    def upsert_search(
+        self,
+        *,
+        search_id: int,
+        user_id: int,
+        has_confirmed_policy: bool,
+        city_id: Optional[int],
+        deal_type: Optional[str],
+        property_type: Optional[str],
+        market: Optional[str],
+        district_ids: Iterable[int],
+        area_min, area_max, price_min, price_max,
+        rooms: Optional[list],
+        pets_allowed: Optional[bool],
+        child_allowed: Optional[bool],
+        no_comission: Optional[bool],
+    ) -> None:
+        """Добавляет/обновляет фильтр. Неподтверждённые и неполные — удаляются из индекса."""
+        self.remove_search(search_id)
+        # NULL city/deal/property в SQL-пути никогда не совпадает — не индексируем
+        if not has_confirmed_policy or city_id is None or not deal_type or not property_type:
+            return
+
+        rooms_set = None
+        if rooms is not None:
+            try:
+                rooms_set = frozenset(int(r) for r in rooms if r is not None)
+            except Exception:
+                rooms_set = frozenset()
+
+        entry = _SearchEntry(
+            search_id=search_id,
+            user_id=user_id,
+            deal_type=deal_type,
+            property_type=property_type,
+            market=market,
+            district_ids=frozenset(d for d in district_ids if d is not None),
+            area_min=_f(area_min),
+            area_max=_f(area_max),
+            price_min=_f(price_min),
+            price_max=_f(price_max),
+            rooms=rooms_set,
+            pets_allowed=pets_allowed,
+            child_allowed=child_allowed,
+            no_comission=no_comission,
+        )
+        key = (city_id, deal_type, property_type)
+        self._buckets.setdefault(key, _Bucket()).put(entry)
+        self._entry_key[search_id] = key
+
+    def remove_search(self, search_id: int) -> None:
+        key = self._entry_key.pop(search_id, None)
+        if key is None:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.drop(search_id)
+            if not bucket.entries:
+                self._buckets.pop(key, None)
+
+    def set_user(self, user_id: int, is_active: bool, subscription_until: Optional[datetime]) -> None:
+        if is_active and subscription_until is not None:
+            self._subscribers[user_id] = subscription_until
+        else:
+            self._subscribers.pop(user_id, None)
+
+    # ---------- матчинг ----------
+    def match(self, listing: Listing, now: Optional[datetime] = None) -> list[int]:
+        """
+        Возвращает id пользователей (активных, с действующей подпиской),
+        чьи фильтры подходят под listing. Без обращений к БД.
+        """
+        if listing is None:
+            return []
+        bucket = self._buckets.get((listing.city_id, listing.deal_type, listing.property_type))
+        if bucket is None:
+            return []
+
+        now = now or datetime.now(timezone.utc)
+        price = _f(listing.price)
+        kwargs = dict(
+            market=listing.market,
+            district_id=listing.district_id,
+            area=_f(listing.area_m2),
+            price=price,
+            rooms=listing.rooms,
+            pets_allowed=listing.pets_allowed,
+            child_allowed=listing.child_allowed,
+            no_comission=listing.no_comission,
+        )
+
+        user_ids: set[int] = set()
+        subscribers = self._subscribers
+        for entry in bucket.candidates(price):
+            if entry.user_id in user_ids:
+                continue
+            until = subscribers.get(entry.user_id)
+            if until is None or until <= now:
+                continue
+            if entry.matches(**kwargs):
+                user_ids.add(entry.user_id)
+        return sorted(user_ids)
+
+    # ---------- загрузка из БД ----------
+    async def _load_searches(self, session: AsyncSession, where) -> list[int]:
+        """Грузит фильтры по условию where и применяет их к индексу. Возвращает загруженные id."""
+        rows = (await session.execute(
+            select(
+                UserSearch.id, UserSearch.user_id, UserSearch.has_confirmed_policy,
+                UserSearch.city_id, UserSearch.deal_type, UserSearch.property_type,
+                UserSearch.market, UserSearch.area_min, UserSearch.area_max,
+                UserSearch.price_min, UserSearch.price_max, UserSearch.rooms,
+                UserSearch.pets_allowed, UserSearch.child_allowed, UserSearch.no_comission,
+            ).where(where)
+        )).all()
+        if not rows:
+            return []
+
+        ids = [r.id for r in rows]
+        districts: dict[int, list[int]] = {}
+        for i in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[i:i + CHUNK_SIZE]
+            res = await session.execute(
+                select(UserSearchDistrict.search_id, UserSearchDistrict.district_id)
+                .where(UserSearchDistrict.search_id.in_(chunk))
+            )
+            for search_id, district_id in res.all():
+                districts.setdefault(search_id, []).append(district_id)
+
+        for r in rows:
+            self.upsert_search(
+                search_id=r.id,
+                user_id=r.user_id,
+                has_confirmed_policy=bool(r.has_confirmed_policy),
+                city_id=r.city_id,
+                deal_type=r.deal_type,
+                property_type=r.property_type,
+                market=r.market,
+                district_ids=districts.get(r.id, ()),
+                area_min=r.area_min, area_max=r.area_max,
+                price_min=r.price_min, price_max=r.price_max,
+                rooms=r.rooms,
+                pets_allowed=r.pets_allowed,
+                child_allowed=r.child_allowed,
+                no_comission=r.no_comission,
+            )
+        return ids
+
+    async def _load_users(self, session: AsyncSession, where) -> list[int]:
+        rows = (await session.execute(
+            select(User.id, User.is_active, User.subscription_until).where(where)
+        )).all()
+        for user_id, is_active, until in rows:
+            self.set_user(user_id, bool(is_active), until)
+        return [r[0] for r in rows]
+
+    async def load(self, session: AsyncSession) -> None:
+        """Полная (пере)загрузка индекса."""
+        started = datetime.now(timezone.utc)
+        t0 = time.perf_counter()
+        fresh = SearchMatchIndex()
+        await fresh._load_searches(session, UserSearch.has_confirmed_policy.is_(True))
+        await fresh._load_users(
+            session,
+            (User.is_active.is_(True)) & (User.subscription_until.is_not(None)) & (User.subscription_until > started),
+        )
+        # атомарная подмена структур (всё в одном event loop)
+        self._buckets = fresh._buckets
+        self._entry_key = fresh._entry_key
+        self._subscribers = fresh._subscribers
+        self._loaded_at = self._synced_at = time.time()
+        self._watermark = started - timedelta(seconds=WATERMARK_OVERLAP)
+        logger.info(
+            "[MATCH] index loaded: searches=%d buckets=%d subscribers=%d in %.1f ms",
+            len(self._entry_key), len(self._buckets), len(self._subscribers),
+            (time.perf_counter() - t0) * 1000,
+        )
+
+    async def sync(self, session: AsyncSession, force: bool = False) -> None:
+        """
+        Поддерживает индекс свежим:
+          - нет индекса / истёк FULL_RELOAD_INTERVAL -> полная загрузка;
+          - иначе дельта: «грязные» id из этого процесса + всё, что менялось после водяной метки.
+        """
+        now_ts = time.time()
+        if not self.is_loaded or now_ts - self._loaded_at >= FULL_RELOAD_INTERVAL:
+            self._dirty_searches.clear()
+            self._dirty_users.clear()
+            await self.load(session)
+            return
+        if not force and not self._dirty_searches and not self._dirty_users \
+                and now_ts - self._synced_at < DELTA_SYNC_INTERVAL:
+            return
+
+        started = datetime.now(timezone.utc)
+        dirty_searches, self._dirty_searches = self._dirty_searches, set()
+        dirty_users, self._dirty_users = self._dirty_users, set()
+        watermark = self._watermark or started
+
+        try:
+            search_where = UserSearch.updated_at > watermark
+            if dirty_searches:
+                search_where = or_(search_where, UserSearch.id.in_(dirty_searches))
+            loaded = set(await self._load_searches(session, search_where))
+            # фильтры, которых больше нет в БД (удалены каскадом и т.п.)
+            for search_id in dirty_searches - loaded:
+                self.remove_search(search_id)
+
+            user_where = User.last_active_at > watermark
+            if dirty_users:
+                user_where = or_(user_where, User.id.in_(dirty_users))
+            loaded_users = set(await self._load_users(session, user_where))
+            for user_id in dirty_users - loaded_users:
+                self._subscribers.pop(user_id, None)
+        except Exception:
+            # вернём «грязные» id, чтобы не потерять их до следующей попытки
+            self._dirty_searches |= dirty_searches
+            self._dirty_users |= dirty_users
+            raise
+
+        self._synced_at = now_ts
+        self._watermark = started - timedelta(seconds=WATERMARK_OVERLAP)
+
+
+# единственный экземпляр на процесс
+match_index = SearchMatchIndex()
+
+
+@event.listens_for(Session, "after_flush")
+def _track_search_changes(session: Session, flush_context) -> None:
+    """
+    Помечает изменённые в этом процессе фильтры/пользователей как «грязные»
+    (районы меняются через secondary и не трогают updated_at — ловим здесь).
+    """
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, UserSearch):
+            match_index.mark_search_dirty(obj.id)
+        elif isinstance(obj, User):
+            match_index.mark_user_dirty(obj.id)
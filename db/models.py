@@ -1,10 +1,10 @@
 # db/models.py
 from datetime import datetime, timezone
 from sqlalchemy import (
-    String, Integer, BigInteger, Numeric, Boolean, DateTime, Text, ForeignKey,
+    String, Integer, BigInteger, Numeric, Boolean, DateTime, Text, ForeignKey, Float,
     Index, UniqueConstraint, CheckConstraint, Computed, text
 )
-from config import LANGUAGES
+from config import LANGUAGES, CHECK_FIRST_DELAY_MIN
 from urllib.parse import quote_plus
 from sqlalchemy.dialects.postgresql import JSONB, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship, DeclarativeBase
@@ -129,6 +129,10 @@ class Listing(Base):
     
     # флаг, что переводы добавлены
     is_translated: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # аренда строки переводчиком: до этого момента листинг «в работе», потом снова доступен
+    translate_lease_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # неудачных попыток перевода подряд (растёт пауза до следующей, см. parser/translater_w.py)
+    translate_attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # ссылки
     url: Mapped[str | None] = mapped_column(Text)
@@ -138,6 +142,8 @@ class Listing(Base):
     city_id: Mapped[int] = mapped_column(ForeignKey("cities.id", ondelete="RESTRICT"), nullable=False)
     district_id: Mapped[int | None] = mapped_column(ForeignKey("districts.id", ondelete="SET NULL"))
     address: Mapped[str | None] = mapped_column(Text)
+    # адрес собран правилами/из поля улицы источника — LLM-шаг адреса не нужен (db/pre_extract.py)
+    address_confident: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false", nullable=False)
 
     # метрики
     area_m2: Mapped[float | None] = mapped_column(Numeric(10, 2))
@@ -153,6 +159,8 @@ class Listing(Base):
     no_comission: Mapped[bool | None] = mapped_column(Boolean, nullable=True, default=None)
     
     is_sended: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    # tombstone: объявление снято на источнике (чекер); строка живёт до компактизации
+    removed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, default=None)
     # медиа и сырой payload
     photos: Mapped[list[str] | None] = mapped_column(JSONB)
     tg_photo_id: Mapped[str | None] = mapped_column(String(256), nullable=True, default=None)
@@ -167,6 +175,12 @@ class Listing(Base):
         nullable=False,
         index=True,
     )
+    # когда проверять актуальность в следующий раз (эпоха, сек); считает чекер по приоритету
+    next_check: Mapped[int] = mapped_column(
+        BigInteger,
+        default=lambda: int(time()) + CHECK_FIRST_DELAY_MIN * 60,
+        nullable=False,
+    )
     city: Mapped[City] = relationship("City")
     district: Mapped[District | None] = relationship("District")
     
@@ -270,9 +284,19 @@ class Listing(Base):
             "city_id", "property_type", "deal_type", "description_hash"
         ),
         Index("ix_listings_city", "city_id"),
-        Index("ix_listings_city_deal", "city_id", "deal_type"),
+        # поиск/выдача — только живые объявления
+        Index("ix_listings_city_deal", "city_id", "deal_type", postgresql_where=text("removed_at IS NULL")),
         Index("ix_listings_property_type", "property_type"),
         Index("ix_listings_price", "price"),
+        # дедуп URL ↔ external_url при пакетной вставке
+        Index("ix_listings_url", "url"),
+        Index("ix_listings_external_url", "external_url"),
+        # очередь переводчика
+        Index("ix_listings_untranslated", "id", postgresql_where=text("NOT is_translated AND removed_at IS NULL")),
+        # очередь чекера актуальности (range scan next_check <= now), снятые не проверяем
+        Index("ix_listings_next_check", "next_check", postgresql_where=text("removed_at IS NULL")),
+        # компактизация tombstone-ов
+        Index("ix_listings_removed_at", "removed_at", postgresql_where=text("removed_at IS NOT NULL")),
     )
 
 
@@ -929,4 +953,108 @@ class Statistic(Base):
         Index("ix_statistics_key", "key"),
         Index("ix_statistics_user_created", "user_id", "created_at"),
         Index("ix_statistics_city_created", "city_id", "created_at"),
-    )
\ No newline at end of file
+    )
+
+class TranslationCache(Base):
+    """
+    Кэш переводов по содержимому: ключ — sha256(title, description, версия промпта).
+    Перепосты одного объявления на разных сайтах переводятся один раз.
+    """
+    __tablename__ = "translation_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    result: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    hits: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    last_hit_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_translation_cache_last_hit_at", "last_hit_at"),
+    )
+
+
+class ListingMessage(Base):
+    """
+    Сообщение с листингом, отправленное до готовности перевода (режим быстрой доставки).
+    Когда перевод появился, сообщение редактируется на месте, а строка удаляется.
+    """
+    __tablename__ = "listing_messages"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    listing_id: Mapped[int] = mapped_column(
+        ForeignKey("listings.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    message_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # язык, под который нужно перерисовать сообщение
+    lang: Mapped[str | None] = mapped_column(String(8), nullable=True)
+    # фото+caption или текст — от этого зависит метод редактирования
+    has_photo: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_listing_messages_listing", "listing_id"),
+        Index("ix_listing_messages_created", "created_at"),
+    )
+
+
+class ListingTombstone(Base):
+    """
+    След физически удалённого (после компактизации) снятого объявления — только ключи дедупа,
+    чтобы то же объявление не загрузили и не разослали повторно.
+    """
+    __tablename__ = "listing_tombstones"
+
+    source: Mapped[str] = mapped_column(String(32), primary_key=True)
+    source_ad_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    url: Mapped[str | None] = mapped_column(Text)
+    external_url: Mapped[str | None] = mapped_column(Text)
+    removed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+    __table_args__ = (
+        Index("ix_listing_tombstones_url", "url"),
+        Index("ix_listing_tombstones_external_url", "external_url"),
+        Index("ix_listing_tombstones_removed_at", "removed_at"),
+    )
+
+
+class CrawlFrontierState(Base):
+    """
+    Чекпоинт crawl-frontier парсера (parser/frontier.py) по ключу выдачи (source + city/type/deal):
+    ограниченный LRU хэшей уже виденных URL и водяной знак (для OLX — последний offer.id).
+    """
+    __tablename__ = "crawl_frontier"
+
+    source: Mapped[str] = mapped_column(String(32), primary_key=True)
+    key: Mapped[str] = mapped_column(String(256), primary_key=True)
+    # 63-битные хэши URL, от старых к свежим
+    seen: Mapped[list[int]] = mapped_column(JSONB, nullable=False, default=list)
+    watermark: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    # темп появления новых объявлений (EWMA, шт/сек) и время последнего опроса ключа
+    rate: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    polled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
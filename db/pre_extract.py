@@ -0,0 +1,84 @@
+# db/pre_extract.py
+from __future__ import annotations
+import re
+from typing import Optional, Tuple
+
+# словесные формы «N-pokojowe»
+_ROOM_WORDS = {
+    "jednopokojow": 1, "dwupokojow": 2, "trzypokojow": 3,
+    "czteropokojow": 4, "pięciopokojow": 5, "pieciopokojow": 5,
+}
+_RE_STUDIO = re.compile(r"\b(kawalerk\w*|garsonier\w*|studio)\b", re.I)
+_RE_ROOM_WORD = re.compile(r"\b(" + "|".join(_ROOM_WORDS) + r")\w*", re.I)
+_RE_ROOMS_NUM = re.compile(r"\b(\d{1,2})\s*[-–]?\s*(?:pok(?:oje|oi|ój|oj|ojow\w*|\.)?)(?=\W|$)", re.I)
+
+_UPPER = "A-ZĄĆĘŁŃÓŚŹŻ"
+_WORD = r"[\wąćęłńóśźżĄĆĘŁŃÓŚŹŻ.\-]"
+_RE_STREET = re.compile(
+    r"(?i:\b(ul\.|ulic[ayi]|al\.|alej[ai]|aleja|pl\.|plac[u]?|os\.|osiedl[eu])\s+)"
+    rf"([{_UPPER}0-9]{_WORD}*(?:\s+[{_UPPER}]{_WORD}*){{0,3}})"
+    r"(?:\s+(\d{1,4}[A-Za-z]?)\b)?"
+)
+_PREFIX = {"ul": "ul.", "al": "al.", "pl": "pl.", "os": "os."}
+
+
+def extract_rooms(title: Optional[str], description: Optional[str], property_type: Optional[str] = None) -> Optional[int]:
+    """
+    Кол-во комнат по правилам (как в промпте: kawalerka/studio и pokój do wynajęcia = 1).
+    Сначала заголовок, потом описание. None, если уверенного совпадения нет.
+    """
+    if property_type == "room":
+        return 1
+    for text in (title, description):
+        if not text:
+            continue
+        m = _RE_ROOMS_NUM.search(text)
+        if m:
+            n = int(m.group(1))
+            if 1 <= n <= 10:
+                return n
+        m = _RE_ROOM_WORD.search(text)
+        if m:
+            return _ROOM_WORDS[m.group(1).lower()]
+        if _RE_STUDIO.search(text):
+            return 1
+    return None
+
+
+def extract_street(title: Optional[str], description: Optional[str]) -> Optional[str]:
+    """'ul. Marszałkowska 12' из заголовка/описания или None."""
+    for text in (title, description):
+        if not text:
+            continue
+        m = _RE_STREET.search(text)
+        if not m:
+            continue
+        prefix = _PREFIX[m.group(1)[:2].lower()]
+        name = m.group(2).rstrip(".,-")
+        number = m.group(3)
+        return f"{prefix} {name} {number}" if number else f"{prefix} {name}"
+    return None
+
+
+def build_address(city: Optional[str], district: Optional[str], street: Optional[str]) -> Optional[str]:
+    """Адрес в формате промпта: 'Miasto, Dzielnica, Ulica Numer' (пустые части опускаются)."""
+    if not street:
+        return None
+    return ", ".join(p for p in (city, district, street) if p)
+
+
+def pre_extract_address(
+    city: Optional[str],
+    district: Optional[str],
+    title: Optional[str],
+    description: Optional[str],
+    street: Optional[str] = None,
+) -> Tuple[Optional[str], bool]:
+    """
+    (адрес, уверенность). Уверены только когда есть улица — из структурированного поля
+    источника (street) или найденная extract_street; город/район сами по себе адресом не считаем.
+    """
+    street = street or extract_street(title, description)
+    if not street:
+        return None, False
+    return build_address(city, district, street), True
@@ -1,11 +1,15 @@
 # db/repo.py
 from __future__ import annotations
+import hashlib
+import logging
 from typing import Optional
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from sqlalchemy import select, or_, func, text
-from db.models import City, District, Listing
+from db.models import City, District, Listing, ListingTombstone
 
+logger = logging.getLogger("main")
 
 
 def upsert_city_by_name_pl(
@@ -68,7 +72,8 @@ def add_listing(s: Session, data: dict) -> bool:
     Дубли отбрасываются, если:
       1) пересекаются URL ↔ external_url,
       2) совпадает md5(description) в рамках (city_id, property_type, deal_type),
-      3) запись уже существует по (source, source_ad_id).
+      3) запись уже существует по (source, source_ad_id),
+      4) объявление уже было снято и компактизировано (listing_tombstones).
     При успешной вставке — сразу commit(), иначе False.
     """
     # 0) быстрый предчек по (source, source_ad_id)
@@ -80,6 +85,8 @@ def add_listing(s: Session, data: dict) -> bool:
     ).limit(1)
     if s.execute(q_exists).scalar_one_or_none() is not None:
         return False
+    if s.get(ListingTombstone, (data.get("source"), data.get("source_ad_id"))) is not None:
+        return False
 
     # 1) быстрые проверки URL (нормализуем хвостовой '/')
     new_url = data.get("url")
@@ -91,6 +98,11 @@ def add_listing(s: Session, data: dict) -> bool:
         ).limit(1)
         if s.execute(q_url).scalar_one_or_none() is not None:
             return False
+        q_tomb = select(ListingTombstone.source).where(
+            or_(ListingTombstone.url.in_(vals), ListingTombstone.external_url.in_(vals))
+        ).limit(1)
+        if s.execute(q_tomb).scalar_one_or_none() is not None:
+            return False
 
     # 2) проверка дублей по md5(description) в рамках города/типа/сделки
     new_desc = data.get("description")
@@ -119,6 +131,189 @@ def add_listing(s: Session, data: dict) -> bool:
     return True
 
 
+# -------------------------------
+#    batch insert: add_listings_bulk
+# -------------------------------
+
+# исходы для каждой строки add_listings_bulk (в порядке входного списка)
+INSERTED = "inserted"
+DUP_SOURCE = "dup_source"          # уже есть (source, source_ad_id)
+DUP_URL = "dup_url"                # пересечение URL ↔ external_url
+DUP_DESCRIPTION = "dup_description"  # md5(description) в рамках город/тип/сделка
+DUP_BATCH = "dup_batch"            # дубль внутри самой пачки
+DUP_REMOVED = "dup_removed"        # совпадает со снятым и компактизированным (listing_tombstones)
+CONFLICT = "conflict"              # ON CONFLICT (гонка с другим процессом)
+FAILED = "failed"                  # строку отверг Postgres (тип, длина, NOT NULL, FK...)
+EMPTY = "empty"
+
+
+def _desc_hash(desc: Optional[str]) -> Optional[str]:
+    # тот же md5, что и Computed("md5(description)") в Postgres (UTF-8)
+    return hashlib.md5(desc.encode("utf-8")).hexdigest() if desc else None
+
+
+def _existing_dups(s: Session, rows: list[tuple[int, dict, Optional[str]]]) -> dict[int, str]:
+    """
+    Все проверки дублей (включая tombstone-ы) одним запросом по VALUES-CTE.
+    Снятые, но ещё не компактизированные объявления лежат в listings и ловятся обычными проверками.
+    rows: (idx, data, desc_hash). Возвращает {idx: исход} только для дублей.
+    """
+    placeholders = []
+    params: dict = {}
+    for n, (idx, data, dhash) in enumerate(rows):
+        placeholders.append(
+            f"(CAST(:i{n} AS int), CAST(:s{n} AS text), CAST(:a{n} AS text), CAST(:u{n} AS text), "
+            f"CAST(:e{n} AS text), CAST(:c{n} AS bigint), CAST(:p{n} AS text), CAST(:d{n} AS text), "
+            f"CAST(:h{n} AS text))"
+        )
+        params.update({
+            f"i{n}": idx,
+            f"s{n}": data.get("source"),
+            f"a{n}": data.get("source_ad_id"),
+            f"u{n}": data.get("url"),
+            f"e{n}": data.get("external_url"),
+            f"c{n}": data.get("city_id"),
+            f"p{n}": data.get("property_type"),
+            f"d{n}": data.get("deal_type"),
+            f"h{n}": dhash,
+        })
+
+    sql = text(f"""
+        WITH input(idx, source, source_ad_id, url, ext, city_id, property_type, deal_type, dhash) AS (
+            VALUES {", ".join(placeholders)}
+        )
+        SELECT i.idx,
+            EXISTS (
+                SELECT 1 FROM listings l
+                WHERE l.source = i.source AND l.source_ad_id = i.source_ad_id
+            ) AS dup_source,
+            EXISTS (
+                SELECT 1 FROM listings l WHERE l.url IN (i.url, i.ext)
+                UNION ALL
+                SELECT 1 FROM listings l WHERE l.external_url IN (i.url, i.ext)
+            ) AS dup_url,
+            i.dhash IS NOT NULL AND EXISTS (
+                SELECT 1 FROM listings l
+                WHERE l.city_id = i.city_id
+                  AND l.property_type = i.property_type
+                  AND l.deal_type = i.deal_type
+                  AND l.description_hash = i.dhash
+            ) AS dup_desc,
+            EXISTS (
+                SELECT 1 FROM listing_tombstones t
+                WHERE t.source = i.source AND t.source_ad_id = i.source_ad_id
+                UNION ALL
+                SELECT 1 FROM listing_tombstones t WHERE t.url IN (i.url, i.ext)
+                UNION ALL
+                SELECT 1 FROM listing_tombstones t WHERE t.external_url IN (i.url, i.ext)
+            ) AS dup_removed
+        FROM input i
+    """)
+    out: dict[int, str] = {}
+    for idx, dup_source, dup_url, dup_desc, dup_removed in s.execute(sql, params).all():
+        if dup_source:
+            out[idx] = DUP_SOURCE
+        elif dup_url:
+            out[idx] = DUP_URL
+        elif dup_desc:
+            out[idx] = DUP_DESCRIPTION
+        elif dup_removed:
+            out[idx] = DUP_REMOVED
+    return out
+
+
+def add_listings_bulk(s: Session, items: list[dict], *, chunk_size: int = 500) -> list[str]:
+    """
+    Пакетный вариант add_listing с теми же правилами дублей:
+      - дубли внутри пачки отсекаются в Python;
+      - проверки (source, source_ad_id) / URL ↔ external_url / md5(description) — один SQL на чанк;
+      - выжившие вставляются multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING,
+        упавший чанк — построчно (плохая строка -> FAILED, остальные пишутся);
+      - один commit на всю пачку.
+    Возвращает исход для каждой строки (INSERTED, DUP_*, CONFLICT, FAILED, EMPTY) в порядке items.
+    """
+    outcome: list[str] = [EMPTY] * len(items)
+
+    # 1) дубли внутри пачки
+    seen_src: set = set()
+    seen_url: set = set()
+    seen_desc: set = set()
+    candidates: list[tuple[int, dict, Optional[str]]] = []
+    for idx, data in enumerate(items):
+        if not data:
+            continue
+        src_key = (data.get("source"), data.get("source_ad_id"))
+        urls = {u for u in (data.get("url"), data.get("external_url")) if u}
+        dhash = _desc_hash(data.get("description"))
+        desc_key = (data.get("city_id"), data.get("property_type"), data.get("deal_type"), dhash)
+        if src_key in seen_src or urls & seen_url or (dhash and desc_key in seen_desc):
+            outcome[idx] = DUP_BATCH
+            continue
+        seen_src.add(src_key)
+        seen_url |= urls
+        if dhash:
+            seen_desc.add(desc_key)
+        candidates.append((idx, data, dhash))
+
+    if not candidates:
+        return outcome
+
+    # 2) дубли с БД (set-wise)
+    survivors: list[tuple[int, dict]] = []
+    for start in range(0, len(candidates), chunk_size):
+        chunk = candidates[start:start + chunk_size]
+        dups = _existing_dups(s, chunk)
+        for idx, data, _ in chunk:
+            if idx in dups:
+                outcome[idx] = dups[idx]
+            else:
+                survivors.append((idx, data))
+
+    # 3) вставка: один multi-row INSERT на набор колонок (мапперы разных источников дают разные ключи);
+    #    каждый чанк — в SAVEPOINT: если Postgres отверг чанк, он повторяется построчно,
+    #    и FAILED получает только сама плохая строка
+    by_shape: dict[frozenset, list[tuple[int, dict]]] = {}
+    for idx, data in survivors:
+        by_shape.setdefault(frozenset(data), []).append((idx, data))
+
+    for group in by_shape.values():
+        for start in range(0, len(group), chunk_size):
+            part = group[start:start + chunk_size]
+            try:
+                with s.begin_nested():
+                    _insert_part(s, part, outcome)
+            except SQLAlchemyError as e:
+                logger.warning("add_listings_bulk: chunk of %d rows failed (%s), retrying row by row",
+                               len(part), getattr(e, "orig", None) or e)
+                for row in part:
+                    try:
+                        with s.begin_nested():
+                            _insert_part(s, [row], outcome)
+                    except SQLAlchemyError as e:
+                        idx, data = row
+                        outcome[idx] = FAILED
+                        logger.error(
+                            "add_listings_bulk: failed row source=%s src_id=%s: %s",
+                            data.get("source"), data.get("source_ad_id"), getattr(e, "orig", None) or e)
+
+    s.commit()
+    return outcome
+
+
+def _insert_part(s: Session, part: list[tuple[int, dict]], outcome: list[str]) -> None:
+    stmt = (
+        insert(Listing)
+        .on_conflict_do_nothing(index_elements=[Listing.source, Listing.source_ad_id])
+        .returning(Listing.source, Listing.source_ad_id)
+    )
+    inserted = {
+        (src, ad_id) for src, ad_id in s.execute(stmt, [data for _, data in part]).all()
+    }
+    for idx, data in part:
+        key = (data.get("source"), data.get("source_ad_id"))
+        outcome[idx] = INSERTED if key in inserted else CONFLICT
+
+
 def filter_new_urls(session: Session, urls: list[str], *, chunk_size: int = 1000) -> list[str]:
     """
     Вернёт только новые ссылки (которых нет ни в listings.url, ни в listings.external_url).
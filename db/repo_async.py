@@ -97,8 +97,10 @@ async def get_listing_by_id(session: AsyncSession, base_id: int) -> Listing | No
     if base_id is None:
         return None
 
-    # 1) Быстрый путь: по первичному ключу
+    # 1) Быстрый путь: по первичному ключу; снятое (tombstone) — как удалённое
     listing = await session.get(Listing, base_id)
+    if listing is not None and listing.removed_at is not None:
+        return None
     return listing
 
 
@@ -185,7 +187,8 @@ async def find_listings_by_search(
         (listings, total) если return_total=True
         иначе только listings (list[Listing])
     """
-    conditions = []
+    # только живые объявления (частичный ix_listings_city_deal)
+    conditions = [Listing.removed_at.is_(None)]
 
     # 1) Типы
     if search.deal_type:
@@ -331,63 +334,42 @@ async def find_searches_for_listing(
         or_(
             UserSearch.property_type == "room",
             UserSearch.area_min.is_(None),
-            Listing.area_m2 >= UserSearch.area_min,
+            UserSearch.area_min <= listing.area_m2,
         )
     )
     conds.append(
         or_(
             UserSearch.property_type == "room",
             UserSearch.area_max.is_(None),
-            Listing.area_m2 <= UserSearch.area_max,
+            UserSearch.area_max >= listing.area_m2,
         )
     )
 
     # price: если у фильтра нет границ — не ограничивает
-    conds.append(or_(UserSearch.price_min.is_(None), Listing.price >= UserSearch.price_min))
-    conds.append(or_(UserSearch.price_max.is_(None), Listing.price <= UserSearch.price_max))
+    conds.append(or_(UserSearch.price_min.is_(None), UserSearch.price_min <= listing.price))
+    conds.append(or_(UserSearch.price_max.is_(None), UserSearch.price_max >= listing.price))
 
     # rooms: только если фильтр.property_type != 'room' и rooms задан
-    # Условие: (rooms содержит Listing.rooms) OR (Listing.rooms >= 5 AND rooms содержит 5)
+    # Условие: (rooms содержит listing.rooms) OR (listing.rooms >= 5 AND rooms содержит 5)
     # Плюс игнорируем правило для фильтров property_type='room' или rooms=NULL.
-    conds.append(
-        or_(
-            UserSearch.property_type == "room",
-            UserSearch.rooms.is_(None),
-            and_(
-                Listing.rooms.is_not(None),
-                or_(
-                    # точное попадание количества комнат в массив фильтра
-                    UserSearch.rooms.contains(func.jsonb_build_array(Listing.rooms)),
-                    # 5+ логика: если в фильтре есть 5 и у листинга rooms >= 5
-                    and_(
-                        Listing.rooms >= 5,
-                        UserSearch.rooms.contains(func.jsonb_build_array(5)),
-                    ),
-                ),
-            ),
-        )
-    )
-
-    # pets/children: только для аренды; True у фильтра -> требуем True у листинга
-    # children
-    conds.append(
-        or_(
-            UserSearch.deal_type != "rent",
-            UserSearch.child_allowed.is_(None),   # фильтр не включён → не ограничиваем
-            UserSearch.child_allowed.is_(False),  # фильтр = False → не ограничиваем
-            Listing.child_allowed.is_not(False),  # фильтр = True → листинг НЕ False (True или NULL)
-        )
-    )
-
-    # pets
-    conds.append(
-        or_(
-            UserSearch.deal_type != "rent",
-            UserSearch.pets_allowed.is_(None),
-            UserSearch.pets_allowed.is_(False),
-            Listing.pets_allowed.is_not(False),   # True или NULL
-        )
-    )
+    rooms_parts = [
+        UserSearch.property_type == "room",
+        UserSearch.rooms.is_(None),
+    ]
+    if listing.rooms is not None:
+        # точное попадание количества комнат в массив фильтра
+        rooms_parts.append(UserSearch.rooms.contains([listing.rooms]))
+        # 5+ логика: если в фильтре есть 5 и у листинга rooms >= 5
+        if listing.rooms >= 5:
+            rooms_parts.append(UserSearch.rooms.contains([5]))
+    conds.append(or_(*rooms_parts))
+
+    # pets/children: только для аренды; True у фильтра -> листинг НЕ False (True или NULL)
+    # значения листинга известны заранее — ограничиваем фильтры только при False у листинга
+    if listing.child_allowed is False:
+        conds.append(or_(UserSearch.deal_type != "rent", UserSearch.child_allowed.is_not(True)))
+    if listing.pets_allowed is False:
+        conds.append(or_(UserSearch.deal_type != "rent", UserSearch.pets_allowed.is_not(True)))
 
     if not listing.no_comission:
         conds.append(UserSearch.no_comission.is_not(True))
@@ -447,7 +429,35 @@ async def get_users_for_listing(session: AsyncSession, listing: Listing) -> list
         users.extend(result.all())
 
     return users
-    
+
+
+async def get_users_by_ids(session: AsyncSession, user_ids: list[int]) -> list[User]:
+    """
+    Возвращает пользователей по списку id (уже отобранных матч-индексом),
+    с той же проверкой активности/подписки, что и get_users_for_listing.
+    """
+    if not user_ids:
+        return []
+
+    users: list[User] = []
+    ids_list = list(user_ids)
+    chunk_size = 1000
+
+    for i in range(0, len(ids_list), chunk_size):
+        chunk = ids_list[i:i + chunk_size]
+        result = await session.scalars(
+            select(User)
+            .where(
+                User.id.in_(chunk),
+                User.is_active.is_(True),
+                User.subscription_until.is_not(None),
+                User.subscription_until > func.now(),)
+            .order_by(User.id.asc())
+        )
+        users.extend(result.all())
+
+    return users
+
 
 async def get_saved_listing_ids(session: AsyncSession, user: User) -> list[int]:
     result = await session.scalars(
@@ -456,6 +466,38 @@ async def get_saved_listing_ids(session: AsyncSession, user: User) -> list[int]:
     return result.all()
 
 
+async def get_saved_listing_ids_bulk(
+    session: AsyncSession,
+    user_ids: list[int],
+    listing_ids: list[int],
+) -> dict[int, set[int]]:
+    """
+    Сохранённые листинги сразу для многих пользователей, но только среди listing_ids
+    (для рассылки важно лишь, сохранён ли рассылаемый листинг).
+    Возвращает user_id -> {listing_id, ...}; у кого ничего нет — ключа нет.
+    """
+    if not user_ids or not listing_ids:
+        return {}
+
+    res: dict[int, set[int]] = {}
+    ids_list = list(user_ids)
+    chunk_size = 1000
+
+    for i in range(0, len(ids_list), chunk_size):
+        chunk = ids_list[i:i + chunk_size]
+        rows = await session.execute(
+            select(SavedListing.user_id, SavedListing.listing_id)
+            .where(
+                SavedListing.user_id.in_(chunk),
+                SavedListing.listing_id.in_(listing_ids),
+            )
+        )
+        for user_id, listing_id in rows.all():
+            res.setdefault(user_id, set()).add(listing_id)
+
+    return res
+
+
 async def get_apartments_for_user(
         session: AsyncSession,
         user: User,
@@ -488,7 +530,8 @@ async def get_apartments_for_user(
         total_stmt = (
             select(func.count())
             .select_from(SavedListing)
-            .where(SavedListing.user_id == user.id)
+            .join(Listing, Listing.id == SavedListing.listing_id)
+            .where(SavedListing.user_id == user.id, Listing.removed_at.is_(None))
         )
         total = int(await session.scalar(total_stmt) or 0)
 
@@ -497,7 +540,7 @@ async def get_apartments_for_user(
             stmt = (
                 select(Listing)
                 .join(SavedListing, SavedListing.listing_id == Listing.id)
-                .where(SavedListing.user_id == user.id)
+                .where(SavedListing.user_id == user.id, Listing.removed_at.is_(None))
                 .options(
                     selectinload(Listing.city),
                     selectinload(Listing.district),
@@ -0,0 +1,80 @@
+# db/text_match.py
+from __future__ import annotations
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# ł/Ł не раскладываются через NFKD — доводим вручную
+_EXTRA_FOLD = str.maketrans({"ł": "l", "Ł": "l"})
+
+
+def fold(text: str) -> str:
+    """Нижний регистр + снятие диакритики (ą -> a, ł -> l, ó -> o ...)."""
+    text = unicodedata.normalize("NFKD", text.translate(_EXTRA_FOLD))
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+class AhoCorasick:
+    """
+    Автомат Ахо–Корасик: все вхождения набора шаблонов за один проход по тексту.
+    Шаблоны добавляются с произвольной меткой (payload); build() вызывается один раз.
+    """
+    __slots__ = ("_goto", "_fail", "_out", "_built")
+
+    def __init__(self, patterns: Iterable[Tuple[str, object]] = ()) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, object]]] = [[]]   # (длина шаблона, payload)
+        self._built = False
+        for pattern, payload in patterns:
+            self.add(pattern, payload)
+        self.build()
+
+    def add(self, pattern: str, payload: object) -> None:
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), payload))
+        self._built = False
+
+    def build(self) -> None:
+        queue = deque(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[child] = cand if cand != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def iter(self, text: str) -> Iterator[Tuple[int, object]]:
+        """Отдаёт (позиция начала, payload) для каждого вхождения."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, payload in out[node]:
+                yield i - length + 1, payload
+
+    def payloads(self, text: str) -> set:
+        """Множество payload-ов всех найденных шаблонов."""
+        return {payload for _, payload in self.iter(text)}
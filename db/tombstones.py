@@ -0,0 +1,83 @@
+# db/tombstones.py
+from __future__ import annotations
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Iterable
+
+from sqlalchemy import delete, text, update
+from sqlalchemy.orm import Session
+
+from db.models import Listing, ListingTombstone
+
+logger = logging.getLogger("actual")
+
+TOMBSTONE_GRACE_DAYS = 14     # снятое объявление живёт в listings (и в сохранённых) столько дней
+TOMBSTONE_KEEP_DAYS = 180     # след в listing_tombstones для дедупа хранится столько
+COMPACT_BATCH = 1000          # строк на одну транзакцию компактизации
+
+# перенос пачки старых tombstone-ов: DELETE ... RETURNING ключи -> INSERT в listing_tombstones.
+# Возвращает число удалённых из listings строк: rowcount INSERT ... DO NOTHING меньше, если ключ
+# уже был в listing_tombstones, и по нему нельзя ни считать перенесённые, ни решать, есть ли ещё.
+_COMPACT_SQL = text("""
+    WITH moved AS (
+        DELETE FROM listings
+        WHERE id IN (
+            SELECT id FROM listings
+            WHERE removed_at IS NOT NULL AND removed_at < :cutoff
+            ORDER BY removed_at
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING source, source_ad_id, url, external_url, removed_at
+    ), kept AS (
+        INSERT INTO listing_tombstones (source, source_ad_id, url, external_url, removed_at)
+        SELECT source, source_ad_id, url, external_url, removed_at FROM moved
+        ON CONFLICT (source, source_ad_id) DO NOTHING
+    )
+    SELECT count(*) FROM moved
+""")
+
+
+def mark_removed(session: Session, listing_ids: Iterable[int]) -> int:
+    """Помечает объявления снятыми (без DELETE): из поиска и очередей они уходят по removed_at."""
+    ids = list(listing_ids)
+    if not ids:
+        return 0
+    res = session.execute(
+        update(Listing)
+        .where(Listing.id.in_(ids), Listing.removed_at.is_(None))
+        .values(removed_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount or 0
+
+
+def compact_tombstones(
+    session: Session,
+    *,
+    grace_days: int = TOMBSTONE_GRACE_DAYS,
+    keep_days: int = TOMBSTONE_KEEP_DAYS,
+    batch_size: int = COMPACT_BATCH,
+) -> tuple[int, int]:
+    """
+    Физически удаляет снятые дольше grace_days объявления (каскадом уходят saved_listings),
+    оставляя ключи дедупа в listing_tombstones; чистит следы старше keep_days.
+    Пачками по batch_size с commit на пачку. Возвращает (перенесено, удалено следов).
+    """
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=grace_days)
+    moved = 0
+    while True:
+        n = session.execute(_COMPACT_SQL, {"cutoff": cutoff, "limit": batch_size}).scalar_one()
+        session.commit()
+        moved += n
+        if n < batch_size:
+            break
+    purged = session.execute(
+        delete(ListingTombstone).where(ListingTombstone.removed_at < now - timedelta(days=keep_days))
+    ).rowcount or 0
+    session.commit()
+    if moved or purged:
+        logger.info("Tombstones compacted: moved=%d purged=%d", moved, purged)
+    return moved, purged
+
@@ -8,22 +8,15 @@ import threading
 import asyncio
 
 from config import LOG_DIR
-from bot.bot import run_bot  # aiogram v3 async entrypoint: async def run_bot(stop_event)
-from parser.olx_parser import start_olx
-from parser.otodom_parser import start_otodom
-from parser.morizon_parser import start_morizone
-from parser.nieruch_parser import start_nieruch
-from parser.actual_cheker import check_actual_listings_sync  # если нужен асинхронный фон. чекер
-from parser.translater_w import start_translation_pool
+# Модули приложения (бот, парсеры, БД) импортируются внутри функций, а логгеры
+# настраивает setup_logging() из main(): воркеры пула разбора (spawn) импортируют
+# этот файл как __mp_main__, и на верхнем уровне им незачем поднимать бота и FileHandler'ы.
+
+logger = logging.getLogger("main")
+
 # =======================
 # Логирование
 # =======================
-os.makedirs(LOG_DIR, exist_ok=True)
-
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
-
 def make_logger(name: str, filename: str) -> logging.Logger:
     logger = logging.getLogger(name)
     logger.setLevel(logging.INFO)
@@ -34,17 +27,23 @@ def make_logger(name: str, filename: str) -> logging.Logger:
         #logger.addHandler(console_handler)
     return logger
 
-logger = make_logger("main", "main.log")
-logger.addHandler(console_handler)
-logger_olx = make_logger("olx", "parser_olx.log")
-logger_otodom = make_logger("otodom", "parser_otodom.log")
-logger_morizon = make_logger("morizon", "parser_morizon.log")
-logger_nieruch = make_logger("nieruchomosci", "parser_nieruchomosci.log")
-logger_net = make_logger("net", "net.log")
-logger_bot = make_logger("bot", "bot.log")
-logger_act = make_logger("actual", "actual.log")
-logger_trans = make_logger("translator", "translator.log")
-logger_worker = make_logger("bot.worker", "worker.log")
+def setup_logging() -> None:
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+
+    make_logger("main", "main.log").addHandler(console_handler)
+    make_logger("olx", "parser_olx.log")
+    make_logger("otodom", "parser_otodom.log")
+    make_logger("morizon", "parser_morizon.log")
+    make_logger("nieruchomosci", "parser_nieruchomosci.log")
+    make_logger("net", "net.log")
+    make_logger("bot", "bot.log")
+    make_logger("actual", "actual.log")
+    make_logger("translator", "translator.log")
+    make_logger("bot.worker", "worker.log")
 
 # =======================
 # Helpers: потоки
@@ -67,14 +66,23 @@ def run_thread(target, name: str) -> threading.Thread:
 
 def build_thread_specs() -> dict[str, callable]:
     """
-    Возвращает фабрики запуска парсеров.
+    Возвращает фабрики запуска фоновых потоков.
     Каждая фабрика возвращает уже стартованный Thread.
+    Все парсеры — один поток "scrapers": задачи одного event loop под parser.supervisor.scrapers
+    (backoff, счётчики падений, пауза/возобновление источников из админки бота).
     """
+    from parser.olx_parser import olx_source
+    from parser.otodom_parser import otodom_source
+    from parser.morizon_parser import morizon_source
+    from parser.nieruch_parser import nieruch_source
+    from parser.supervisor import scrapers
+    from parser.actual_cheker import check_actual_listings_sync  # если нужен асинхронный фон. чекер
+    from parser.translater_w import start_translation_pool
+
     return {
-        #"olx":     lambda: run_thread(lambda: start_olx(stop_event), "olx"),
-        #"otodom":  lambda: run_thread(lambda: start_otodom(stop_event), "otodom"),
-        #"morizon": lambda: run_thread(lambda: start_morizone(stop_event), "morizon"),
-        #"nieruch": lambda: run_thread(lambda: start_nieruch(stop_event), "nieruch"),
+        #"scrapers": lambda: run_thread(
+        #    lambda: scrapers.run([olx_source(), otodom_source(), morizon_source(), nieruch_source()], stop_event),
+        #    "scrapers"),
         #"checker": lambda: run_thread(lambda: check_actual_listings_sync(stop_event), "checker"),
         #"translator": lambda: run_thread(lambda: start_translation_pool(stop_event), "translator"),
     }
@@ -90,22 +98,39 @@ async def watchdog(threads: dict[str, threading.Thread],
                    thread_specs: dict[str, callable],
                    interval_sec: int = 10) -> None:
     """
-    Периодически проверяет состояние потоков и перезапускает упавшие.
-    Работает до тех пор, пока не будет установлен stop_event.
+    Периодически проверяет состояние потоков и перезапускает упавшие
+    с экспоненциальным backoff по числу падений подряд (серия сбрасывается, если поток
+    прожил дольше максимальной паузы). Работает до тех пор, пока не будет установлен stop_event.
     """
+    from parser.supervisor import Backoff
+
     logger.info("Watchdog started (interval=%ss)", interval_sec)
+    backoffs = {name: Backoff() for name in thread_specs}
+    started = {name: time.monotonic() for name in threads}
+    restart_at: dict[str, float] = {}
     while not stop_event.is_set():
-        # собираем упавшие
-        dead = [name for name, t in threads.items() if not t.is_alive()]
-        if dead:
-            for name in dead:
-                logger.warning("Thread %s is dead — restarting...", name)
-                try:
-                    threads[name] = thread_specs[name]()  # перезапуск
-                    # небольшая пауза между рестартами, чтобы не лупило
-                    await asyncio.sleep(2)
-                except Exception:
-                    logger.exception("Failed to restart thread %s", name)
+        now = time.monotonic()
+        for name, t in list(threads.items()):
+            if t.is_alive():
+                continue
+            if name not in restart_at:
+                b = backoffs[name]
+                if now - started[name] > b.cap:
+                    b.reset()
+                delay = b.fail()
+                restart_at[name] = now + delay
+                logger.warning("Thread %s is dead (%d in a row, %d total) — restart in %.0fs",
+                               name, b.failures, b.total, delay)
+                continue
+            if now < restart_at[name]:
+                continue
+            del restart_at[name]
+            try:
+                threads[name] = thread_specs[name]()  # перезапуск
+                started[name] = time.monotonic()
+            except Exception:
+                logger.exception("Failed to restart thread %s", name)
+                started[name] = now  # пусть следующая попытка тоже идёт через backoff
         await asyncio.sleep(interval_sec)
     logger.info("Watchdog stopped")
 
@@ -113,6 +138,16 @@ async def watchdog(threads: dict[str, threading.Thread],
 # Async main: бот в главном потоке + watchdog
 # =======================
 async def async_main():
+    from bot.bot import run_bot  # aiogram v3 async entrypoint: async def run_bot(stop_event)
+    from parser.parse_pool import parse_service
+    from db.location_cache import warm_location_cache
+
+    # 0) прогреваем кэш городов/районов для мапперов
+    try:
+        warm_location_cache()
+    except Exception:
+        logger.exception("Location cache warm-up failed (will warm lazily)")
+
     # 1) стартуем фоновые парсеры
     thread_specs = build_thread_specs()
     threads = start_threads(thread_specs)
@@ -145,6 +180,11 @@ async def async_main():
         for name, t in threads.items():
             logger.info("Waiting for thread %s to finish...", name)
             t.join(timeout=10)
+        # пул процессов разбора HTML (если парсеры его поднимали)
+        try:
+            parse_service.shutdown()
+        except Exception:
+            logger.exception("parse pool shutdown failed")
         # === КРИТИЧЕСКИЙ БЛОК: зачистка event-loop ===
         loop = asyncio.get_running_loop()
 
@@ -174,6 +214,7 @@ async def async_main():
 # Entrypoint
 # =======================
 def main():
+    setup_logging()
     try:
         asyncio.run(async_main())
     except KeyboardInterrupt:
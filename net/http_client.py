@@ -1,47 +1,342 @@
 # net/http_client.py
 from __future__ import annotations
+import asyncio
 import logging
 import random
+import threading
 import time
-from typing import Any, Dict, Optional
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 from config import HTTP_TIMEOUT, HTTP_MAX_RETRIES, HTTP_RETRY_STATUSES, HTTP_BACKOFF_BASE, HTTP_SKEEP_STATUSES
+from config import HTTP_IMPERSONATE, HTTP_POOL_MAX_PER_KEY, HTTP_POOL_MAX_KEYS, HTTP_POOL_MAX_CLIENTS, HTTP_POOL_IDLE_TTL
 from config import PROXIES_POOL, PROXIES_HOST, PROXIES_PASS, PROXIES_PORT, PROXIES_USERNAME
 
 from curl_cffi import requests as crequests
+from curl_cffi import CurlInfo
+from curl_cffi.requests import AsyncSession
+
+from net.proxy_pool import ProxyManager
 
 logger = logging.getLogger("net")
 
+proxy_manager = ProxyManager(PROXIES_POOL)
+
+
+# ответы на HEAD, после которых пробуем ranged GET (HEAD запрещён / не реализован / отсекается WAF)
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
 
-def _choose_proxy() -> Optional[Dict[str, str]]:
-    """Выбираем случайный прокси из пула. Возвращаем dict как ждёт curl_cffi.requests."""
-    if not PROXIES_POOL:
-        return None
-    p = random.choice(PROXIES_POOL)
-    if not p:
-        return None
-    p = f"http://{PROXIES_USERNAME}-ip-{p}:{PROXIES_PASS}@{PROXIES_HOST}:{PROXIES_PORT}"
+
+def _choose_proxy(url: Optional[str] = None) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """
+    Выбираем прокси из пула с учётом его здоровья для хоста url.
+    Возвращаем (dict как ждёт curl_cffi.requests, ip) — ip нужен для report_*.
+    """
+    ip = proxy_manager.choose(_host(url))
+    if not ip:
+        return None, None
+    p = f"http://{PROXIES_USERNAME}-ip-{ip}:{PROXIES_PASS}@{PROXIES_HOST}:{PROXIES_PORT}"
     # Одинаково задаём и для http, и для https
-    return {"http": p, "https": p}
+    return {"http": p, "https": p}, ip
 
 
-def _sleep_backoff(attempt: int) -> None:
+def _host(url: Optional[str]) -> Optional[str]:
+    return urlsplit(url).hostname if url else None
+
+
+def _backoff_delay(attempt: int) -> float:
     """Экспоненциальный backoff с джиттером."""
     delay = HTTP_BACKOFF_BASE * (2 ** (attempt - 1))
     jitter = random.uniform(0, 0.5)
-    time.sleep(delay + jitter)
+    return delay + jitter
 
 
-# Если хочешь максимально просто (новая сессия на каждый вызов):
-def fetch_status_sync(url: str, headers: Optional[Dict] = None) -> int:
-    with crequests.Session() as s:
-        r = s.get(
-            url,
-            timeout=20,
-            headers=headers,
-            proxies=_choose_proxy(),  # твоя функция: {"http": "...", "https": "..."}
-            allow_redirects=True,
-        )
-        return r.status_code
+def _sleep_backoff(attempt: int) -> None:
+    time.sleep(_backoff_delay(attempt))
+
+
+# =======================
+# Пулы keep-alive сессий (ключ — прокси-эндпоинт)
+# =======================
+# curl-инфо, которые сессия кладёт в response.infos до возврата хэндла в свой пул
+_CONN_INFOS = [CurlInfo.NUM_CONNECTS, CurlInfo.APPCONNECT_TIME]
+
+
+def _pool_key(proxies: Optional[Dict[str, str]]) -> str:
+    return (proxies or {}).get("https") or "direct"
+
+
+def _session_kwargs() -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"curl_infos": list(_CONN_INFOS)}
+    if HTTP_IMPERSONATE:
+        kwargs["impersonate"] = HTTP_IMPERSONATE
+    return kwargs
+
+
+class ConnStats:
+    """
+    Общие счётчики пулов: переиспользование соединений (NUM_CONNECTS == 0 — запрос ушёл
+    по живому keep-alive) и время TLS/connect-рукопожатий новых (APPCONNECT_TIME).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.reused_connections = 0
+        self.new_connections = 0
+        self.handshake_time = 0.0   # сумма по новым соединениям, сек
+        self.sessions_created = 0
+        self.sessions_closed = 0
+
+    def session_created(self) -> None:
+        with self._lock:
+            self.sessions_created += 1
+
+    def session_closed(self) -> None:
+        with self._lock:
+            self.sessions_closed += 1
+
+    def account(self, resp: crequests.Response) -> None:
+        infos = getattr(resp, "infos", None) or {}
+        connects = infos.get(CurlInfo.NUM_CONNECTS)
+        with self._lock:
+            self.requests += 1
+            if connects is None:
+                return
+            if connects:
+                self.new_connections += 1
+                self.handshake_time += float(infos.get(CurlInfo.APPCONNECT_TIME) or 0.0)
+            else:
+                self.reused_connections += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            known = self.reused_connections + self.new_connections
+            return {
+                "requests": self.requests,
+                "reuse_rate": round(self.reused_connections / known, 3) if known else None,
+                "new_connections": self.new_connections,
+                "avg_handshake_ms": round(self.handshake_time / self.new_connections * 1000, 1)
+                if self.new_connections else None,
+                "sessions_created": self.sessions_created,
+                "sessions_closed": self.sessions_closed,
+            }
+
+
+conn_stats = ConnStats()
+
+
+class _PooledSession:
+    __slots__ = ("session", "last_used", "inflight")
+
+    def __init__(self, session: Any):
+        self.session = session
+        self.last_used = time.monotonic()
+        self.inflight = 0
+
+
+class SessionPool:
+    """
+    Пул sync curl_cffi-сессий по ключу «прокси-эндпоинт» (http_request).
+    Сессия держит keep-alive соединение, поэтому повторный запрос через тот же прокси
+    не платит TCP+TLS рукопожатие. curl-хэндл не потокобезопасен: сессия выдаётся
+    одному потоку (checkout) и возвращается после запроса. Свободных сессий на ключ
+    не больше max_per_key, простаивающие дольше idle_ttl закрываются.
+    """
+
+    def __init__(self, max_per_key: int = HTTP_POOL_MAX_PER_KEY, idle_ttl: float = HTTP_POOL_IDLE_TTL):
+        self.max_per_key = max(1, int(max_per_key))
+        self.idle_ttl = float(idle_ttl)
+        self._lock = threading.Lock()
+        self._idle: Dict[str, List[_PooledSession]] = {}
+        self._last_evict = time.monotonic()
+
+    def _close(self, ps: _PooledSession) -> None:
+        try:
+            ps.session.close()
+        except Exception:
+            pass
+        conn_stats.session_closed()
+
+    def _evict_idle(self, now: float) -> None:
+        """Закрывает простаивающие сессии (не чаще раза в idle_ttl/2)."""
+        stale: List[_PooledSession] = []
+        with self._lock:
+            if now - self._last_evict < self.idle_ttl / 2:
+                return
+            self._last_evict = now
+            for key in list(self._idle):
+                keep = []
+                for ps in self._idle[key]:
+                    (stale if now - ps.last_used > self.idle_ttl else keep).append(ps)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for ps in stale:
+            self._close(ps)
+
+    @contextmanager
+    def checkout(self, proxies: Optional[Dict[str, str]]) -> Iterator[crequests.Session]:
+        """
+        Выдаёт сессию для прокси. При исключении сессия закрывается (состояние соединения
+        неизвестно), иначе возвращается в пул.
+        """
+        key = _pool_key(proxies)
+        self._evict_idle(time.monotonic())
+        ps: Optional[_PooledSession] = None
+        with self._lock:
+            bucket = self._idle.get(key)
+            if bucket:
+                ps = bucket.pop()
+        if ps is None:
+            ps = _PooledSession(crequests.Session(**_session_kwargs()))
+            conn_stats.session_created()
+        try:
+            yield ps.session
+        except BaseException:
+            self._close(ps)
+            raise
+        ps.last_used = time.monotonic()
+        with self._lock:
+            bucket = self._idle.setdefault(key, [])
+            if len(bucket) < self.max_per_key:
+                bucket.append(ps)
+                ps = None
+        if ps is not None:
+            self._close(ps)
+
+    def request(self, method: str, url: str, *, proxies: Optional[Dict[str, str]] = None, **kwargs: Any) -> crequests.Response:
+        with self.checkout(proxies) as s:
+            resp = s.request(method=method, url=url, proxies=proxies, **kwargs)
+        conn_stats.account(resp)
+        return resp
+
+    def close_all(self) -> None:
+        with self._lock:
+            sessions = [ps for bucket in self._idle.values() for ps in bucket]
+            self._idle.clear()
+        for ps in sessions:
+            self._close(ps)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"idle_sessions": sum(len(b) for b in self._idle.values()), "pool_keys": len(self._idle)}
+
+
+class AsyncSessionPool:
+    """
+    Пул curl_cffi AsyncSession по ключу «прокси-эндпоинт» для одного event loop
+    (async_http_request / async_http_probe, а через них — CrawlEngine).
+    AsyncSession сам ведёт параллельные запросы (до max_clients хэндлов) и общий кэш
+    соединений, поэтому на ключ одна сессия без эксклюзивного checkout. Ключей не больше
+    max_keys (лишние закрываются по LRU среди простаивающих), сессия без запросов дольше
+    idle_ttl закрывается. Живёт, пока жив loop, — переживает раунды парсеров.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = HTTP_POOL_MAX_KEYS,
+        idle_ttl: float = HTTP_POOL_IDLE_TTL,
+        max_clients: int = HTTP_POOL_MAX_CLIENTS,
+    ):
+        self.max_keys = max(1, int(max_keys))
+        self.idle_ttl = float(idle_ttl)
+        self.max_clients = max(1, int(max_clients))
+        self._sessions: "OrderedDict[str, _PooledSession]" = OrderedDict()
+        self._last_evict = time.monotonic()
+
+    async def _close(self, ps: _PooledSession) -> None:
+        try:
+            await ps.session.close()
+        except Exception:
+            pass
+        conn_stats.session_closed()
+
+    async def _evict(self, now: float) -> None:
+        """Простаивающие дольше idle_ttl (не чаще раза в idle_ttl/2) и сверх max_keys — закрываем."""
+        stale: List[_PooledSession] = []
+        if now - self._last_evict >= self.idle_ttl / 2:
+            self._last_evict = now
+            for key, ps in list(self._sessions.items()):
+                if not ps.inflight and now - ps.last_used > self.idle_ttl:
+                    stale.append(self._sessions.pop(key))
+        if len(self._sessions) > self.max_keys:
+            for key, ps in list(self._sessions.items()):
+                if len(self._sessions) <= self.max_keys:
+                    break
+                if not ps.inflight:
+                    stale.append(self._sessions.pop(key))
+        for ps in stale:
+            await self._close(ps)
+
+    @asynccontextmanager
+    async def checkout(self, proxies: Optional[Dict[str, str]]) -> AsyncIterator[AsyncSession]:
+        key = _pool_key(proxies)
+        ps = self._sessions.get(key)
+        if ps is None:
+            ps = self._sessions[key] = _PooledSession(
+                AsyncSession(max_clients=self.max_clients, **_session_kwargs()))
+            conn_stats.session_created()
+        self._sessions.move_to_end(key)
+        ps.inflight += 1
+        try:
+            yield ps.session
+        finally:
+            ps.inflight -= 1
+            ps.last_used = time.monotonic()
+        await self._evict(ps.last_used)
+
+    async def request(self, method: str, url: str, *, proxies: Optional[Dict[str, str]] = None, **kwargs: Any) -> crequests.Response:
+        async with self.checkout(proxies) as s:
+            resp = await s.request(method=method, url=url, proxies=proxies, **kwargs)
+        conn_stats.account(resp)
+        return resp
+
+    async def close(self) -> None:
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for ps in sessions:
+            await self._close(ps)
+
+    def snapshot(self) -> dict:
+        return {"sessions": len(self._sessions), "inflight": sum(ps.inflight for ps in self._sessions.values())}
+
+
+# sync-пул — один на процесс; async — по одному на event loop (AsyncSession привязан к своему loop)
+session_pool = SessionPool()
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSessionPool]" = weakref.WeakKeyDictionary()
+_async_pools_lock = threading.Lock()
+
+
+def async_session_pool() -> AsyncSessionPool:
+    """Пул async-сессий текущего event loop (создаётся при первом обращении)."""
+    loop = asyncio.get_running_loop()
+    with _async_pools_lock:
+        pool = _async_pools.get(loop)
+        if pool is None:
+            pool = _async_pools[loop] = AsyncSessionPool()
+        return pool
+
+
+async def close_async_session_pool() -> None:
+    """Закрывает сессии пула текущего loop — звать перед выходом из asyncio.run (супервизор, чекер)."""
+    with _async_pools_lock:
+        pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def pools_snapshot() -> dict:
+    with _async_pools_lock:
+        pools = list(_async_pools.values())
+    return {
+        **conn_stats.snapshot(),
+        "sync": session_pool.snapshot(),
+        "async_sessions": sum(len(p._sessions) for p in pools),
+    }
 
 
 def http_request(
@@ -64,12 +359,15 @@ def http_request(
     _max_retries = max_retries if max_retries is not None else HTTP_MAX_RETRIES
     last_exc: Optional[BaseException] = None
 
+    host = _host(url)
     for attempt in range(1, _max_retries + 1):
-        proxies = _choose_proxy()
+        proxies, ip = _choose_proxy(url)
+        resp = None
+        started = time.monotonic()
         try:
-            resp = crequests.request(
-                method=method.upper(),
-                url=url,
+            resp = session_pool.request(
+                method.upper(),
+                url,
                 params=params,
                 headers=headers,
                 data=data,
@@ -77,6 +375,7 @@ def http_request(
                 proxies=proxies,
                 timeout=_timeout,
             )
+            proxy_manager.report_status(ip, host, resp.status_code, time.monotonic() - started)
             # 429/5xx — ретраим
             if resp.status_code in HTTP_RETRY_STATUSES:
                 logger.warning(
@@ -96,6 +395,8 @@ def http_request(
 
         except Exception as e:
             last_exc = e
+            if resp is None:
+                proxy_manager.report_failure(ip, host)
             logger.warning(
                 "HTTP %s %s raised %r, attempt %d/%d",
                 method, url, e, attempt, _max_retries,
@@ -147,3 +448,194 @@ def get_json(
         max_retries=max_retries, retry_statuses=retry_statuses,
     )
     return r.json()
+
+
+# =======================
+# Async-версия (curl_cffi AsyncSession) — для crawl-движка парсеров
+# =======================
+async def _asend(session: Optional[AsyncSession], method: str, url: str, **kwargs: Any) -> crequests.Response:
+    """Запрос через переданную сессию, иначе — через пул keep-alive сессий текущего loop."""
+    if session is not None:
+        return await session.request(method=method, url=url, **kwargs)
+    return await async_session_pool().request(method, url, **kwargs)
+
+
+async def async_http_request(
+    method: str,
+    url: str,
+    *,
+    session: Optional[AsyncSession] = None,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    data: Any = None,
+    json: Any = None,
+    timeout: Optional[int] = None,
+    max_retries: Optional[int] = None,
+) -> crequests.Response:
+    """
+    То же, что http_request, но неблокирующее: ретраи, backoff и ротация прокси на каждую попытку.
+    Без session запрос идёт через пул keep-alive сессий текущего loop (по прокси попытки).
+    """
+
+    _timeout = timeout if timeout is not None else HTTP_TIMEOUT
+    _max_retries = max_retries if max_retries is not None else HTTP_MAX_RETRIES
+    last_exc: Optional[BaseException] = None
+
+    host = _host(url)
+    for attempt in range(1, _max_retries + 1):
+        proxies, ip = _choose_proxy(url)
+        resp = None
+        started = time.monotonic()
+        try:
+            resp = await _asend(
+                session,
+                method.upper(),
+                url,
+                params=params,
+                headers=headers,
+                data=data,
+                json=json,
+                proxies=proxies,
+                timeout=_timeout,
+            )
+            proxy_manager.report_status(ip, host, resp.status_code, time.monotonic() - started)
+            if resp.status_code in HTTP_RETRY_STATUSES:
+                logger.warning(
+                    "HTTP %s %s -> %s (retryable), attempt %d/%d",
+                    method, url, resp.status_code, attempt, _max_retries,
+                )
+                if attempt < _max_retries:
+                    await asyncio.sleep(_backoff_delay(attempt))
+                    continue
+                resp.raise_for_status()
+            elif resp.status_code in HTTP_SKEEP_STATUSES:
+                last_exc = RuntimeError(f"Not found: {resp.status_code} {url}")
+                break
+            resp.raise_for_status()
+            return resp
+
+        except Exception as e:
+            last_exc = e
+            if resp is None:
+                proxy_manager.report_failure(ip, host)
+            logger.warning(
+                "HTTP %s %s raised %r, attempt %d/%d",
+                method, url, e, attempt, _max_retries,
+            )
+            if attempt < _max_retries:
+                await asyncio.sleep(_backoff_delay(attempt))
+                continue
+            raise
+
+    if last_exc:
+        raise last_exc
+    raise RuntimeError("async_http_request failed without exception (unexpected)")
+
+
+async def _aprobe(
+    method: str,
+    url: str,
+    *,
+    session: Optional[AsyncSession],
+    headers: Optional[Dict[str, str]],
+    timeout: Optional[int],
+    allow_redirects: bool,
+) -> Tuple[crequests.Response, Optional[str], float]:
+    """
+    Одна попытка без ретраев. Сбой транспорта сразу учитывается в proxy_manager,
+    а статус ответа — нет: вызывающий решает, финальный ли это ответ.
+    Возвращает (ответ, ip прокси, время запроса).
+    """
+    proxies, ip = _choose_proxy(url)
+    started = time.monotonic()
+    try:
+        r = await _asend(
+            session,
+            method.upper(),
+            url,
+            headers=headers,
+            proxies=proxies,
+            timeout=timeout if timeout is not None else HTTP_TIMEOUT,
+            allow_redirects=allow_redirects,
+        )
+    except Exception:
+        proxy_manager.report_failure(ip, _host(url))
+        raise
+    return r, ip, time.monotonic() - started
+
+
+async def async_http_probe(
+    method: str,
+    url: str,
+    *,
+    session: Optional[AsyncSession] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None,
+    allow_redirects: bool = True,
+) -> crequests.Response:
+    """
+    Одна попытка запроса без ретраев и raise_for_status — для проб живости, где важен
+    сам статус (404/410 — это ответ, а не ошибка). Статус/сбой учитывается в proxy_manager.
+    """
+    r, ip, elapsed = await _aprobe(
+        method, url, session=session, headers=headers,
+        timeout=timeout, allow_redirects=allow_redirects,
+    )
+    proxy_manager.report_status(ip, _host(url), r.status_code, elapsed)
+    return r
+
+
+async def async_fetch_head(
+    url: str,
+    *,
+    session: Optional[AsyncSession] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None,
+) -> crequests.Response:
+    """
+    Ответ без тела: HEAD, а если сайт HEAD не отдаёт (HEAD_FALLBACK_STATUSES) —
+    GET с Range: bytes=0-0. Редиректы проходим — итоговый адрес в response.url.
+    В proxy_manager попадает только итоговый ответ: 403/405/501 на HEAD — это отказ
+    сайта от метода, а не бан прокси.
+    """
+    r, ip, elapsed = await _aprobe(
+        "HEAD", url, session=session, headers=headers,
+        timeout=timeout, allow_redirects=True,
+    )
+    if r.status_code not in HEAD_FALLBACK_STATUSES:
+        proxy_manager.report_status(ip, _host(url), r.status_code, elapsed)
+        return r
+    return await async_http_probe(
+        "GET", url, session=session,
+        headers={**(headers or {}), "Range": "bytes=0-0"}, timeout=timeout,
+    )
+
+
+async def async_fetch_status(
+    url: str,
+    *,
+    session: Optional[AsyncSession] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None,
+) -> int:
+    """HTTP-статус страницы без скачивания тела (см. async_fetch_head)."""
+    r = await async_fetch_head(url, session=session, headers=headers, timeout=timeout)
+    return r.status_code
+
+
+async def async_http_get(
+    url: str,
+    *,
+    session: Optional[AsyncSession] = None,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[int] = None,
+    max_retries: Optional[int] = None,
+) -> crequests.Response:
+    return await async_http_request(
+        "GET", url,
+        session=session,
+        params=params, headers=headers,
+        timeout=timeout,
+        max_retries=max_retries,
+    )
@@ -0,0 +1,181 @@
+# net/proxy_pool.py
+from __future__ import annotations
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from config import (
+    PROXY_EWMA_ALPHA, PROXY_FAIL_THRESHOLD, PROXY_COOLDOWN_BASE, PROXY_COOLDOWN_MAX,
+    PROXY_BAN_STATUSES,
+)
+
+logger = logging.getLogger("net")
+
+DEFAULT_LATENCY = 1.0   # сек — стартовая оценка для ещё не опробованного прокси
+
+
+class _ProxyState:
+    __slots__ = (
+        "ip", "latency", "error_rate", "ok", "failed", "consecutive_failures",
+        "quarantined_until", "strikes", "bans", "ban_strikes", "host_errors",
+    )
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.latency = DEFAULT_LATENCY     # EWMA времени ответа, сек
+        self.error_rate = 0.0              # EWMA доли ошибок (0..1)
+        self.ok = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0       # глобальный карантин прокси
+        self.strikes = 0                   # сколько раз подряд уходил в карантин
+        self.bans: Dict[str, float] = {}   # host -> до какого времени забанен на сайте
+        self.ban_strikes: Dict[str, int] = {}
+        self.host_errors: Dict[str, int] = {}   # host -> 5xx подряд через этот прокси
+
+    def score(self) -> float:
+        """Меньше — лучше: медленные и ошибающиеся прокси штрафуются."""
+        return self.latency * (1.0 + 4.0 * self.error_rate)
+
+    def available(self, host: Optional[str], now: float) -> bool:
+        if now < self.quarantined_until:
+            return False
+        return not (host and self.bans.get(host, 0.0) > now)
+
+    def released_at(self, host: Optional[str]) -> float:
+        return max(self.quarantined_until, self.bans.get(host, 0.0) if host else 0.0)
+
+
+def _cooldown(strikes: int) -> float:
+    return min(PROXY_COOLDOWN_MAX, PROXY_COOLDOWN_BASE * (2 ** max(0, strikes - 1)))
+
+
+class ProxyManager:
+    """
+    Пул прокси с оценкой здоровья:
+      - EWMA задержки и доли ошибок на прокси;
+      - бан на конкретный сайт по 403/429 (exp. cool-down по числу банов подряд)
+        и после PROXY_FAIL_THRESHOLD ответов 5xx подряд от этого сайта — сбой сайта
+        не выводит прокси из работы для остальных хостов;
+      - глобальный карантин после PROXY_FAIL_THRESHOLD сетевых ошибок/таймаутов подряд;
+      - выбор «из двух случайных лучший» среди доступных: быстрые здоровые
+        получают основную нагрузку, но остальные тоже перепроверяются.
+    Потокобезопасен (парсерные потоки + actual_cheker + async-движок).
+    """
+
+    def __init__(self, ips: Sequence[str]):
+        self._lock = threading.Lock()
+        self._states: Dict[str, _ProxyState] = {ip: _ProxyState(ip) for ip in ips if ip}
+
+    def __bool__(self) -> bool:
+        return bool(self._states)
+
+    def choose(self, host: Optional[str] = None) -> Optional[str]:
+        """Возвращает ip прокси для запроса к host (или None, если пул пуст)."""
+        now = time.monotonic()
+        with self._lock:
+            states = list(self._states.values())
+            if not states:
+                return None
+            ready = [st for st in states if st.available(host, now)]
+            if not ready:
+                # все в карантине/бане — берём того, кто освободится раньше
+                return min(states, key=lambda st: st.released_at(host)).ip
+            if len(ready) == 1:
+                return ready[0].ip
+            a, b = random.sample(ready, 2)
+            return (a if a.score() <= b.score() else b).ip
+
+    def report_success(self, ip: Optional[str], host: Optional[str], latency: float) -> None:
+        st = self._states.get(ip) if ip else None
+        if st is None:
+            return
+        with self._lock:
+            st.ok += 1
+            st.latency += PROXY_EWMA_ALPHA * (latency - st.latency)
+            st.error_rate *= (1.0 - PROXY_EWMA_ALPHA)
+            st.consecutive_failures = 0
+            st.strikes = 0
+            if host:
+                st.ban_strikes.pop(host, None)
+                st.host_errors.pop(host, None)
+
+    def report_status(self, ip: Optional[str], host: Optional[str], status: int, latency: float) -> None:
+        """Итог запроса с HTTP-ответом: бан-статусы, 5xx (сигнал по хосту) или успех."""
+        if status in PROXY_BAN_STATUSES:
+            self._ban(ip, host)
+        elif status >= 500:
+            self._host_error(ip, host)
+        else:
+            self.report_success(ip, host, latency)
+
+    def report_failure(self, ip: Optional[str], host: Optional[str]) -> None:
+        """Сетевая ошибка / таймаут — ответа нет, виноват скорее прокси."""
+        st = self._states.get(ip) if ip else None
+        if st is None:
+            return
+        with self._lock:
+            st.failed += 1
+            st.error_rate += PROXY_EWMA_ALPHA * (1.0 - st.error_rate)
+            st.consecutive_failures += 1
+            if st.consecutive_failures < PROXY_FAIL_THRESHOLD:
+                return
+            st.consecutive_failures = 0
+            st.strikes += 1
+            cd = _cooldown(st.strikes)
+            st.quarantined_until = time.monotonic() + cd
+        logger.warning("[PROXY] %s quarantined for %.0fs", ip, cd)
+
+    def _ban(self, ip: Optional[str], host: Optional[str]) -> None:
+        st = self._states.get(ip) if ip else None
+        if st is None:
+            return
+        with self._lock:
+            st.failed += 1
+            st.error_rate += PROXY_EWMA_ALPHA * (1.0 - st.error_rate)
+            if not host:
+                return
+            cd = self._ban_host(st, host)
+        logger.warning("[PROXY] %s banned on %s for %.0fs", ip, host, cd)
+
+    def _host_error(self, ip: Optional[str], host: Optional[str]) -> None:
+        """5xx: копим подряд по паре (прокси, хост); на пороге — бан только на этом хосте."""
+        st = self._states.get(ip) if ip else None
+        if st is None or not host:
+            return
+        with self._lock:
+            st.failed += 1
+            errors = st.host_errors.get(host, 0) + 1
+            if errors < PROXY_FAIL_THRESHOLD:
+                st.host_errors[host] = errors
+                return
+            st.host_errors.pop(host, None)
+            cd = self._ban_host(st, host)
+        logger.warning("[PROXY] %s benched on %s for %.0fs (5xx in a row)", ip, host, cd)
+
+    @staticmethod
+    def _ban_host(st: _ProxyState, host: str) -> float:
+        """Бан прокси на хосте с exp. cool-down (вызывать под self._lock). Возвращает паузу, сек."""
+        strikes = st.ban_strikes.get(host, 0) + 1
+        st.ban_strikes[host] = strikes
+        cd = _cooldown(strikes)
+        st.bans[host] = time.monotonic() + cd
+        return cd
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        with self._lock:
+            out = []
+            for st in sorted(self._states.values(), key=lambda s: s.score()):
+                out.append({
+                    "ip": st.ip,
+                    "latency_ms": round(st.latency * 1000),
+                    "error_rate": round(st.error_rate, 3),
+                    "ok": st.ok,
+                    "failed": st.failed,
+                    "quarantined_for": max(0, round(st.quarantined_until - now)),
+                    "banned_on": {h: round(t - now) for h, t in st.bans.items() if t > now},
+                })
+            return out
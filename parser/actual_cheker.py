@@ -1,28 +1,86 @@
+import asyncio
+import random
 import time
 import logging
-from typing import Tuple
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Dict, List, NamedTuple
 from threading import Event
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, update, func
 
-from db.session import get_sync_tx  # <-- синхронная сессия!
-from db.models import Listing
-from config import CHECK_INTERVAL_HOURS, MAX_CONCURRENT_CHECKS
-from net.http_client import fetch_status_sync  # <-- синхронная версия
-from parser.olx_parser import headers as olx_headers
-from parser.otodom_parser import headers as otodom_headers
-from parser.morizon_parser import HEADERS as morizon_headers
-from parser.nieruch_parser import HEADERS as nieruch_headers
+from db.session import get_sync_tx, get_sync_session  # <-- синхронные сессии (вызываем через asyncio.to_thread)
+from db.models import Listing, SavedListing
+from db.tombstones import mark_removed, compact_tombstones
+from config import (
+    CHECK_INTERVAL_HOURS, CHECK_BUDGETS, CHECK_BATCH, CHECK_FLUSH_EVERY,
+    CHECK_MIN_INTERVAL_MIN, CHECK_MAX_INTERVAL_HOURS, CHECK_CHURN_REF,
+)
+from net.http_client import proxy_manager, pools_snapshot, close_async_session_pool
+from parser.engine import CrawlEngine
+from parser.liveness import ALIVE, GONE, UNKNOWN, LivenessProbe, ProbeItem, probe_for
 
 logger = logging.getLogger("actual")
 
-HEADERS_BY_SOURCE = {
-    "olx": olx_headers,
-    "otodom": otodom_headers,
-    "morizon": morizon_headers,
-    "nieruch": nieruch_headers,
-}
+# множитель интервала по возрасту объявления: (младше N дней, множитель); старше — _AGE_OLD
+_AGE_STEPS = ((1, 0.5), (7, 1.0), (30, 2.0))
+_AGE_OLD = 6.0
+_SAVE_WEIGHT = 0.5       # каждое сохранение ускоряет проверку (до _SAVES_CAP штук)
+_SAVES_CAP = 8
+_SENT_RECENT_DAYS = 2    # недавно разосланное — проверяем вдвое чаще
+_CHURN_ALPHA = 0.2       # EWMA доли снятых по источнику
+_JITTER = 0.1            # ±10% — чтобы проверки не сбивались в один момент
+COMPACT_INTERVAL_SEC = 3600  # как часто компактизировать tombstone-ы
+
+
+class _Due(NamedTuple):
+    id: int
+    url: str | None
+    source: str | None
+    source_ad_id: str | None
+    scraped_at: datetime
+    is_sended: bool
+    saves: int
+
+
+class _ChurnTracker:
+    """
+    Доля снятых объявлений по источнику (EWMA по проходам).
+    Источник, где объявления исчезают чаще CHECK_CHURN_REF, проверяется чаще — и наоборот.
+    """
+
+    def __init__(self, ref: float = CHECK_CHURN_REF, alpha: float = _CHURN_ALPHA):
+        self.ref = ref
+        self.alpha = alpha
+        self.rates: Dict[str, float] = {}
+
+    def update(self, source: str, gone: int, total: int) -> None:
+        if total <= 0:
+            return
+        rate = gone / total
+        prev = self.rates.get(source, self.ref)
+        self.rates[source] = prev + self.alpha * (rate - prev)
+
+    def factor(self, source: str) -> float:
+        rate = self.rates.get(source, self.ref)
+        return min(2.0, max(0.5, self.ref / max(rate, 1e-3)))
+
+
+churn = _ChurnTracker()
+
+
+def next_check_at(item: _Due, now_ts: int) -> int:
+    """Когда проверять объявление в следующий раз (эпоха, сек)."""
+    age_days = max(0.0, (now_ts - item.scraped_at.timestamp()) / 86400)
+    interval = CHECK_INTERVAL_HOURS * 3600.0
+    interval *= next((f for days, f in _AGE_STEPS if age_days < days), _AGE_OLD)
+    interval *= churn.factor((item.source or "").lower())
+    interval /= 1 + _SAVE_WEIGHT * min(item.saves, _SAVES_CAP)
+    if item.is_sended and age_days < _SENT_RECENT_DAYS:
+        interval *= 0.5
+    interval = min(CHECK_MAX_INTERVAL_HOURS * 3600.0, max(CHECK_MIN_INTERVAL_MIN * 60.0, interval))
+    interval *= random.uniform(1 - _JITTER, 1 + _JITTER)
+    return now_ts + int(interval)
 
 
 def wait_stop(stop_event: Event, timeout: float) -> None:
@@ -33,106 +91,191 @@ def wait_stop(stop_event: Event, timeout: float) -> None:
         pass
 
 
-def _due_listings(batch_limit: int) -> list[Tuple[int, str, str | None]]:
+async def _await_stop(stop_event: Event, timeout: float) -> None:
+    """wait_stop без блокировки event loop."""
+    await asyncio.to_thread(wait_stop, stop_event, timeout)
+
+
+def _due_listings(batch_limit: int) -> list[_Due]:
     """
-    Возвращает список кандидатів для проверки в виде простых кортежей:
-    (id, url, source) — чтобы не таскать ORM-объекты между потоками.
+    Объявления, у которых наступил next_check (range scan по ix_listings_next_check),
+    самые просроченные первыми. Простые кортежи — чтобы не таскать ORM-объекты между потоками.
     """
-    now_ts = int(time.time())
-    min_check_ts = now_ts - CHECK_INTERVAL_HOURS * 3600
-
+    saves = (
+        select(func.count())
+        .where(SavedListing.listing_id == Listing.id)
+        .correlate(Listing)
+        .scalar_subquery()
+    )
     with get_sync_tx() as session:
         stmt = (
-            select(Listing.id, Listing.url, Listing.source, Listing.last_check)
-            .where((Listing.last_check.is_(None)) | (Listing.last_check < min_check_ts))
-            .order_by(Listing.last_check.asc().nullsfirst())
+            select(
+                Listing.id, Listing.url, Listing.source, Listing.source_ad_id,
+                Listing.scraped_at, Listing.is_sended, saves,
+            )
+            .where(Listing.next_check <= int(time.time()), Listing.removed_at.is_(None))
+            .order_by(Listing.next_check.asc())
             .limit(batch_limit)
         )
         rows = session.execute(stmt).all()
+    return [_Due(*row) for row in rows]
 
-    # конвертируем к нужной форме
-    return [(rid, url, src) for (rid, url, src, _last_check) in rows]
 
+def _flush_results(checked: List[dict], gone_ids: List[int]) -> None:
+    """
+    Один bulk UPDATE (last_check + next_check по id) и одна пометка removed_at на всю
+    накопленную пачку — в одной транзакции. Физически снятые удаляет compact_tombstones.
+    """
+    with get_sync_tx() as session:
+        if checked:
+            session.execute(update(Listing), checked)
+        if gone_ids:
+            mark_removed(session, gone_ids)
 
-def _check_and_update_one(listing_id: int, url: str, source: str | None) -> None:
+
+class _ResultBuffer:
     """
-    Синхронно проверяет одно объявление и обновляет БД.
-    Отдельная сессия на каждый вызов (безопасно для потоков).
+    Копит вердикты проб и сбрасывает их в БД каждые CHECK_FLUSH_EVERY штук
+    (и в конце прохода). UNKNOWN (ошибка/невнятный ответ) тоже считается проверкой —
+    как и раньше, такое объявление сдвигается на следующий интервал.
     """
-    headers = HEADERS_BY_SOURCE.get((source or "").lower())
-    now_ts = int(time.time())
 
-    try:
-        status_code = fetch_status_sync(url, headers=headers)
-    except Exception as e:
-        logger.warning(f"⚠️ Ошибка запроса {url}: {e}")
-        try:
-            with get_sync_tx() as session:
-                session.execute(
-                    update(Listing)
-                    .where(Listing.id == listing_id)
-                    .values(last_check=now_ts)
-                )
-        except Exception:
-            logger.exception(f"💥 Ошибка при сохранении last_check для {url}")
-        return
+    def __init__(self, flush_every: int = CHECK_FLUSH_EVERY):
+        self.flush_every = max(1, flush_every)
+        self.checked: List[dict] = []
+        self.gone: List[int] = []
+        self.stats: Dict[str, int] = {ALIVE: 0, GONE: 0, UNKNOWN: 0}
+        self.by_source: Dict[str, Dict[str, int]] = {}
+        self._lock = asyncio.Lock()
 
-    try:
-        with get_sync_tx() as session:
-            if status_code in (404, 410, 451):
-                logger.info(f"❌ [{status_code}] Удаляем {url}")
-                session.execute(delete(Listing).where(Listing.id == listing_id))
-            else:
-                session.execute(
-                    update(Listing)
-                    .where(Listing.id == listing_id)
-                    .values(last_check=now_ts)
-                )
-                if status_code != 200:
-                    logger.warning(f"⚠️ [{status_code}] {url}")
-    except Exception as e:
-        logger.exception(f"💥 Ошибка при обновлении БД для {url}: {e}")
+    async def add(self, item: _Due, verdict: str) -> None:
+        self.stats[verdict] = self.stats.get(verdict, 0) + 1
+        src = self.by_source.setdefault((item.source or "").lower(), {"total": 0, GONE: 0})
+        src["total"] += 1
+        src[GONE] += int(verdict == GONE)
+        if verdict == GONE:
+            self.gone.append(item.id)
+        else:
+            now_ts = int(time.time())
+            self.checked.append({"id": item.id, "last_check": now_ts, "next_check": next_check_at(item, now_ts)})
+        if len(self.checked) + len(self.gone) >= self.flush_every:
+            await self.flush()
 
+    async def flush(self) -> None:
+        async with self._lock:
+            checked, gone = self.checked, self.gone
+            self.checked, self.gone = [], []
+            if not checked and not gone:
+                return
+            try:
+                await asyncio.to_thread(_flush_results, checked, gone)
+            except Exception as e:
+                logger.exception(f"💥 Ошибка bulk-записи ({len(checked)} checked, {len(gone)} gone): {e}")
 
-def check_actual_listings_sync(stop_event: Event) -> None:
+
+async def _check_chunk(
+    engine: CrawlEngine,
+    probe: LivenessProbe,
+    buf: _ResultBuffer,
+    items: List[_Due],
+) -> None:
+    probe_items: List[ProbeItem] = [(it.id, it.url, it.source_ad_id) for it in items]
+    verdicts = await probe.check_many(engine, probe_items)
+    for it in items:
+        verdict = verdicts.get(it.id, UNKNOWN)
+        if verdict == GONE:
+            logger.info(f"❌ Снято с публикации {it.url}")
+        await buf.add(it, verdict)
+
+
+async def _check_batch(listings: List[_Due]) -> Dict[str, int]:
     """
-    Бесконечный синхронный цикл проверки актуальности.
-    Параллелизация — через ThreadPoolExecutor с max_workers=MAX_CONCURRENT_CHECKS.
+    Проверяет пачку конкурентно: по CrawlEngine на источник (лимиты из CHECK_BUDGETS),
+    проба — своя у каждого источника (parser/liveness.py), пачками по probe.batch_size.
+    Результаты пишутся в БД пачками через _ResultBuffer; доля снятых обновляет churn.
     """
-    logger.info("🔄 Запуск синхронной проверки актуальности объявлений...")
+    by_source: Dict[str, List[_Due]] = {}
+    for it in listings:
+        by_source.setdefault((it.source or "").lower(), []).append(it)
+
+    buf = _ResultBuffer()
+    async with AsyncExitStack() as stack:
+        engines = {
+            src: await stack.enter_async_context(CrawlEngine(src, CHECK_BUDGETS.get(src)))
+            for src in by_source
+        }
+        jobs = []
+        for src, items in by_source.items():
+            probe = probe_for(src)
+            size = max(1, probe.batch_size)
+            jobs.extend(
+                _check_chunk(engines[src], probe, buf, items[i:i + size])
+                for i in range(0, len(items), size)
+            )
+        await asyncio.gather(*jobs)
+    await buf.flush()
+    for src, counts in buf.by_source.items():
+        churn.update(src, counts[GONE], counts["total"])
+    buf.stats["requests"] = sum(e.requests for e in engines.values())
+    return buf.stats
+
+
+def _compact() -> None:
+    # компактизация сама коммитит пачки — обычная сессия без авто-транзакции
+    with get_sync_session() as session:
+        compact_tombstones(session)
+
 
-    # защитa от 0/None в конфиге
-    max_workers = max(1, int(MAX_CONCURRENT_CHECKS or 1))
-    batch_limit = max_workers * 5 or 20
+async def check_actual_listings(stop_event: Event) -> None:
+    """
+    Бесконечный async-цикл проверки актуальности:
+      - забираем до CHECK_BATCH объявлений с наступившим next_check;
+      - пробы источников (OLX API, HEAD/ranged GET) по всем сразу в пределах лимитов сайтов;
+      - last_check / next_check / removed_at — bulk-запросами каждые CHECK_FLUSH_EVERY результатов;
+      - раз в COMPACT_INTERVAL_SEC — компактизация старых tombstone-ов.
+    """
+    logger.info("🔄 Запуск проверки актуальности объявлений...")
+    last_compact = 0.0
 
     while not stop_event.is_set():
+        if time.monotonic() - last_compact >= COMPACT_INTERVAL_SEC:
+            last_compact = time.monotonic()
+            try:
+                await asyncio.to_thread(_compact)
+            except Exception as e:
+                logger.exception(f"💥 Ошибка компактизации tombstone-ов: {e}")
+
         try:
-            listings = _due_listings(batch_limit=batch_limit)
+            listings = await asyncio.to_thread(_due_listings, CHECK_BATCH)
             if not listings:
                 logger.info("✅ Нет объявлений для проверки. Спим 5 минут.")
-                wait_stop(stop_event, timeout=300)
+                await _await_stop(stop_event, 300)
                 continue
 
-            # Параллельно проверяем URL'ы
-            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="actual") as pool:
-                futures = []
-                for listing_id, url, source in listings:
-                    fut = pool.submit(_check_and_update_one, listing_id, url, source)
-                    futures.append(fut)
-                    # лёгкий троттлинг, чтобы не стрелять мгновенно всеми запросами
-                    time.sleep(0.05)
-
-                # дожидаемся завершения задач (и логируем ошибки)
-                for fut in as_completed(futures):
-                    try:
-                        fut.result()
-                    except Exception:
-                        logger.exception("💥 Необработанное исключение в worker-е")
+            started = time.monotonic()
+            stats = await _check_batch(listings)
+            logger.info(f"📊 Проверено {len(listings)} за {time.monotonic() - started:.1f}s: {stats}")
+            logger.debug(f"📊 Churn: {churn.rates}")
+            logger.debug(f"📊 Proxies: {proxy_manager.snapshot()}")
+            logger.info(f"📊 HTTP pool: {pools_snapshot()}")
 
         except Exception as e:
             logger.exception(f"💥 Глобальная ошибка в цикле проверки: {e}")
 
         # короткая пауза между проходами или досрочный выход по stop_event
-        wait_stop(stop_event, timeout=2)
+        await _await_stop(stop_event, 2)
+
+    logger.info("✅ Проверка актуальности завершена (stop_event set).")
+
+
+def check_actual_listings_sync(stop_event: Event) -> None:
+    """
+    Точка входа для потока-чекера (main.build_thread_specs): свой event loop на поток.
+    """
+    async def run() -> None:
+        try:
+            await check_actual_listings(stop_event)
+        finally:
+            await close_async_session_pool()
 
-    logger.info("✅ Синхронная проверка актуальности завершена (stop_event set).")
+    asyncio.run(run())
@@ -0,0 +1,124 @@
+# parser/engine.py
+from __future__ import annotations
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+from config import CRAWL_BUDGETS
+from net.http_client import async_http_get, async_http_probe, async_fetch_head
+
+logger = logging.getLogger("net")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_BUDGET = {"concurrency": 3, "min_interval": 0.5, "jitter": 0.5}
+
+
+class CrawlEngine:
+    """
+    Async crawl-движок одного источника:
+      - запросы идут через пул keep-alive сессий loop-а по прокси (net.http_client.async_session_pool),
+        соединения переживают раунд;
+      - ограничение одновременных запросов на хост (concurrency);
+      - бюджет вежливости: между стартами запросов к хосту не меньше min_interval (+ jitter)
+        вместо случайных sleep(1..4) между страницами.
+
+    Использование:
+        async with CrawlEngine("otodom") as engine:
+            pages = await engine.map(fetch_page, keys)
+    """
+
+    def __init__(self, source: str, budget: Optional[Dict[str, float]] = None):
+        self.source = source
+        b = {**DEFAULT_BUDGET, **CRAWL_BUDGETS.get(source, {}), **(budget or {})}
+        self.concurrency = max(1, int(b["concurrency"]))
+        self.min_interval = float(b["min_interval"])
+        self.jitter = float(b["jitter"])
+        self._host_sems: Dict[str, asyncio.Semaphore] = {}
+        self._host_next: Dict[str, float] = {}
+        self.requests = 0
+        self.errors = 0
+
+    async def __aenter__(self) -> "CrawlEngine":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    def _sem(self, host: str) -> asyncio.Semaphore:
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = self._host_sems[host] = asyncio.Semaphore(self.concurrency)
+        return sem
+
+    async def _polite(self, host: str) -> None:
+        """Резервирует слот старта запроса к host и ждёт его."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._host_next.get(host, now))
+        self._host_next[host] = slot + self.min_interval + random.uniform(0, self.jitter)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def get(self, url: str, **kwargs: Any):
+        """GET с учётом лимитов хоста. kwargs — как у async_http_get (params, headers, timeout, ...)."""
+        host = urlsplit(url).hostname or ""
+        async with self._sem(host):
+            await self._polite(host)
+            self.requests += 1
+            try:
+                return await async_http_get(url, **kwargs)
+            except Exception:
+                self.errors += 1
+                raise
+
+    async def probe(self, url: str, method: str = "GET", **kwargs: Any):
+        """Одна попытка без ретраев и raise_for_status (см. async_http_probe), с лимитами хоста."""
+        host = urlsplit(url).hostname or ""
+        async with self._sem(host):
+            await self._polite(host)
+            self.requests += 1
+            try:
+                return await async_http_probe(method, url, **kwargs)
+            except Exception:
+                self.errors += 1
+                raise
+
+    async def head(self, url: str, **kwargs: Any):
+        """Ответ без тела (HEAD / ranged GET) с теми же лимитами хоста. kwargs — headers, timeout."""
+        host = urlsplit(url).hostname or ""
+        async with self._sem(host):
+            await self._polite(host)
+            self.requests += 1
+            try:
+                return await async_fetch_head(url, **kwargs)
+            except Exception:
+                self.errors += 1
+                raise
+
+    async def status(self, url: str, **kwargs: Any) -> int:
+        r = await self.head(url, **kwargs)
+        return r.status_code
+
+    async def get_text(self, url: str, **kwargs: Any) -> str:
+        r = await self.get(url, **kwargs)
+        return r.text
+
+    async def get_json(self, url: str, **kwargs: Any) -> dict:
+        r = await self.get(url, **kwargs)
+        return r.json()
+
+    async def map(
+        self,
+        fn: Callable[[T], Awaitable[R]],
+        items: Iterable[T],
+    ) -> List[R | BaseException]:
+        """
+        Запускает fn по всем items конкурентно (лимиты — внутри get()).
+        Исключения возвращаются на местах результатов, порядок сохраняется.
+        """
+        return await asyncio.gather(*(fn(it) for it in items), return_exceptions=True)
+
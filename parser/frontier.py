@@ -0,0 +1,260 @@
+# parser/frontier.py
+from __future__ import annotations
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from config import FRONTIER_CAP_PER_KEY, FRONTIER_MAX_ATTEMPTS
+from db.models import CrawlFrontierState
+from db.session import get_sync_tx
+
+logger = logging.getLogger("net")
+
+RATE_ALPHA = 0.3   # вес нового замера в EWMA темпа появления объявлений
+
+
+def _url_hash(url: str) -> int:
+    # 63 бита: помещается в BIGINT/JSON без потерь, коллизии на тысячах URL пренебрежимы
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+
+def _key_str(key: Hashable) -> str:
+    parts: Iterable = key if isinstance(key, tuple) else (key,)
+    return "|".join(str(p) for p in parts)
+
+
+class _KeyState:
+    __slots__ = ("seen", "watermark", "peak", "rate", "polled_at", "dirty")
+
+    def __init__(
+        self,
+        seen: Iterable[int] = (),
+        watermark: int = 0,
+        rate: float = 0.0,
+        polled_at: Optional[float] = None,
+    ):
+        self.seen: "OrderedDict[int, None]" = OrderedDict.fromkeys(seen)
+        self.watermark = watermark
+        self.peak = watermark         # старший увиденный id (в памяти; знак может отставать от него)
+        self.rate = rate              # новых объявлений в секунду (EWMA)
+        self.polled_at = polled_at    # epoch последнего опроса
+        self.dirty = False
+
+
+class CrawlFrontier:
+    """
+    Персистентный frontier одного парсера вместо defaultdict(set) last_ids:
+      - на ключ выдачи (город/тип/сделка) — LRU из cap хэшей последних виденных URL
+        (URL, который всё ещё висит в выдаче, освежается и не вытесняется);
+      - водяной знак на ключ (монотонный id, как у OLX);
+      - темп появления новых на ключ и время опроса (их читает планировщик parser/scheduler.py);
+      - load() поднимает состояние из таблицы crawl_frontier, checkpoint() пишет изменённые ключи.
+    URL, найденный в выдаче, сначала только «в работе» (pending): в seen он попадает через confirm(),
+    когда исход сохранения известен (вставлен / дубль / отброшен маппером). Неподтверждённые
+    discard_pending() забывает в конце раунда — сбой карточки или записи не теряет объявление,
+    в следующем опросе оно снова новое. Но не бесконечно: неудачные попытки считаются по хэшу
+    URL (или id объявления, см. fail()), и после max_attempts раундов объект запоминается как
+    виденный — «битая» карточка не перекачивается вечно и не держит водяной знак OLX.
+    Память ограничена cap × число ключей; после рестарта повторного «шторма» по выдаче нет.
+    Объект живёт в одном потоке парсера — блокировок нет.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        cap_per_key: int = FRONTIER_CAP_PER_KEY,
+        max_attempts: int = FRONTIER_MAX_ATTEMPTS,
+    ):
+        self.source = source
+        self.cap = max(1, cap_per_key)
+        self.max_attempts = max(1, max_attempts)
+        self._keys: Dict[str, _KeyState] = {}
+        self._pending: Dict[int, Set[str]] = {}   # хэш URL -> ключи, где он найден в этом раунде
+        # хэш URL/id -> неудачных раундов подряд; только в памяти, LRU на cap записей
+        self._attempts: "OrderedDict[int, int]" = OrderedDict()
+        self.given_up = 0
+
+    def _state(self, key: Hashable) -> _KeyState:
+        k = _key_str(key)
+        st = self._keys.get(k)
+        if st is None:
+            st = self._keys[k] = _KeyState()
+        return st
+
+    def _remember(self, st: _KeyState, h: int) -> None:
+        st.seen[h] = None
+        if len(st.seen) > self.cap:
+            st.seen.popitem(last=False)
+        st.dirty = True
+
+    def add_new(self, key: Hashable, url: str) -> bool:
+        """True — URL по этому ключу раньше не встречался (теперь он pending до confirm())."""
+        k = _key_str(key)
+        st = self._state(key)
+        h = _url_hash(url)
+        if h in st.seen:
+            st.seen.move_to_end(h)
+            return False
+        keys = self._pending.setdefault(h, set())
+        if k in keys:
+            return False
+        keys.add(k)
+        return True
+
+    def confirm(self, url: str) -> None:
+        """Исход сохранения URL известен — запоминаем его во всех ключах, где он найден."""
+        h = _url_hash(url)
+        self._attempts.pop(h, None)
+        for k in self._pending.pop(h, ()):
+            self._remember(self._keys[k], h)
+
+    def retrying(self, item: str) -> bool:
+        """URL/id уже был в прошлых раундах, но не дошёл до confirm() — не «новый» для планировщика."""
+        return _url_hash(item) in self._attempts
+
+    def _fail(self, h: int) -> bool:
+        n = self._attempts.pop(h, 0) + 1
+        if n >= self.max_attempts:
+            self.given_up += 1
+            return True
+        self._attempts[h] = n
+        if len(self._attempts) > self.cap:
+            self._attempts.popitem(last=False)
+        return False
+
+    def fail(self, item: str) -> bool:
+        """
+        Учитывает неудачный раунд для URL/id. True — попытки исчерпаны (счётчик сброшен):
+        вызывающий перестаёт ждать объект и считает его обработанным.
+        """
+        return self._fail(_url_hash(item))
+
+    def discard_pending(self, count_attempts: bool = True) -> int:
+        """
+        Забывает неподтверждённые URL раунда (их заберёт следующий опрос). Возвращает их число.
+        count_attempts — раунд дошёл до конца, и неподтверждённые URL считаются неудачной
+        попыткой (после max_attempts URL запоминается как виденный). Если раунд упал целиком,
+        объявления не виноваты — попытки не считаются.
+        """
+        n = len(self._pending)
+        if count_attempts:
+            gave_up = 0
+            for h, keys in self._pending.items():
+                if self._fail(h):
+                    gave_up += 1
+                    for k in keys:
+                        self._remember(self._keys[k], h)
+            if gave_up:
+                logger.warning(
+                    "frontier %s: %d URLs failed %d rounds in a row, skipping them",
+                    self.source, gave_up, self.max_attempts)
+        self._pending.clear()
+        return n
+
+    def watermark(self, key: Hashable) -> int:
+        return self._state(key).watermark
+
+    def advance(self, key: Hashable, value: int) -> None:
+        st = self._state(key)
+        if value > st.watermark:
+            st.watermark = value
+            st.dirty = True
+        st.peak = max(st.peak, value)
+
+    def peak(self, key: Hashable) -> int:
+        """Старший id, уже отданный в работу по ключу (>= водяного знака)."""
+        st = self._state(key)
+        return max(st.peak, st.watermark)
+
+    def raise_peak(self, key: Hashable, value: int) -> None:
+        st = self._state(key)
+        st.peak = max(st.peak, value)
+
+    def known(self, key: Hashable) -> bool:
+        """Ключ уже опрашивался (есть от чего считать «известную» часть выдачи)."""
+        st = self._keys.get(_key_str(key))
+        return st is not None and (st.polled_at is not None or bool(st.seen) or st.watermark > 0)
+
+    def poll_state(self, key: Hashable) -> Tuple[float, Optional[float]]:
+        """(темп появления новых в сек, epoch последнего опроса или None)."""
+        st = self._state(key)
+        return st.rate, st.polled_at
+
+    def record_poll(self, key: Hashable, new_count: int, now: Optional[float] = None) -> None:
+        """Учитывает результат опроса: new_count новых с прошлого раза -> EWMA темпа."""
+        st = self._state(key)
+        now = time.time() if now is None else now
+        if st.polled_at is not None and now > st.polled_at:
+            inst = new_count / (now - st.polled_at)
+            st.rate = inst if st.rate <= 0 else st.rate + RATE_ALPHA * (inst - st.rate)
+        st.polled_at = now
+        st.dirty = True
+
+    def load(self) -> None:
+        try:
+            with get_sync_tx() as session:
+                rows = session.execute(
+                    select(
+                        CrawlFrontierState.key, CrawlFrontierState.seen, CrawlFrontierState.watermark,
+                        CrawlFrontierState.rate, CrawlFrontierState.polled_at,
+                    )
+                    .where(CrawlFrontierState.source == self.source)
+                ).all()
+        except Exception:
+            logger.exception("frontier %s: load failed, starting empty", self.source, exc_info=False)
+            return
+        for key, seen, watermark, rate, polled_at in rows:
+            self._keys[key] = _KeyState(
+                (seen or [])[-self.cap:], watermark or 0, rate or 0.0,
+                polled_at.timestamp() if polled_at else None,
+            )
+        logger.info("frontier %s: loaded %d keys", self.source, len(rows))
+
+    def checkpoint(self) -> int:
+        """Сохраняет изменённые ключи одним upsert. Возвращает число записанных ключей."""
+        dirty = [(k, st) for k, st in self._keys.items() if st.dirty]
+        if not dirty:
+            return 0
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "source": self.source, "key": k, "seen": list(st.seen), "watermark": st.watermark,
+                "rate": st.rate,
+                "polled_at": datetime.fromtimestamp(st.polled_at, timezone.utc) if st.polled_at else None,
+                "updated_at": now,
+            }
+            for k, st in dirty
+        ]
+        stmt = insert(CrawlFrontierState).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CrawlFrontierState.source, CrawlFrontierState.key],
+            set_={
+                col: getattr(stmt.excluded, col)
+                for col in ("seen", "watermark", "rate", "polled_at", "updated_at")
+            },
+        )
+        try:
+            with get_sync_tx() as session:
+                session.execute(stmt)
+        except Exception:
+            logger.exception("frontier %s: checkpoint failed", self.source, exc_info=False)
+            return 0
+        for _, st in dirty:
+            st.dirty = False
+        return len(dirty)
+
+    def snapshot(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "urls": sum(len(st.seen) for st in self._keys.values()),
+            "dirty": sum(1 for st in self._keys.values() if st.dirty),
+            "pending": len(self._pending),
+            "retrying": len(self._attempts),
+            "given_up": self.given_up,
+        }
@@ -0,0 +1,24 @@
+# parser/html_text.py
+"""HTML-фрагменты (заголовки/описания от API и из __NEXT_DATA__) -> текст."""
+from typing import List, Optional
+
+from bs4 import BeautifulSoup
+
+
+def html_to_text(raw_text: Optional[str]) -> Optional[str]:
+    """Текст без HTML-разметки (сущности раскрыты); пустое/None — как есть."""
+    if raw_text:
+        try:
+            return BeautifulSoup(raw_text, 'lxml').text
+        except Exception:
+            pass
+    return raw_text
+
+
+def clean_offer_texts(offers: List[dict]) -> List[dict]:
+    """Заголовок/описание оферов (HTML от API) -> текст; выполняется в пуле процессов разбора."""
+    for offer in offers:
+        for field in ("title", "description"):
+            if isinstance(offer.get(field), str):
+                offer[field] = html_to_text(offer[field])
+    return offers
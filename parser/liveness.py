@@ -0,0 +1,123 @@
+# parser/liveness.py
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Dict, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from config import CHECK_TIMEOUT
+from parser.engine import CrawlEngine
+from parser.olx_parser import headers as olx_headers, OFFER_URL as OLX_OFFER_URL
+from parser.otodom_parser import headers as otodom_headers
+from parser.morizon_parser import HEADERS as morizon_headers
+from parser.nieruch_parser import HEADERS as nieruch_headers
+
+logger = logging.getLogger("actual")
+
+# вердикты проб
+ALIVE = "alive"
+GONE = "gone"
+UNKNOWN = "unknown"   # ответ ни о чём не говорит (403/5xx/ошибка сети) — проверим в следующий раз
+
+GONE_STATUSES = (404, 410, 451)
+
+# (listing id, url, source_ad_id)
+ProbeItem = Tuple[int, Optional[str], Optional[str]]
+
+
+class LivenessProbe:
+    """
+    Проба живости объявлений одного источника.
+    check() — одно объявление; check_many() — пачка до batch_size штук. По умолчанию
+    check_many просто запускает check() конкурентно; источник, у которого API принимает
+    несколько id за запрос, переопределяет check_many и поднимает batch_size.
+    Лимиты запросов к хосту — на стороне CrawlEngine.
+    """
+    batch_size = 1
+
+    def __init__(self, headers: Optional[dict] = None):
+        self.headers = headers
+
+    async def check(self, engine: CrawlEngine, item: ProbeItem) -> str:
+        raise NotImplementedError
+
+    async def check_many(self, engine: CrawlEngine, items: Sequence[ProbeItem]) -> Dict[int, str]:
+        results = await asyncio.gather(*(self.check(engine, it) for it in items), return_exceptions=True)
+        verdicts: Dict[int, str] = {}
+        for (listing_id, url, _), res in zip(items, results):
+            if isinstance(res, BaseException):
+                logger.warning(f"⚠️ Ошибка пробы {url}: {res}")
+                res = UNKNOWN
+            verdicts[listing_id] = res
+        return verdicts
+
+
+def _redirected_away(url: str, final_url: str) -> bool:
+    """Редирект увёл с карточки (обычно на выдачу) — схему и www не считаем."""
+    a, b = urlsplit(url), urlsplit(final_url)
+    host_a = (a.hostname or "").removeprefix("www.")
+    host_b = (b.hostname or "").removeprefix("www.")
+    return host_a != host_b or a.path.rstrip("/") != b.path.rstrip("/")
+
+
+class StatusProbe(LivenessProbe):
+    """
+    Только статус страницы: HEAD (или GET на 1 байт), тело не качаем.
+    gone_on_redirect — источник снятые объявления перенаправляет на выдачу.
+    """
+
+    def __init__(self, headers: Optional[dict] = None, gone_on_redirect: bool = False):
+        super().__init__(headers)
+        self.gone_on_redirect = gone_on_redirect
+
+    async def check(self, engine: CrawlEngine, item: ProbeItem) -> str:
+        _, url, _ = item
+        if not url:
+            return UNKNOWN
+        r = await engine.head(url, headers=self.headers, timeout=CHECK_TIMEOUT)
+        if r.status_code in GONE_STATUSES:
+            return GONE
+        if r.status_code >= 400:
+            return UNKNOWN
+        if self.gone_on_redirect and _redirected_away(url, str(r.url)):
+            return GONE
+        return ALIVE
+
+
+class OlxApiProbe(LivenessProbe):
+    """
+    OLX: JSON /api/v2/offers/{id}/ (несколько КБ вместо HTML-карточки).
+    404/410 или неактивный data.status — снято. Без числового id — откат на StatusProbe.
+    """
+    INACTIVE = {"removed_by_user", "removed_by_moderator", "outdated", "disabled", "blocked"}
+
+    def __init__(self, headers: Optional[dict] = None):
+        super().__init__(headers)
+        self._fallback = StatusProbe(headers)
+
+    async def check(self, engine: CrawlEngine, item: ProbeItem) -> str:
+        _, _, ad_id = item
+        if not ad_id or not ad_id.isdigit():
+            return await self._fallback.check(engine, item)
+        r = await engine.probe(OLX_OFFER_URL.format(ad_id), headers=self.headers, timeout=CHECK_TIMEOUT)
+        if r.status_code in GONE_STATUSES:
+            return GONE
+        if r.status_code != 200:
+            return UNKNOWN
+        status = ((r.json() or {}).get("data") or {}).get("status")
+        return GONE if status in self.INACTIVE else ALIVE
+
+
+PROBES: Dict[str, LivenessProbe] = {
+    "olx": OlxApiProbe(olx_headers),
+    # у otodom нет публичного lookup по id — статус карточки (410 у снятых)
+    "otodom": StatusProbe(otodom_headers),
+    "morizon": StatusProbe(morizon_headers, gone_on_redirect=True),
+    "nieruch": StatusProbe(nieruch_headers, gone_on_redirect=True),
+}
+_DEFAULT_PROBE = StatusProbe()
+
+
+def probe_for(source: Optional[str]) -> LivenessProbe:
+    return PROBES.get((source or "").lower(), _DEFAULT_PROBE)
+
@@ -0,0 +1,332 @@
+# parser/morizon_html.py
+"""Разбор HTML Morizon: выдача, карточка, страница /photo."""
+import re
+import json
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+
+def extract_listing_urls_from_search_html(html: str) -> List[str]:
+    """
+    Извлекаем ссылки на карточки с поисковой страницы.
+    Селекторы сделаны широкими, с несколькими fallback.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    urls: List[str] = []
+
+    # 1) частый вариант: заголовок карточки содержит ссылку
+    candidates = soup.find_all("a", {"data-cy":"propertyUrl"})
+    seen = set()
+    for a in candidates:
+        href = a.get("href")
+        if not href: 
+            continue
+        # абсолютные/относительные:
+        if href.startswith("/"):
+            href = "https://www.morizon.pl" + href
+        # фильтруем заведомо лишние
+        if "/oferta/" in href and href not in seen:
+            seen.add(href)
+            urls.append(href)
+    return urls
+
+
+# =======================
+# Карточка
+# =======================
+
+def _num_from_text(s: str | None) -> float | None:
+    if not s:
+        return None
+    m = re.search(r"(\d[\d\s .,]*)", s)
+    if not m:
+        return None
+    val = m.group(1).replace(" "," ").replace(" ", "").replace(",", ".")
+    try:
+        return float(val)
+    except Exception:
+        return None
+
+def _extract_details_table(soup: BeautifulSoup) -> Dict[str, str]:
+    """
+    Извлекает характеристики (Rynek, Rok budowy, Powierzchnia, Liczba pokoi и т.д.)
+    из таблиц, списков и dl-блоков на карточке Morizon.
+    Возвращает словарь {label_lower: value_text}.
+    """
+
+    res: Dict[str, str] = {}
+    for box in soup.select(".iT04N1"):
+        label_div = box.select_one(".YSTCwm._3rio9t, .YSTCwm:not(.M3ijI0)")
+        value_div = box.select_one(".YSTCwm.M3ijI0, [data-cy='itemValue']")
+        label = label_div.get_text(" ", strip=True) if label_div else None
+        value = value_div.get_text(" ", strip=True) if value_div else None
+        if label and value:
+            res[label.lower()] = value
+    
+    return res
+
+def _split_srcset_best(srcset: str) -> str | None:
+    """
+    Возвращает URL с максимальным дескриптором из srcset.
+    Пример: "... 300w, ... 450w, ... 600w, ... 900w" -> ссылка на 900w.
+    """
+    cand = []
+    for part in srcset.split(","):
+        p = part.strip()
+        if not p:
+            continue
+        m = re.match(r"(\S+)\s+(\d+)w|\s*(\S+)\s+(\d+(?:\.\d+)?)x", p)
+        # поддержим оба формата: 900w или 2x
+        if m:
+            if m.group(1) and m.group(2):
+                url, w = m.group(1), int(m.group(2))
+                cand.append((url, ("w", w)))
+            elif m.group(3) and m.group(4):
+                url, x = m.group(3), float(m.group(4))
+                cand.append((url, ("x", x)))
+    if not cand:
+        return None
+    # сортируем: сначала по 'w', затем по 'x'
+    def key(item):
+        kind, val = item[1]
+        return (0, val) if kind == "w" else (1, val)
+    cand.sort(key=key, reverse=True)
+    return cand[0][0]
+
+def _dedupe_keep_order(items: List[str]) -> List[str]:
+    seen = set()
+    out = []
+    for u in items:
+        if not u:
+            continue
+        if u not in seen:
+            seen.add(u)
+            out.append(u)
+    return out
+
+def _images_from_dom_photo(soup: BeautifulSoup) -> List[str]:
+    urls: List[str] = []
+
+    # Основная галерея: кнопки с миниатюрами внутри #gallery__photos
+    for btn in soup.select("#gallery__photos button"):
+        img = btn.find("img")
+        if not img:
+            continue
+        # если есть srcset — берём самый крупный
+        ss = img.get("srcset")
+        if ss:
+            best = _split_srcset_best(ss)
+            if best:
+                urls.append(best)
+                continue
+        # иначе — хотя бы src/data-src
+        u = img.get("src") or img.get("data-src")
+        if u:
+            urls.append(u)
+
+    # На всякий: любые <source srcset> внутри галереи
+    for src in soup.select("#gallery__photos source[srcset]"):
+        best = _split_srcset_best(src.get("srcset", ""))
+        if best:
+            urls.append(best)
+
+    return urls
+
+def _images_from_jsonld(soup: BeautifulSoup) -> List[str]:
+    out: List[str] = []
+    for s in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(s.string or "")
+        except Exception:
+            continue
+        objs = data if isinstance(data, list) else [data]
+        for obj in objs:
+            if not isinstance(obj, dict):
+                continue
+            imgs = obj.get("image")
+            if isinstance(imgs, list):
+                out.extend([u for u in imgs if isinstance(u, str)])
+            elif isinstance(imgs, str):
+                out.append(imgs)
+    return out
+
+
+def extract_images_from_photo_html(html: str) -> list[str]:
+    """
+    все фото со страницы <card>/photo
+    """
+    soup = BeautifulSoup(html, "lxml")
+
+    # 1) Из DOM галереи берём максимально большие версии по srcset
+    dom_imgs = _images_from_dom_photo(soup)
+
+    # 2) JSON-LD (иногда даёт хотя бы обложку)
+    ld_imgs = _images_from_jsonld(soup)
+
+    # 3) OG-изображение (fallback)
+    og = soup.find("meta", property="og:image") or soup.find("meta", attrs={"name": "og:image"})
+    og_img = [og["content"]] if og and og.get("content") else []
+
+    # Совмещаем с приоритетом DOM (обычно там полный набор), затем JSON-LD, затем og:image
+    all_imgs = _dedupe_keep_order(dom_imgs + ld_imgs + og_img)
+
+    return all_imgs
+
+def parse_morizon_card(html: str, city_name: str, url: str, images: Optional[List[str]] = None) -> Dict:
+    """
+    Парсит карточку Morizon и возвращает словарь для маппера:
+    {
+      "title", "description", "price", "rooms", "area_m2",
+      "district", "street", "images", "url", "external_url",
+      "source_ad_id", "location", "market"
+    }
+
+    Зависит от вспомогательных функций в модуле:
+      _num_from_text(s: str|None) -> float|None
+      _extract_details_table(soup: BeautifulSoup) -> Dict[str, str]
+
+    images — фото со страницы /photo (см. extract_images_from_photo_html); сеть здесь не трогаем.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    details = _extract_details_table(soup)
+    # ---------- Title ----------
+    title: Optional[str] = None
+    # самый надёжный селектор на новом Morizon
+    node = soup.select_one('h1[data-cy="pageDetailsPropertyTitle"]')
+    if node:
+        title = node.get_text(" ", strip=True)
+    if not title:
+        for sel in ("h1", "header h1", ".property__header h1"):
+            node = soup.select_one(sel)
+            if node:
+                title = node.get_text(" ", strip=True)
+                break
+    if not title:
+        ogt = soup.find("meta", attrs={"name": "og:title"}) or soup.find("meta", property="og:title")
+        if ogt and ogt.get("content"):
+            title = ogt["content"]
+
+    # ---------- Price ----------
+    price: Optional[float] = None
+    pnode = soup.select_one('span[data-cy="priceRowPrice"]')
+    if pnode:
+        price = _num_from_text(pnode.get_text(" ", strip=True))
+    if price is None:
+        # альтернативные блоки
+        for sel in ("[class*='price']", "[id*='price']", ".priceBox", ".property__price"):
+            node = soup.select_one(sel)
+            if node:
+                price = _num_from_text(node.get_text(" ", strip=True))
+                if price is not None:
+                    break
+    if price is None:
+        ogd = soup.find("meta", property="og:description")
+        if ogd and ogd.get("content"):
+            price = _num_from_text(ogd["content"])
+    if price is None:
+        # общий поиск по тексту
+        txt = soup.get_text(" ", strip=True)
+        m = re.search(r"([\d\s.,\u202f\u00a0]{4,})\s*zł", txt, flags=re.I)
+        if m:
+            price = _num_from_text(m.group(1))
+
+    # ---------- Rooms ----------
+    rooms: Optional[int] = None
+    rnode = soup.select_one('span[data-cy="detailsRowTextNumberOfRooms"]')
+    if rnode:
+        m = re.search(r"(\d+)", rnode.get_text(" ", strip=True))
+        if m:
+            rooms = int(m.group(1))
+
+    # ---------- Area ----------
+    area_m2: Optional[float] = None
+    anode = soup.select_one('span[data-cy="detailsRowTextArea"]')
+    if anode:
+        area_m2 = _num_from_text(anode.get_text(" ", strip=True))
+
+    # ---------- Description ----------
+    description: Optional[str] = None
+    # типовые контейнеры описания
+    for sel in (
+        '.ASk2iX',                             # встречается на новом Morizon
+        "[class*='description']",
+        "[id*='description']",
+        ".offer-description",
+        "article"
+    ):
+        node = soup.select_one(sel)
+        if node:
+            description = node.get_text("\n", strip=True)
+            if description:
+                break
+    if not description:
+        block = soup.find(string=re.compile(r"\bOpis\b", re.I))
+        if block and block.parent:
+            description = block.parent.get_text("\n", strip=True)
+
+
+    # ---------- Address: city/district/street ----------
+    # ---------- Address: city/district/street ----------
+    address: Optional[str] = None
+
+    # Новый адресный блок: цепочка <span> внутри .location-row__second_column h2
+    loc_h2 = soup.select_one(".location-row__second_column h2")
+    if loc_h2:
+        address = loc_h2.text
+        
+
+
+    # ---------- Market (Rynek: primary/secondary) ----------
+    market: Optional[str] = None
+    for k in ("rynek", "typ rynku"):
+        if k in details and details[k]:
+            v = details[k].strip().lower()
+            if "pierwotn" in v:            # pierwotny
+                market = "primary"
+            elif "wtórn" in v or "wtorn" in v or "wtor" in v:  # wtórny
+                market = "secondary"
+            else:
+                market = v
+            break
+    if not market:
+        # fallback по описанию
+        desc_lower = (description or "").lower()
+        if "rynek pierwotny" in desc_lower or "z rynku pierwotnego" in desc_lower:
+            market = "primary"
+        elif "rynek wtórny" in desc_lower or "z rynku wtórnego" in desc_lower or "rynek wtor" in desc_lower:
+            market = "secondary"
+
+    # ---------- URL / external / ID ----------
+
+
+    external_url = None  # у Morizon внешней ссылки на карточке обычно нет
+
+    source_ad_id: Optional[str] = None
+    m = re.search(r"(\d{6,})", url)
+    if m:
+        source_ad_id = m.group(1)
+    else:
+        source_ad_id = url.rstrip("/").rsplit("/", 1)[-1]
+    return {
+        "title": title,
+        "description": description,
+        "price": price,
+        "rooms": rooms,
+        "area_m2": area_m2,
+        "city": city_name,
+        "district": None,
+        "address": address,
+        "images": images or [],
+        "url": url,
+        "external_url": external_url,
+        "source_ad_id": source_ad_id,
+        "market": market,
+        "details": details,
+    }
+
+
+def parse_card_pages(html: str, photo_html: str, city_name: str, url: str) -> Dict:
+    """Карточка + её /photo -> dict для маппера (выполняется в пуле процессов разбора)."""
+    images = extract_images_from_photo_html(photo_html)
+    return parse_morizon_card(html, city_name=city_name, url=url, images=images)
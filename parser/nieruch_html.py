@@ -0,0 +1,254 @@
+# parser/nieruch_html.py
+"""Разбор HTML nieruchomosci-online.pl: выдача и карточка."""
+import re
+import json
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+
+def extract_listing_urls_from_search_html(html: str) -> List[str]:
+    """
+    Извлекаем ссылки на карточки из выдачи.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    urls: set[str] = set()
+
+    candidates = soup.find_all("h2", {"class": "name body-lg"})
+    for item in candidates:
+        href = item.find('a', href=True)
+        if href:
+            urls.add(href.get('href'))
+    
+    return list(urls)
+
+
+# =======================
+# Карточка
+# =======================
+def _clean_text(s: Optional[str]) -> Optional[str]:
+    if not s:
+        return s
+    return re.sub(r"\s+", " ", s).strip()
+
+def _num_from_text(s: Optional[str]) -> Optional[float]:
+    if not s:
+        return None
+    # допускаем пробелы/неразрывные пробелы/запятые
+    m = re.search(r"(\d[\d\s\u00a0\u202f\.,]*)", s)
+    if not m:
+        return None
+    raw = m.group(1)
+    raw = raw.replace("\u00a0", " ").replace("\u202f", " ")
+    raw = raw.replace(" ", "").replace(",", ".")
+    try:
+        return float(raw)
+    except Exception:
+        return None
+
+def _dedupe_keep_order(urls: List[str]) -> List[str]:
+    seen, out = set(), []
+    for u in urls:
+        if u and u not in seen:
+            seen.add(u); out.append(u)
+    return out
+
+def images_from_box_gallery(gallery: BeautifulSoup) -> List[str]:
+    """
+    Достаёт фото из <ul class="box-gallery">... (как в примере).
+    Возвращает список абсолютных URL без дублей, в правильном порядке.
+    """
+    if not gallery:
+        return []
+    # собираем (order_key, url)
+    items: List[Tuple[int, str]] = []
+    for li in gallery.find_all("li"):
+        img = li.find("img")
+    return _dedupe_keep_order([u for _, u in items])
+
+
+def extract_images_from_handle_record(scripts: list[BeautifulSoup]) -> List[str]:
+    """
+    Извлекает ссылки на фото (jpg/png/webp) из блока `modules.record.handleRecord({...})`
+    на nieruchomosci-online.pl.
+    Работает без рендера JS.
+    """
+    photo_urls = []
+    for script in scripts:
+        if 'modules.record.handleRecord' in script.text:
+            text = script.string
+
+            # Находим JSON с "photos"
+            match = re.search(r'photos\s*:\s*(\{.*?\}),\s*\n\t\tvideo', text, re.S)
+            if not match:
+                continue
+
+            photos_raw = match.group(1)
+
+            # Исправляем escape-последовательности
+            photos_clean = photos_raw.replace('\\/', '/')
+
+            # Попытка распарсить JSON
+            try:
+                photos = json.loads(photos_clean)
+            except json.JSONDecodeError:
+                # Если не получилось напрямую — подправим ключи
+                photos_clean = re.sub(r'(\w+):', r'"\1":', photos_clean)
+                photos = json.loads(photos_clean)
+
+            # приоритет — "x", затем "l"
+            urls = photos.get("x") or photos.get("l") or []
+            urls = [u.replace('\\/', '/') for u in urls]
+
+            # убираем дубли, сохраняя порядок
+            unique_urls = list(dict.fromkeys(urls))
+
+            photo_urls.extend(unique_urls)
+            break
+    return photo_urls
+
+def _extract_details_table(soup: BeautifulSoup) -> Dict[str, str]:
+    """
+    Блок «Szczegóły ogłoszenia»: <ul class="list-h"> внутри #detailsTable.
+    Пары выглядят как <li><strong>Label:</strong> <span>Value</span></li>.
+    Возвращаем {label_lower: value_text}.
+    """
+    res: Dict[str, str] = {}
+    details = soup.select("#detailsTable ul.list-h li")
+    for li in details:
+        strong = li.find("strong")
+        span = li.find("span")
+        if not strong or not span:
+            continue
+        label = _clean_text(strong.get_text(" ", strip=True)).rstrip(":").lower()
+        value = _clean_text(span.get_text(" ", strip=True))
+        if label and value:
+            res[label] = value
+    return res
+
+# ---------- основной парсер карточки ----------
+
+def parse_nieruch_card(html: str, city_name: str, url: str) -> Dict:
+    """
+    Возвращает словарь:
+    {
+      "title", "description", "price", "area_m2", "rooms",
+      "district", "street", "market", "images",
+      "url", "external_url", "source_ad_id"
+    }
+    """
+    soup = BeautifulSoup(html, "lxml")
+    details = _extract_details_table(soup)
+
+    # --- URL / ID ---
+    # из /.../25923251.html вытащим id
+    source_ad_id = None
+    if url:
+        m = re.search(r"/(\d+)\.html(?:[?#]|$)", url)
+        if m:
+            source_ad_id = m.group(1)
+
+    # --- Заголовок ---
+    # в верхнем блоке: h1.header-b.mod-c ...
+    title = None
+    h1 = soup.select_one(".box-offer-top h1, h1.header-b")
+    if h1:
+        title = _clean_text(h1.get_text(" ", strip=True))
+    if not title:
+        ogt = soup.find("meta", property="og:title")
+        if ogt and ogt.get("content"):
+            title = _clean_text(ogt["content"])
+
+    # --- Цена / Площадь / Цена за м2 ---
+    price = None
+    pnode = soup.select_one(".info-primary-price")
+    if pnode:
+        price = _num_from_text(pnode.get_text(" ", strip=True))
+    if price is None:
+        # в «Szczegóły ogłoszenia»: <strong>Cena:</strong> <span>690 000 zł (...)</span>
+        v = details.get("cena")
+        if v:
+            price = _num_from_text(v)
+
+    area_m2 = None
+    anode = soup.select_one(".info-area")
+    if anode:
+        area_m2 = _num_from_text(anode.get_text(" ", strip=True))
+    if area_m2 is None:
+        # ещё вариант в «Charakterystyka mieszkania»
+        v = details.get("charakterystyka mieszkania")
+        if v:
+            # строка вида: "47,24 m², 3 pokoje; stan: ..."
+            m = re.search(r"([\d\s\u00a0\u202f\.,]+)\s*m", v, flags=re.I)
+            if m:
+                area_m2 = _num_from_text(m.group(1))
+
+    # --- Комнаты ---
+    rooms = None
+    # быстрый вариант: в таблице-«плашках»
+    rnode = soup.select_one("#attributesTable .icon-data-rooms ~ .box__attributes--content .fsize-a")
+    if rnode:
+        rooms = int(_num_from_text(rnode.get_text(" ", strip=True)) or 0) or None
+    if rooms is None:
+        v = details.get("charakterystyka mieszkania")
+        if v:
+            # там же «..., 3 pokoje; ...»
+            m = re.search(r"(\d+)\s*pokoje?|\b(\d+)\b", v, flags=re.I)
+            if m:
+                rooms = int(next(g for g in m.groups() if g))  # первая непустая группа
+
+    # --- Market (Rynek) ---
+    market = None
+    v = details.get("rynek")
+    if v:
+        vv = v.strip().lower()
+        if "pierwotn" in vv:        # pierwotny
+            market = "primary"
+        elif "wtórn" in vv or "wtorn" in vv or "wtor" in vv:  # wtórny
+            market = "secondary"
+        else:
+            market = vv
+
+    # --- Адрес: улица/район/город ---
+    # 1) Верхняя строка под заголовком: ".title-b" (desktop) или <h2> под h1
+    #    Пример: "Magiera, Bielany, Warszawa, mazowieckie"
+    address = None
+    district = None
+
+    tline = soup.select_one("li.body-md.adress span") or soup.select_one(".box-offer-top h2.header-e, .box-offer-top h2")
+    if tline:
+        address = tline.text
+    
+    # --- Описание ---
+    # Короткая/развёрнутая части в #boxCustomDesc
+    description = None
+    desc_box = soup.select_one("#boxCustomDesc")
+    if desc_box:
+        for sel in (".estate-desc-more", ".estate-desc-less",):
+            node = desc_box.select_one(sel)
+            if node:
+                description = _clean_text(node.get_text("\n", strip=True)) or None
+                break
+    if not description:
+        # общий фолбэк
+        desc_any = soup.find(class_=re.compile(r"(desc|opis)", re.I))
+        if desc_any:
+            description = _clean_text(desc_any.get_text("\n", strip=True))
+
+    # --- Фото ---
+    images = extract_images_from_handle_record(soup.find_all("script", {"type": "text/javascript"})) or images_from_box_gallery(soup.find("ul", {"class": "box-gallery"}))
+
+    return {
+        "title": title,
+        "description": description,
+        "price": price,
+        "area_m2": area_m2,
+        "rooms": rooms,
+        "district": district,
+        "city": city_name,
+        "address": address,
+        "market": market,
+        "images": images or None,
+        "external_url": None,
+        "source_ad_id": source_ad_id,
+    }
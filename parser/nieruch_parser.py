@@ -1,20 +1,22 @@
 # parser/nieruch_parser.py
 import logging
-from time import sleep
-from random import randint
-from typing import Dict, List, Tuple, DefaultDict, Optional
+from typing import Dict, List, Tuple
 from collections import defaultdict
-import re
-import json
+import asyncio
 from threading import Event
 
-from bs4 import BeautifulSoup
-
 from net.http_client import http_get
+from parser.engine import CrawlEngine
+from parser.frontier import CrawlFrontier
+from parser.pager import walk_newest
+from parser.scheduler import PollScheduler
+from parser.supervisor import ScrapeSource, ScraperSupervisor
+from parser.parse_pool import parse_service
+from parser.nieruch_html import extract_listing_urls_from_search_html, parse_nieruch_card
 from db.session import get_sync_session
-from db.repo import add_listing, filter_new_urls
+from db.repo import add_listings_bulk, filter_new_urls, INSERTED, FAILED
 from db.mappers import map_nieruch_to_listing
-from config import CITY_IDS_NIERUCH, PROP_TYPES_NIERUCH, parser_pause
+from config import CITY_IDS_NIERUCH, PROP_TYPES_NIERUCH, PAGER_MAX_PAGES
 
 logger = logging.getLogger("nieruchomosci")
 
@@ -33,276 +35,47 @@ HEADERS = {
 # Листинг (страница результатов)
 # =======================
 
+PAGE_SIZE = 30   # карточек на странице выдачи (примерно)
+
+
 def build_nieruch_search_url(
     deal_type: str,      # "sale" | "rent"
     property_type: str,  # "apartment" | "house" | "room"
-    city: str
+    city: str,
+    page: int = 1,
 ) -> str:
     """
     deal_type: sale -> 'sprzedaz', rent -> 'wynajem'
     property_type: apartment -> 'mieszkania', house -> 'domy', room -> 'pokoje'
+    page: номер страницы выдачи (1 — без параметра)
     """
     dmap = {"sale": "sprzedaz", "rent": "wynajem"}
     pmap = {"apartment": "mieszkania", "house": "dom", "room": "pokoj"}
 
     d = dmap.get(deal_type, "sprzedaz")
     p = pmap.get(property_type, "mieszkania")
-    return f"https://www.nieruchomosci-online.pl/szukaj.html?3,{p},{d},,{city}&o=modDate,desc"
+    suffix = f"&p={page}" if page > 1 else ""
+    return f"https://www.nieruchomosci-online.pl/szukaj.html?3,{p},{d},,{city}&o=modDate,desc{suffix}"
     return f"https://www.nieruchomosci-online.pl/szukaj.html?3,{p},{d},,{city},,,,,,,1&o=modDate,desc" # только частные
 
 
-def extract_listing_urls_from_search_html(html: str) -> List[str]:
-    """
-    Извлекаем ссылки на карточки из выдачи.
-    """
-    soup = BeautifulSoup(html, "lxml")
-    urls: set[str] = set()
-
-    candidates = soup.find_all("h2", {"class": "name body-lg"})
-    for item in candidates:
-        href = item.find('a', href=True)
-        if href:
-            urls.add(href.get('href'))
-    
-    return list(urls)
-
 def get_search_page_urls(*, deal_type: str, property_type: str, city: str) -> List[str]:
     url = build_nieruch_search_url(deal_type=deal_type, property_type=property_type, city=city)
     r = http_get(url, headers=HEADERS, timeout=25)
     r.raise_for_status()
     return extract_listing_urls_from_search_html(r.text)
 
+
+async def aget_search_page_urls(
+    engine: CrawlEngine, *, deal_type: str, property_type: str, city: str, page: int = 1,
+) -> List[str]:
+    url = build_nieruch_search_url(deal_type=deal_type, property_type=property_type, city=city, page=page)
+    html = await engine.get_text(url, headers=HEADERS, timeout=25)
+    return await parse_service.run(extract_listing_urls_from_search_html, html)
+
 # =======================
 # Карточка
 # =======================
-def _clean_text(s: Optional[str]) -> Optional[str]:
-    if not s:
-        return s
-    return re.sub(r"\s+", " ", s).strip()
-
-def _num_from_text(s: Optional[str]) -> Optional[float]:
-    if not s:
-        return None
-    # допускаем пробелы/неразрывные пробелы/запятые
-    m = re.search(r"(\d[\d\s\u00a0\u202f\.,]*)", s)
-    if not m:
-        return None
-    raw = m.group(1)
-    raw = raw.replace("\u00a0", " ").replace("\u202f", " ")
-    raw = raw.replace(" ", "").replace(",", ".")
-    try:
-        return float(raw)
-    except Exception:
-        return None
-
-def _dedupe_keep_order(urls: List[str]) -> List[str]:
-    seen, out = set(), []
-    for u in urls:
-        if u and u not in seen:
-            seen.add(u); out.append(u)
-    return out
-
-def images_from_box_gallery(gallery: BeautifulSoup) -> List[str]:
-    """
-    Достаёт фото из <ul class="box-gallery">... (как в примере).
-    Возвращает список абсолютных URL без дублей, в правильном порядке.
-    """
-    if not gallery:
-        return []
-    # собираем (order_key, url)
-    items: List[Tuple[int, str]] = []
-    for li in gallery.find_all("li"):
-        img = li.find("img")
-    return _dedupe_keep_order([u for _, u in items])
-
-
-def extract_images_from_handle_record(scripts: list[BeautifulSoup]) -> List[str]:
-    """
-    Извлекает ссылки на фото (jpg/png/webp) из блока `modules.record.handleRecord({...})`
-    на nieruchomosci-online.pl.
-    Работает без рендера JS.
-    """
-    photo_urls = []
-    for script in scripts:
-        if 'modules.record.handleRecord' in script.text:
-            text = script.string
-
-            # Находим JSON с "photos"
-            match = re.search(r'photos\s*:\s*(\{.*?\}),\s*\n\t\tvideo', text, re.S)
-            if not match:
-                continue
-
-            photos_raw = match.group(1)
-
-            # Исправляем escape-последовательности
-            photos_clean = photos_raw.replace('\\/', '/')
-
-            # Попытка распарсить JSON
-            try:
-                photos = json.loads(photos_clean)
-            except json.JSONDecodeError:
-                # Если не получилось напрямую — подправим ключи
-                photos_clean = re.sub(r'(\w+):', r'"\1":', photos_clean)
-                photos = json.loads(photos_clean)
-
-            # приоритет — "x", затем "l"
-            urls = photos.get("x") or photos.get("l") or []
-            urls = [u.replace('\\/', '/') for u in urls]
-
-            # убираем дубли, сохраняя порядок
-            unique_urls = list(dict.fromkeys(urls))
-
-            photo_urls.extend(unique_urls)
-            break
-    return photo_urls
-
-def _extract_details_table(soup: BeautifulSoup) -> Dict[str, str]:
-    """
-    Блок «Szczegóły ogłoszenia»: <ul class="list-h"> внутри #detailsTable.
-    Пары выглядят как <li><strong>Label:</strong> <span>Value</span></li>.
-    Возвращаем {label_lower: value_text}.
-    """
-    res: Dict[str, str] = {}
-    details = soup.select("#detailsTable ul.list-h li")
-    for li in details:
-        strong = li.find("strong")
-        span = li.find("span")
-        if not strong or not span:
-            continue
-        label = _clean_text(strong.get_text(" ", strip=True)).rstrip(":").lower()
-        value = _clean_text(span.get_text(" ", strip=True))
-        if label and value:
-            res[label] = value
-    return res
-
-# ---------- основной парсер карточки ----------
-
-def parse_nieruch_card(html: str, city_name: str, url: str) -> Dict:
-    """
-    Возвращает словарь:
-    {
-      "title", "description", "price", "area_m2", "rooms",
-      "district", "street", "market", "images",
-      "url", "external_url", "source_ad_id"
-    }
-    """
-    soup = BeautifulSoup(html, "lxml")
-    details = _extract_details_table(soup)
-
-    # --- URL / ID ---
-    # из /.../25923251.html вытащим id
-    source_ad_id = None
-    if url:
-        m = re.search(r"/(\d+)\.html(?:[?#]|$)", url)
-        if m:
-            source_ad_id = m.group(1)
-
-    # --- Заголовок ---
-    # в верхнем блоке: h1.header-b.mod-c ...
-    title = None
-    h1 = soup.select_one(".box-offer-top h1, h1.header-b")
-    if h1:
-        title = _clean_text(h1.get_text(" ", strip=True))
-    if not title:
-        ogt = soup.find("meta", property="og:title")
-        if ogt and ogt.get("content"):
-            title = _clean_text(ogt["content"])
-
-    # --- Цена / Площадь / Цена за м2 ---
-    price = None
-    pnode = soup.select_one(".info-primary-price")
-    if pnode:
-        price = _num_from_text(pnode.get_text(" ", strip=True))
-    if price is None:
-        # в «Szczegóły ogłoszenia»: <strong>Cena:</strong> <span>690 000 zł (...)</span>
-        v = details.get("cena")
-        if v:
-            price = _num_from_text(v)
-
-    area_m2 = None
-    anode = soup.select_one(".info-area")
-    if anode:
-        area_m2 = _num_from_text(anode.get_text(" ", strip=True))
-    if area_m2 is None:
-        # ещё вариант в «Charakterystyka mieszkania»
-        v = details.get("charakterystyka mieszkania")
-        if v:
-            # строка вида: "47,24 m², 3 pokoje; stan: ..."
-            m = re.search(r"([\d\s\u00a0\u202f\.,]+)\s*m", v, flags=re.I)
-            if m:
-                area_m2 = _num_from_text(m.group(1))
-
-    # --- Комнаты ---
-    rooms = None
-    # быстрый вариант: в таблице-«плашках»
-    rnode = soup.select_one("#attributesTable .icon-data-rooms ~ .box__attributes--content .fsize-a")
-    if rnode:
-        rooms = int(_num_from_text(rnode.get_text(" ", strip=True)) or 0) or None
-    if rooms is None:
-        v = details.get("charakterystyka mieszkania")
-        if v:
-            # там же «..., 3 pokoje; ...»
-            m = re.search(r"(\d+)\s*pokoje?|\b(\d+)\b", v, flags=re.I)
-            if m:
-                rooms = int(next(g for g in m.groups() if g))  # первая непустая группа
-
-    # --- Market (Rynek) ---
-    market = None
-    v = details.get("rynek")
-    if v:
-        vv = v.strip().lower()
-        if "pierwotn" in vv:        # pierwotny
-            market = "primary"
-        elif "wtórn" in vv or "wtorn" in vv or "wtor" in vv:  # wtórny
-            market = "secondary"
-        else:
-            market = vv
-
-    # --- Адрес: улица/район/город ---
-    # 1) Верхняя строка под заголовком: ".title-b" (desktop) или <h2> под h1
-    #    Пример: "Magiera, Bielany, Warszawa, mazowieckie"
-    address = None
-    district = None
-
-    tline = soup.select_one("li.body-md.adress span") or soup.select_one(".box-offer-top h2.header-e, .box-offer-top h2")
-    if tline:
-        address = tline.text
-    
-    # --- Описание ---
-    # Короткая/развёрнутая части в #boxCustomDesc
-    description = None
-    desc_box = soup.select_one("#boxCustomDesc")
-    if desc_box:
-        for sel in (".estate-desc-more", ".estate-desc-less",):
-            node = desc_box.select_one(sel)
-            if node:
-                description = _clean_text(node.get_text("\n", strip=True)) or None
-                break
-    if not description:
-        # общий фолбэк
-        desc_any = soup.find(class_=re.compile(r"(desc|opis)", re.I))
-        if desc_any:
-            description = _clean_text(desc_any.get_text("\n", strip=True))
-
-    # --- Фото ---
-    images = extract_images_from_handle_record(soup.find_all("script", {"type": "text/javascript"})) or images_from_box_gallery(soup.find("ul", {"class": "box-gallery"}))
-
-    return {
-        "title": title,
-        "description": description,
-        "price": price,
-        "area_m2": area_m2,
-        "rooms": rooms,
-        "district": district,
-        "city": city_name,
-        "address": address,
-        "market": market,
-        "images": images or None,
-        "external_url": None,
-        "source_ad_id": source_ad_id,
-    }
-
-
 def fetch_and_parse_card(url: str, *, city_name: str) -> Dict:
     r = http_get(url, headers=HEADERS, timeout=25)
     r.raise_for_status()
@@ -310,68 +83,126 @@ def fetch_and_parse_card(url: str, *, city_name: str) -> Dict:
     data["url"] = url
     return data
 
+
+async def afetch_and_parse_card(engine: CrawlEngine, url: str, *, city_name: str) -> Dict:
+    html = await engine.get_text(url, headers=HEADERS, timeout=25)
+    data = await parse_service.run(parse_nieruch_card, html, city_name=city_name, url=url)
+    data["url"] = url
+    return data
+
 # =======================
 # Пайплайн
 # =======================
 
-def collect_new_urls(last_ids: Dict[Tuple[str, str, str], set]) -> Dict[Tuple[str, str, str], List[str]]:
+async def collect_new_urls(
+    engine: CrawlEngine,
+    frontier: CrawlFrontier,
+    sched: PollScheduler,
+) -> Dict[Tuple[str, str, str], List[str]]:
+    """
+    Урлы со страниц поиска конкурентно — только сегментов city×type, которые отдал планировщик:
+    выдача листается от новых до первой целиком известной страницы.
+    """
+    due = set(sched.take_due())
+    jobs = [
+        (city, property_type, deal_type)
+        for city in CITY_IDS_NIERUCH
+        for property_type, deal_type in PROP_TYPES_NIERUCH
+        if (city, property_type, deal_type) in due
+    ]
+
+    async def walk(key) -> List[str]:
+        city, property_type, deal_type = key
+        return await walk_newest(
+            lambda n: aget_search_page_urls(
+                engine, deal_type=deal_type, property_type=property_type, city=city, page=n + 1),
+            lambda u: frontier.add_new(key, u),
+            max_pages=PAGER_MAX_PAGES if frontier.known(key) else 1,
+        )
+
+    pages = await engine.map(walk, jobs)
+
     res: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
-    for city in CITY_IDS_NIERUCH:
-        for property_type, deal_type in PROP_TYPES_NIERUCH:
-            key = (city, property_type, deal_type)
+    for key, urls in zip(jobs, pages):
+        if isinstance(urls, BaseException):
+            logger.error("search failed: city=%s prop=%s deal=%s: %s", *key, urls)
+            sched.done(key, None)
+            continue
+        res[key].extend(urls)
+        # повторы неподтверждённых прошлых раундов — не новые для планировщика
+        sched.done(key, sum(1 for url in urls if not frontier.retrying(url)))
+    return res
+
+
+def _new_todo(
+    all_urls: Dict[Tuple[str, str, str], List[str]],
+) -> Tuple[List[Tuple[str, str, str, str]], List[str]]:
+    """(url, city, property_type, deal_type) тех URL, которых ещё нет в БД, и URL, которые уже есть."""
+    with get_sync_session() as session:
+        todo: List[Tuple[str, str, str, str]] = []
+        known: List[str] = []
+        for key, urls in all_urls.items():
+            city, property_type, deal_type = key
+            fresh = filter_new_urls(session, urls)
+            todo.extend((url, city, property_type, deal_type) for url in fresh)
+            known.extend(set(urls) - set(fresh))
+        return todo, known
+
+
+def _save(todo: List[Tuple[str, str, str, str]], cards: list) -> Tuple[int, List[str]]:
+    """Маппит и пишет карточки. Возвращает (вставлено, URL с известным исходом) — для frontier.confirm."""
+    with get_sync_session() as session:
+        mapped: List[dict] = []
+        mapped_urls: List[str] = []
+        done: List[str] = []
+        for (url, city, property_type, deal_type), card in zip(todo, cards):
+            if isinstance(card, BaseException):
+                logger.error("nieruch: failed card %s: %s", url, card)
+                continue
             try:
-                urls = get_search_page_urls(deal_type=deal_type, property_type=property_type, city=city)
-                for u in urls:
-                    if u not in last_ids[key]:
-                        last_ids[key].add(u)
-                        res[key].append(u)
-                sleep(randint(1, 4))
+                mapped.append(map_nieruch_to_listing(
+                    session,
+                    card,
+                    property_type=property_type,
+                    deal_type=deal_type,
+                ))
+                mapped_urls.append(url)
+                done.append(url)
             except Exception:
-                logger.exception("search failed: city=%s prop=%s deal=%s",
-                                 city, property_type, deal_type,
-                                 exc_info=False)
-    return res
+                logger.exception("nieruch: failed card %s", url, exc_info=False)
+
+        outcomes = add_listings_bulk(session, mapped) if mapped else []
+        # строку, которую отверг Postgres, не подтверждаем — её вернёт следующий опрос
+        failed = {url for url, res in zip(mapped_urls, outcomes) if res == FAILED}
+        return outcomes.count(INSERTED), [url for url in done if url not in failed]
 
-def make_round(last_ids: Dict[Tuple[str, str, str], set]) -> None:
-    try:
-        all_urls = collect_new_urls(last_ids)
+
+async def _round(frontier: CrawlFrontier, sched: PollScheduler) -> None:
+    async with CrawlEngine("nieruch") as engine:
+        all_urls = await collect_new_urls(engine, frontier, sched)
         total_found = sum(len(v) for v in all_urls.values())
         logger.info("Found nieruchomosci-online adds %s", total_found)
-        total_added = 0
-        with get_sync_session() as session:
-            for key, urls in all_urls.items():
-                city, property_type, deal_type = key
-                new_urls = filter_new_urls(session, urls)
-                for url in new_urls:
-                    try:
-                        card = fetch_and_parse_card(url, city_name=city)
-                        listing = map_nieruch_to_listing(
-                            session,
-                            card,
-                            property_type=property_type,
-                            deal_type=deal_type,
-                        )
-                        if add_listing(session, listing):
-                            total_added += 1
-                    except Exception:
-                        logger.exception("nieruch: failed card %s", url, exc_info=False)
+        # синхронная БД — вне event loop супервизора
+        todo, known = await asyncio.to_thread(_new_todo, all_urls)
+        cards = await engine.map(
+            lambda item: afetch_and_parse_card(engine, item[0], city_name=item[1]), todo)
+        total_added, done = await asyncio.to_thread(_save, todo, cards)
+        # в frontier — только URL с известным исходом; упавшие карточки вернутся в следующем опросе
+        for url in known + done:
+            frontier.confirm(url)
         logger.info("Added nieruchomosci-online adds %s", total_added)
-    except Exception:
-        logger.exception("make_round nieruch failed", exc_info=False)
 
 
+def nieruch_source() -> ScrapeSource:
+    return ScrapeSource(
+        "nieruch",
+        [(city, property_type, deal_type)
+         for city in CITY_IDS_NIERUCH for property_type, deal_type in PROP_TYPES_NIERUCH],
+        PAGE_SIZE,
+        _round,
+    )
+
 
 def start_nieruch(stop_event: Event) -> None:
-    last_ids: DefaultDict[Tuple[str, str, str], set] = defaultdict(set)
-    logger.info("Started")
-    try:
-        while not stop_event.is_set():
-            make_round(last_ids)
-            for _ in range(parser_pause):
-                if stop_event.is_set():
-                    break
-                sleep(1)
-    except Exception as e:
-        logger.exception("nieruchomosci parser error: %s", e)
-    finally:
-        logger.info("nieruchomosci parser stopped cleanly")
+    """Отдельный поток только с nieruchomosci-online (в main все источники крутит parser.supervisor.scrapers)."""
+    ScraperSupervisor().run([nieruch_source()], stop_event)
@@ -1,16 +1,22 @@
 # parser/olx_parser.py
+import asyncio
 import logging
 from collections import defaultdict
-from time import sleep
-from random import randint
-from typing import DefaultDict, Dict, List, Tuple
+from typing import Dict, List, Set, Tuple
 from threading import Event
 
 from net.http_client import get_json  # <— новый импорт
-from config import CITY_IDS_OLX, PROP_TYPES_OLX, parser_pause
+from parser.engine import CrawlEngine
+from parser.frontier import CrawlFrontier
+from parser.pager import walk_newest
+from parser.scheduler import PollScheduler
+from parser.supervisor import ScrapeSource, ScraperSupervisor
+from parser.parse_pool import parse_service
+from parser.html_text import clean_offer_texts
+from config import CITY_IDS_OLX, PROP_TYPES_OLX, PAGER_MAX_PAGES
 from db.mappers import map_olx_to_listing
 from db.session import get_sync_session
-from db.repo import add_listing
+from db.repo import add_listings_bulk, INSERTED, FAILED
 import json
 
 logger = logging.getLogger("olx")
@@ -38,8 +44,11 @@ headers = {
 }
 
 
+OFFER_URL = "https://www.olx.pl/api/v2/offers/{}/"
+
+
 def check_post_OLX(post_id: int) -> dict:
-    url = f"https://www.olx.pl/api/v2/offers/{post_id}/"
+    url = OFFER_URL.format(post_id)
     js = get_json(
       url,
       headers=headers,
@@ -47,11 +56,14 @@ def check_post_OLX(post_id: int) -> dict:
     return js or {}
 
 
-def get_page(city_id: int, category_id: int, offset: int = 0) -> dict:
-    url = "https://www.olx.pl/api/v1/offers/"
-    params = {
+OFFERS_URL = "https://www.olx.pl/api/v1/offers/"
+PAGE_SIZE = 50
+
+
+def _page_params(city_id: int, category_id: int, offset: int = 0) -> dict:
+    return {
         "offset": offset,
-        "limit": 50,
+        "limit": PAGE_SIZE,
         "category_id": category_id,
         "city_id": city_id,
         "currency": "PLN",
@@ -59,89 +71,165 @@ def get_page(city_id: int, category_id: int, offset: int = 0) -> dict:
         "filter_refiners": "spell_checker",
         #"private_business": "private", # только частные
     }
+
+
+def get_page(city_id: int, category_id: int, offset: int = 0) -> dict:
     return get_json(
-        url,
-        params=params,
+        OFFERS_URL,
+        params=_page_params(city_id, category_id, offset),
         headers=headers
     )
 
 
+async def aget_page(engine: CrawlEngine, city_id: int, category_id: int, offset: int = 0) -> dict:
+    return await engine.get_json(
+        OFFERS_URL,
+        params=_page_params(city_id, category_id, offset),
+        headers=headers
+    )
+
 
-def get_all_new_posts(
-    last_ids: DefaultDict[Tuple[int, int], int]
-) -> Dict[Tuple[str, str], List[dict]]:
+
+async def get_all_new_posts(
+    engine: CrawlEngine,
+    frontier: CrawlFrontier,
+    sched: PollScheduler,
+) -> Tuple[Dict[Tuple[str, str], List[dict]], Dict[Tuple[int, int], List[int]]]:
     """
-    Возвращает новые объявления, сгруппированные ключом (property_type, deal_type).
-    last_ids хранит последний id по ключу (city_id, category_id).
+    Возвращает новые объявления, сгруппированные ключом (property_type, deal_type),
+    и их id по ключу frontier (city_id, category_id).
+    frontier хранит водяной знак — последний id по ключу (city_id, category_id);
+    здесь он не двигается: это делает _round после записи (см. _advance_watermarks).
+    Опрашиваются только сегменты, которые отдал планировщик; каждый листается
+    от новых (offset 0, 50, ...) до первой страницы без id выше водяного знака.
+    Ключи качаются конкурентно в рамках бюджета engine.
     """
+    due = set(sched.take_due())
+    jobs = [
+        (city_id, category_id, property_type, deal_type)
+        for city_id in CITY_IDS_OLX
+        for category_id, property_type, deal_type in PROP_TYPES_OLX
+        if (city_id, category_id) in due
+    ]
+
+    async def walk(job) -> List[dict]:
+        city_id, category_id = job[0], job[1]
+        key = (city_id, category_id)
+        old_cur_id = frontier.watermark(key)
+
+        async def fetch(n: int) -> List[dict]:
+            payload = await aget_page(engine, city_id, category_id, offset=n * PAGE_SIZE)
+            return (payload or {}).get("data") or []
+
+        return await walk_newest(
+            fetch,
+            lambda offer: (offer.get("id") or 0) > old_cur_id,
+            max_pages=PAGER_MAX_PAGES if frontier.known(key) else 1,
+        )
+
+    pages = await engine.map(walk, jobs)
+
     res: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
-    for city_id in CITY_IDS_OLX:
-        for category_id, property_type, deal_type in PROP_TYPES_OLX:
-            key = (city_id, category_id)
-            old_cur_id = last_ids[key]
-            try:
-                payload = get_page(city_id, category_id)
-                data = payload.get("data") or []
-                if not data:
-                    continue
-                for offer in data:
-                    offer: dict
-                    cur_id = offer.get("id") or 0
-                    if cur_id > old_cur_id:
-                        res[(property_type, deal_type)].append(offer)
-                        last_ids[key] = max(cur_id, last_ids[key])
-                sleep(randint(1,4))  # вежливая пауза
-            except Exception:
-                logger.exception(
-                    "get_all_new_posts failed for city=%s category=%s", city_id, category_id,
-                    exc_info=False)
-    return res
-
-
-def make_round(last_ids: DefaultDict[Tuple[int, int], int]) -> None:
-    try:
-        posts = get_all_new_posts(last_ids)
-        if not posts:
-            logger.info("No new posts this round")
-            return
-        else:
-            tmp = sum([len(val) for val in posts.values()])
-            logger.info(f"Found olx adds {tmp}")
-        with get_sync_session() as session:
-            total = 0
-            for (property_type, deal_type), offers in posts.items():
-                for item in offers:
-                    try:
-                        listing = map_olx_to_listing(
-                            session, item,
-                            property_type=property_type,
-                            deal_type=deal_type,
-                        )
-                        if add_listing(session, listing):
-                            total += 1
-                    except Exception:
-                        logger.exception(
-                            "Failed to upsert listing (prop=%s, deal=%s, src_id=%s)",
-                            property_type, deal_type, item.get("id"),
-                            exc_info=False
-                        )
-            logger.info("Committed %d olx listings", total)
-    except Exception as e:
-        logger.error(f"make_round olx failed {e}")
+    ids: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for (city_id, category_id, property_type, deal_type), offers in zip(jobs, pages):
+        key = (city_id, category_id)
+        if isinstance(offers, BaseException):
+            logger.error(
+                "get_all_new_posts failed for city=%s category=%s: %s", city_id, category_id, offers)
+            sched.done(key, None)
+            continue
+        # планировщику — только впервые увиденные: id выше прошлого пика, а не повторы
+        # застрявших под водяным знаком
+        peak = frontier.peak(key)
+        for offer in offers:
+            res[(property_type, deal_type)].append(offer)
+            ids[key].append(offer.get("id") or 0)
+        sched.done(key, sum(1 for offer_id in ids[key] if offer_id > peak))
+        if ids[key]:
+            frontier.raise_peak(key, max(ids[key]))
+    return res, ids
+
+
+def _advance_watermarks(
+    frontier: CrawlFrontier,
+    ids: Dict[Tuple[int, int], List[int]],
+    saved: Set[int],
+) -> None:
+    """
+    Двигает водяной знак ключа до последнего id, ниже которого всё обработано.
+    Несохранённый id и всё, что новее его, остаются выше знака — их вернёт следующий опрос
+    (уже записанные при этом отсеются в add_listings_bulk как дубли). Каждый такой раунд —
+    неудачная попытка id (frontier.fail); исчерпавший попытки id считается обработанным,
+    и знак проходит мимо него.
+    """
+    for key, key_ids in ids.items():
+        stuck = False
+        for offer_id in sorted(key_ids):
+            url = OFFER_URL.format(offer_id)
+            if offer_id in saved:
+                frontier.confirm(url)
+            elif frontier.fail(url):
+                logger.warning("olx offer %s failed %d rounds in a row, skipping it",
+                               offer_id, frontier.max_attempts)
+            else:
+                stuck = True
+            if not stuck:
+                frontier.advance(key, offer_id)
+
+
+def _save(posts: Dict[Tuple[str, str], List[dict]]) -> Tuple[int, Set[int]]:
+    """Маппит и пишет оферы. Возвращает (вставлено, id оферов с известным исходом)."""
+    with get_sync_session() as session:
+        mapped: List[dict] = []
+        mapped_ids: List[int] = []
+        for (property_type, deal_type), offers in posts.items():
+            for item in offers:
+                try:
+                    mapped.append(map_olx_to_listing(
+                        session, item,
+                        property_type=property_type,
+                        deal_type=deal_type,
+                        cleaned=True,
+                    ))
+                    mapped_ids.append(item.get("id") or 0)
+                except Exception:
+                    logger.exception(
+                        "Failed to map listing (prop=%s, deal=%s, src_id=%s)",
+                        property_type, deal_type, item.get("id"),
+                        exc_info=False
+                    )
+        outcomes = add_listings_bulk(session, mapped) if mapped else []
+        # строку, которую отверг Postgres, ждём в следующем опросе
+        saved = {offer_id for offer_id, res in zip(mapped_ids, outcomes) if res != FAILED}
+        return outcomes.count(INSERTED), saved
+
+
+async def _round(frontier: CrawlFrontier, sched: PollScheduler) -> None:
+    async with CrawlEngine("olx") as engine:
+        posts, ids = await get_all_new_posts(engine, frontier, sched)
+    if not posts:
+        logger.info("No new posts this round")
+        return
+    tmp = sum([len(val) for val in posts.values()])
+    logger.info(f"Found olx adds {tmp}")
+    cleaned = await asyncio.gather(*(parse_service.run(clean_offer_texts, offers) for offers in posts.values()))
+    posts = dict(zip(posts.keys(), cleaned))
+    # маппинг и запись — синхронная БД, вне event loop супервизора
+    total, saved = await asyncio.to_thread(_save, posts)
+    _advance_watermarks(frontier, ids, saved)
+    logger.info("Committed %d olx listings", total)
+
+
+def olx_source() -> ScrapeSource:
+    # сегмент: (city_id, category_id) -> последний увиденный offer.id (персистентно)
+    return ScrapeSource(
+        "olx",
+        [(city_id, category_id) for city_id in CITY_IDS_OLX for category_id, _, _ in PROP_TYPES_OLX],
+        PAGE_SIZE,
+        _round,
+    )
+
 
 def start_olx(stop_event: Event):
-    # ключ: (city_id, category_id) -> последний увиденный offer.id
-    last_ids: DefaultDict[Tuple[int, int], int] = defaultdict(int)
-    logger.info("Started OLX parser")
-
-    try:
-        while not stop_event.is_set():
-            make_round(last_ids)
-            for _ in range(parser_pause):
-                if stop_event.is_set():
-                    break
-                sleep(1)
-    except Exception as e:
-        logger.exception("OLX parser error: %s", e)
-    finally:
-        logger.info("OLX parser stopped cleanly")
+    """Отдельный поток только с OLX (в main все источники крутит parser.supervisor.scrapers)."""
+    ScraperSupervisor().run([olx_source()], stop_event)
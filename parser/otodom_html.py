@@ -0,0 +1,48 @@
+# parser/otodom_html.py
+"""Разбор HTML Otodom: ссылки выдачи и объект ad из __NEXT_DATA__ карточки."""
+import json
+
+from bs4 import BeautifulSoup
+
+from parser.html_text import html_to_text
+
+
+def parse_search_page(page: str) -> list[str]:
+    """
+    ссылки на объявления из html страницы выдачи
+    """
+    soup = BeautifulSoup(page, 'lxml')
+    listing = soup.find("div", {"data-cy": "search.listing.organic"})
+    if listing is not None:
+        items = listing.find_all("a", {"data-cy": "listing-item-link"}, href=True)[:-2]
+        return ["https://www.otodom.pl" + item.get("href") for item in items if item]
+    
+    return []
+
+
+def parse_next_data(page: str) -> dict:
+    """
+    объект ad из __NEXT_DATA__ карточки
+    """
+    soup = BeautifulSoup(page, 'lxml')
+    nd_tag = soup.find("script", id="__NEXT_DATA__", type="application/json")
+    if not nd_tag or not nd_tag.string:
+        raise RuntimeError("__NEXT_DATA__ not found")
+
+    nd = json.loads(nd_tag.string)
+    ad = nd.get("props", {}).get("pageProps", {}).get("ad")
+    if not ad:
+        raise RuntimeError("ad object not found in pageProps")
+    return ad
+
+
+def parse_ad_page(page: str) -> dict:
+    """
+    parse_next_data + заголовок/описание сразу текстом — весь разбор HTML карточки
+    в пуле процессов, маппер получает уже очищенные строки.
+    """
+    ad = parse_next_data(page)
+    for field in ("title", "description"):
+        if isinstance(ad.get(field), str):
+            ad[field] = html_to_text(ad[field])
+    return ad
@@ -1,17 +1,22 @@
 # parser/otodom_parser.py
+import asyncio
 import logging
 from collections import defaultdict
-from time import sleep
-from random import randint
-from typing import DefaultDict, Dict, List, Tuple
+from typing import Dict, List, Tuple
 from threading import Event
-from bs4 import BeautifulSoup
 
 from net.http_client import http_get
-from config import CITY_IDS_OTODOM, PROP_TYPES_OTODOM, parser_pause
+from parser.engine import CrawlEngine
+from parser.frontier import CrawlFrontier
+from parser.pager import walk_newest
+from parser.scheduler import PollScheduler
+from parser.supervisor import ScrapeSource, ScraperSupervisor
+from parser.parse_pool import parse_service
+from parser.otodom_html import parse_search_page, parse_next_data, parse_ad_page
+from config import CITY_IDS_OTODOM, PROP_TYPES_OTODOM, PAGER_MAX_PAGES
 from db.mappers import map_otodom_to_listing
 from db.session import get_sync_session
-from db.repo import add_listing, filter_new_urls
+from db.repo import add_listings_bulk, filter_new_urls, INSERTED, FAILED
 import json
 
 logger = logging.getLogger("otodom")
@@ -37,31 +42,39 @@ def test_js(js: dict, idx: str = "0") -> None:
         json.dump(js, file, indent=4, ensure_ascii=False, default=str)
 
 
-def get_page(deal_type: str, prop_type: str, region: str, city: str, offset: int = 1) -> list[str]:
-    """
-    возвращает список ссылок для города
-    """
+PAGE_SIZE = 72
+
+
+def _search_request(deal_type: str, prop_type: str, region: str, city: str, offset: int = 1) -> tuple[str, dict]:
     url = f"https://www.otodom.pl/pl/wyniki/{deal_type}/{prop_type}/{region}/{city}/{city}/{city}"
     params = {
-    "limit": 72,
+    "limit": PAGE_SIZE,
     "ownerTypeSingleSelect": "ALL", #ALL PRIVATE
     "by": "LATEST",
     "direction": "DESC",
     "page": offset,
     }
+    return url, params
+
+
+def get_page(deal_type: str, prop_type: str, region: str, city: str, offset: int = 1) -> list[str]:
+    """
+    возвращает список ссылок для города
+    """
+    url, params = _search_request(deal_type, prop_type, region, city, offset)
     resp = http_get(
         url,
         params=params,
         headers=headers
     )
-    page = resp.text
-    soup = BeautifulSoup(page, 'lxml')
-    listing = soup.find("div", {"data-cy": "search.listing.organic"})
-    if listing is not None:
-        items = listing.find_all("a", {"data-cy": "listing-item-link"}, href=True)[:-2]
-        return ["https://www.otodom.pl" + item.get("href") for item in items if item]
-    
-    return []
+    return parse_search_page(resp.text)
+
+
+async def aget_page(engine: CrawlEngine, deal_type: str, prop_type: str, region: str, city: str, offset: int = 1) -> list[str]:
+    url, params = _search_request(deal_type, prop_type, region, city, offset)
+    page = await engine.get_text(url, params=params, headers=headers)
+    return await parse_service.run(parse_search_page, page)
+
 
 def get_NEXT_DATA(url: str) -> dict:
     '''
@@ -70,95 +83,131 @@ def get_NEXT_DATA(url: str) -> dict:
         url,
         headers=headers
     )
-    page = resp.text
-    soup = BeautifulSoup(page, 'lxml')
-    nd_tag = soup.find("script", id="__NEXT_DATA__", type="application/json")
-    if not nd_tag or not nd_tag.string:
-        raise RuntimeError("__NEXT_DATA__ not found")
+    return parse_next_data(resp.text)
 
-    nd = json.loads(nd_tag.string)
-    ad = nd.get("props", {}).get("pageProps", {}).get("ad")
-    if not ad:
-        raise RuntimeError("ad object not found in pageProps")
-    return ad
 
+async def aget_NEXT_DATA(engine: CrawlEngine, url: str) -> dict:
+    page = await engine.get_text(url, headers=headers)
+    return await parse_service.run(parse_ad_page, page)
 
 
-def get_all_new_posts(
-    last_ids: Dict[Tuple[str, str, str], set]
-) -> Dict[Tuple[str, str, str], List[dict]]:
+async def get_all_new_posts(
+    engine: CrawlEngine,
+    frontier: CrawlFrontier,
+    sched: PollScheduler,
+) -> Dict[Tuple[str, str, str], List[str]]:
     """
-    Возвращает новые объявления, сгруппированные ключом (property_type, deal_type).
-    last_ids хранит последний id по ключу (city_id, category_id).
+    Возвращает новые объявления, сгруппированные ключом (city, property_type, deal_type).
+    Сегмент (ключ frontier и планировщика) — категория otodom (city, prop_type_str, deal_type_str):
+    mieszkanie и kawalerka сводятся к одному property_type, но листаются и опрашиваются по отдельности.
+    Опрашиваются сегменты, которые отдал планировщик; выдача листается от новых до первой
+    целиком известной страницы. Сегменты качаются конкурентно в рамках бюджета engine.
     """
-    res: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
+    due = set(sched.take_due())
+    jobs = []
     for region, city in CITY_IDS_OTODOM:
-
         for categories, property_type, deal_type in PROP_TYPES_OTODOM:
             prop_type_str, deal_type_str = categories
-            key = (city, property_type, deal_type)
-            try:
-                urls = get_page(deal_type_str, prop_type_str, region, city)
-                for url in urls:
-                    if url not in last_ids[key]:
-                        last_ids[key].add(url)
-                        res[key].append(url)
-                sleep(randint(1,2))  # вежливая пауза
-            except Exception:
-                logger.exception(
-                    "get_all_new_posts failed for city=%s category=%s deal=%s",
-                    city,
-                    property_type,
-                    deal_type,
-                    exc_info=False)
+            fkey = (city, prop_type_str, deal_type_str)
+            if fkey in due:
+                jobs.append(((city, property_type, deal_type), fkey, (deal_type_str, prop_type_str, region, city)))
+
+    async def walk(job) -> List[str]:
+        _, fkey, args = job
+        return await walk_newest(
+            lambda n: aget_page(engine, *args, offset=n + 1),
+            lambda url: frontier.add_new(fkey, url),
+            max_pages=PAGER_MAX_PAGES if frontier.known(fkey) else 1,
+        )
+
+    pages = await engine.map(walk, jobs)
+
+    res: Dict[Tuple[str, str, str], List[str]] = defaultdict(list)
+    for (key, fkey, _), urls in zip(jobs, pages):
+        if isinstance(urls, BaseException):
+            logger.error(
+                "get_all_new_posts failed for city=%s category=%s deal=%s: %s",
+                *key, urls)
+            sched.done(fkey, None)
+            continue
+        res[key].extend(urls)
+        # повторы неподтверждённых прошлых раундов — не новые для планировщика
+        sched.done(fkey, sum(1 for url in urls if not frontier.retrying(url)))
     return res
 
 
-def make_round(last_ids: dict) -> None:
-    '''
-    '''
-    try:
-        posts = get_all_new_posts(last_ids)
+def _new_todo(posts: Dict[Tuple[str, str, str], List[str]]) -> Tuple[List[Tuple[str, str, str]], List[str]]:
+    """(url, property_type, deal_type) тех URL, которых ещё нет в БД, и URL, которые уже есть."""
+    with get_sync_session() as session:
+        todo: List[Tuple[str, str, str]] = []
+        known: List[str] = []
+        for key, urls in posts.items():
+            city, property_type, deal_type = key
+            fresh = filter_new_urls(session, urls)
+            todo.extend((url, property_type, deal_type) for url in fresh)
+            known.extend(set(urls) - set(fresh))
+        return todo, known
+
+
+def _save(todo: List[Tuple[str, str, str]], cards: list) -> Tuple[int, List[str]]:
+    """Маппит и пишет карточки. Возвращает (вставлено, URL с известным исходом) — для frontier.confirm."""
+    with get_sync_session() as session:
+        mapped: List[dict] = []
+        mapped_urls: List[str] = []
+        done: List[str] = []
+        for (url, property_type, deal_type), next_data in zip(todo, cards):
+            if isinstance(next_data, BaseException):
+                logger.error(f"Error procesing url: {url} {next_data}")
+                continue
+            try:
+                if next_data:
+                    mapped.append(map_otodom_to_listing(
+                        session,
+                        next_data,
+                        property_type=property_type,
+                        deal_type=deal_type,
+                        cleaned=True))
+                    mapped_urls.append(url)
+                done.append(url)
+            except Exception as e:
+                logger.error(f"Error procesing url: {url} {e}")
+
+        outcomes = add_listings_bulk(session, mapped) if mapped else []
+        # строку, которую отверг Postgres, не подтверждаем — её вернёт следующий опрос
+        failed = {url for url, res in zip(mapped_urls, outcomes) if res == FAILED}
+        return outcomes.count(INSERTED), [url for url in done if url not in failed]
+
+
+async def _round(frontier: CrawlFrontier, sched: PollScheduler) -> None:
+    async with CrawlEngine("otodom") as engine:
+        posts = await get_all_new_posts(engine, frontier, sched)
         tmp = sum([len(val) for val in posts.values()])
         logger.info(f"Found otodom adds {tmp}")
-        total = 0
-        with get_sync_session() as session:
-            for key, urls in posts.items():
-                new_urls = filter_new_urls(session, urls)
-                city, property_type, deal_type = key
-                for url in new_urls:
-                    try:
-                        next_data = get_NEXT_DATA(url)
-                        if next_data:
-                            otd_l = map_otodom_to_listing(
-                                session,
-                                next_data,
-                                property_type=property_type,
-                                deal_type=deal_type)
-                            if add_listing(session, otd_l):
-                                total += 1
-                    except Exception as e:
-                        logger.error(f"Error procesing url: {url} {e}")
-        
-        logger.info("Committed %d otodom listings", total)
-
-    except Exception:
-        logger.exception("make_round otodom failed", exc_info=False)
+        # синхронная БД — вне event loop супервизора
+        todo, known = await asyncio.to_thread(_new_todo, posts)
+        cards = await engine.map(lambda item: aget_NEXT_DATA(engine, item[0]), todo)
+        total, done = await asyncio.to_thread(_save, todo, cards)
+        # в frontier — только URL с известным исходом; упавшие карточки вернутся в следующем опросе
+        for url in known + done:
+            frontier.confirm(url)
+
+        logger.info("Committed %d otodom listings (%d requests, %d errors)", total, engine.requests, engine.errors)
+
+
+def otodom_source() -> ScrapeSource:
+    # сегмент: категория otodom (city, prop_type_str, deal_type_str) -> последние увиденные URL
+    return ScrapeSource(
+        "otodom",
+        [
+            (city, prop_type_str, deal_type_str)
+            for _, city in CITY_IDS_OTODOM
+            for (prop_type_str, deal_type_str), _, _ in PROP_TYPES_OTODOM
+        ],
+        PAGE_SIZE,
+        _round,
+    )
 
 
 def start_otodom(stop_event: Event):
-    # ключ: (city_id, category_id) -> последний увиденный offer.id
-    last_ids: DefaultDict[Tuple[str, str, str], set] = defaultdict(set)
-    logger.info("Started")
-    try:
-        while not stop_event.is_set():
-            make_round(last_ids)
-            logger.debug("otodom last_ids snapshot: %r", dict(last_ids))
-            for _ in range(parser_pause):
-                if stop_event.is_set():
-                    break
-                sleep(1)
-    except Exception as e:
-        logger.exception("otodom parser error: %s", e)
-    finally:
-        logger.info("otodom parser stopped cleanly")
\ No newline at end of file
+    """Отдельный поток только с otodom (в main все источники крутит parser.supervisor.scrapers)."""
+    ScraperSupervisor().run([otodom_source()], stop_event)
@@ -0,0 +1,43 @@
+# parser/pager.py
+from __future__ import annotations
+import logging
+from typing import Awaitable, Callable, List, TypeVar
+
+logger = logging.getLogger("net")
+
+T = TypeVar("T")
+
+
+async def walk_newest(
+    fetch_page: Callable[[int], Awaitable[List[T]]],
+    is_new: Callable[[T], bool],
+    *,
+    max_pages: int,
+) -> List[T]:
+    """
+    Инкрементальный пейджер выдачи, отсортированной от новых к старым.
+    fetch_page(n) — элементы n-й страницы (n от 0); is_new(item) — элемент ещё не встречался
+    (обычно CrawlFrontier.add_new: он отмечает элемент как pending, а в seen элемент попадает
+    только после confirm(), когда исход записи известен).
+    Листаем, пока страница содержит хоть один новый элемент: первая целиком известная
+    (или пустая) страница — стоп. Больше max_pages не идём.
+    Ошибка на первой странице пробрасывается; на следующих — возвращаем уже найденное:
+    элементы с прошлых страниц уже отмечены pending, и без обработки в этом раунде
+    discard_pending() засчитал бы им неудачную попытку.
+    """
+    fresh: List[T] = []
+    for n in range(max(1, max_pages)):
+        try:
+            items = await fetch_page(n)
+        except Exception as e:
+            if n == 0:
+                raise
+            logger.warning("pager stopped at page %d: %r", n + 1, e)
+            break
+        if not items:
+            break
+        new = [it for it in items if is_new(it)]
+        fresh.extend(new)
+        if not new:
+            break
+    return fresh
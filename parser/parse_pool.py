@@ -0,0 +1,86 @@
+# parser/parse_pool.py
+from __future__ import annotations
+import asyncio
+import functools
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, TypeVar
+
+from config import PARSE_WORKERS
+
+logger = logging.getLogger("net")
+
+R = TypeVar("R")
+
+
+def _worker_init() -> None:
+    # Ctrl+C обрабатывает главный процесс; воркеры гасятся через shutdown()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ParseService:
+    """
+    Разбор HTML вне процесса бота: ProcessPoolExecutor на PARSE_WORKERS процессов.
+    run(fn, *args) — fn должна быть функцией уровня модуля (HTML/JSON на входе,
+    простые dict/list/str на выходе — всё это пиклится). Пул создаётся лениво,
+    общий для всех потоков; упавший пул (убитый воркер) пересоздаётся, вызов повторяется один раз.
+    spawn, а не fork: в процессе крутятся потоки бота и парсеров, fork их блокировки не переживает.
+    Поэтому fn берём из модулей разбора (parser/*_html.py, parser/html_text.py) — они тянут только
+    bs4/lxml, и воркер, импортируя их, не поднимает БД, бота и логгеры приложения.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.restarts = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_worker_init,
+                )
+                logger.info("parse pool started: %d workers", self.workers)
+            return self._pool
+
+    def _reset(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, fn: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        self.calls += 1
+        call = functools.partial(fn, *args, **kwargs)
+        if self.workers <= 0:
+            return await asyncio.to_thread(call)
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        try:
+            return await loop.run_in_executor(pool, call)
+        except BrokenProcessPool:
+            logger.warning("parse pool broken — recreating and retrying once")
+            self._reset(pool)
+        return await loop.run_in_executor(self._executor(), call)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+            logger.info("parse pool stopped")
+
+    def snapshot(self) -> dict:
+        return {"workers": self.workers, "calls": self.calls, "restarts": self.restarts}
+
+
+parse_service = ParseService()
@@ -0,0 +1,159 @@
+# parser/scheduler.py
+from __future__ import annotations
+import heapq
+import itertools
+import logging
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from config import (
+    POLL_BUDGETS, PAGER_TARGET_FILL, PAGER_MIN_INTERVAL, PAGER_MAX_INTERVAL, parser_pause,
+)
+from parser.frontier import CrawlFrontier
+
+logger = logging.getLogger("net")
+
+_RATE_FLOOR = 1.0 / PAGER_MAX_INTERVAL   # темп «тихого»/ещё не измеренного сегмента, новых/сек
+
+
+class PollScheduler:
+    """
+    Планировщик опроса выдачи одного источника по сегментам (город, тип, сделка).
+    Новые объявления сегмента — пуассоновский поток с темпом λ (EWMA из CrawlFrontier).
+    При опросе раз в T среднее «недосмотренное» время на объявление ~ T/2, суммарная
+    потеря свежести ~ Σ λ_i·T_i; при бюджете B опросов/сек (Σ 1/T_i = B) минимум даёт
+    T_i = Σ√λ_j / (B·√λ_i) — горячие сегменты чаще, тихие реже, но не реже PAGER_MAX_INTERVAL.
+    Сверху T_i ограничен ещё и PAGER_TARGET_FILL страницы новых — чтобы всплеск влезал в пейджер.
+
+    Очередь — куча по времени следующего опроса; из наступивших take_due() отдаёт сегменты
+    с наибольшим ожидаемым числом накопившихся новых (λ·t), сколько позволяет token bucket
+    бюджета. Бюджет по умолчанию — столько опросов, сколько давал прежний цикл
+    «все сегменты раз в parser_pause», но распределённых по темпу.
+    Объект живёт в потоке парсера вместе с frontier — блокировок нет.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        frontier: CrawlFrontier,
+        segments: Sequence[Hashable],
+        page_size: int,
+        budget_per_min: Optional[float] = None,
+    ):
+        self.source = source
+        self.frontier = frontier
+        self.segments: List[Hashable] = list(dict.fromkeys(segments))
+        self.page_size = page_size
+        per_min = budget_per_min or POLL_BUDGETS.get(source) or len(self.segments) * 60 / parser_pause
+        self.budget = max(per_min, 1e-3) / 60.0          # опросов в секунду
+        self.capacity = float(max(1, len(self.segments)))
+        self._tokens = self.capacity                      # холодный старт — один полный проход
+        self._refilled = time.monotonic()
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._next: Dict[Hashable, float] = {}
+        self._inflight: Set[Hashable] = set()
+        self._seq = itertools.count()
+        self.polls = 0
+        self.failures = 0
+
+        now = time.time()
+        for key in self.segments:
+            _, polled_at = frontier.poll_state(key)
+            self._push(key, now if polled_at is None else polled_at + self.interval(key))
+
+    def _push(self, key: Hashable, at: float) -> None:
+        self._next[key] = at
+        heapq.heappush(self._heap, (at, next(self._seq), key))
+
+    def _rate(self, key: Hashable) -> float:
+        rate, _ = self.frontier.poll_state(key)
+        return max(rate, _RATE_FLOOR)
+
+    def interval(self, key: Hashable) -> float:
+        """Интервал опроса сегмента по правилу квадратного корня (см. docstring класса)."""
+        rate = self._rate(key)
+        total = sum(math.sqrt(self._rate(k)) for k in self.segments)
+        t = total / (self.budget * math.sqrt(rate))
+        t = min(t, PAGER_TARGET_FILL * self.page_size / rate)
+        return min(float(PAGER_MAX_INTERVAL), max(float(PAGER_MIN_INTERVAL), t))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._refilled) * self.budget)
+        self._refilled = now
+
+    def take_due(self, now: Optional[float] = None) -> List[Hashable]:
+        """
+        Сегменты, которые пора опросить в этом раунде (в пределах бюджета).
+        Взятые сегменты снимаются с очереди до done(); не влезшие в бюджет остаются
+        просроченными и первыми уйдут в следующий раунд.
+        """
+        now = time.time() if now is None else now
+        # взятые в прошлый раунд, но без done() (раунд упал) — возвращаем в очередь
+        for key in self._inflight:
+            self._push(key, now)
+        self._inflight.clear()
+        due: List[Hashable] = []
+        while self._heap and self._heap[0][0] <= now:
+            at, _, key = heapq.heappop(self._heap)
+            if self._next.get(key) == at:
+                due.append(key)
+        if not due:
+            return []
+
+        def pending(key: Hashable) -> float:
+            _, polled_at = self.frontier.poll_state(key)
+            if polled_at is None:
+                return math.inf
+            return self._rate(key) * (now - polled_at)
+
+        due.sort(key=pending, reverse=True)
+        self._refill()
+        take = min(len(due), int(self._tokens))
+        self._tokens -= take
+        if take < len(due):
+            logger.debug("%s: poll budget allows %d of %d due segments", self.source, take, len(due))
+        for key in due[take:]:
+            self._push(key, self._next[key])
+        for key in due[:take]:
+            del self._next[key]
+        self._inflight.update(due[:take])
+        return due[:take]
+
+    def done(self, key: Hashable, new_count: Optional[int], now: Optional[float] = None) -> None:
+        """
+        Итог опроса сегмента: new_count новых — обновляем темп и ставим в очередь заново.
+        None — опрос упал: темп не трогаем, повтор через PAGER_MIN_INTERVAL.
+        """
+        now = time.time() if now is None else now
+        self._inflight.discard(key)
+        if new_count is None:
+            self.failures += 1
+            self._push(key, now + PAGER_MIN_INTERVAL)
+            return
+        self.polls += 1
+        self.frontier.record_poll(key, new_count, now)
+        self._push(key, now + self.interval(key))
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Сколько спать до следующего опроса: ближайший срок в очереди и наличие токена."""
+        now = time.time() if now is None else now
+        self._refill()
+        token_wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.budget
+        queue_wait = self._heap[0][0] - now if self._heap else float(PAGER_MAX_INTERVAL)
+        return min(float(PAGER_MAX_INTERVAL), max(0.0, queue_wait, token_wait))
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "budget_per_min": round(self.budget * 60, 2),
+            "tokens": round(self._tokens, 2),
+            "polls": self.polls,
+            "failures": self.failures,
+            "next_in": round(self._heap[0][0] - now, 1) if self._heap else None,
+            "hottest": sorted(
+                ((str(k), round(self._rate(k) * 3600, 2)) for k in self.segments),
+                key=lambda kv: kv[1], reverse=True,
+            )[:5],
+        }
@@ -0,0 +1,259 @@
+# parser/supervisor.py
+from __future__ import annotations
+import asyncio
+import bisect
+import logging
+import random
+import threading
+import time
+from threading import Event
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from config import SUPERVISOR_BACKOFF_BASE, SUPERVISOR_BACKOFF_MAX, SUPERVISOR_ROUND_BUCKETS
+from net.http_client import close_async_session_pool
+from parser.frontier import CrawlFrontier
+from parser.scheduler import PollScheduler
+
+logger = logging.getLogger("main")
+
+RoundFn = Callable[[CrawlFrontier, PollScheduler], Awaitable[None]]
+
+
+class Backoff:
+    """Пауза перед перезапуском: BASE·2^(n-1) после n падений подряд, ±20% джиттера, не больше cap."""
+
+    def __init__(self, base: float = SUPERVISOR_BACKOFF_BASE, cap: float = SUPERVISOR_BACKOFF_MAX):
+        self.base = base
+        self.cap = cap
+        self.failures = 0   # подряд
+        self.total = 0      # за всё время процесса
+
+    def fail(self) -> float:
+        self.failures += 1
+        self.total += 1
+        delay = min(self.cap, self.base * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def reset(self) -> None:
+        self.failures = 0
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными границами корзин (сек)."""
+
+    def __init__(self, bounds: Sequence[float] = SUPERVISOR_ROUND_BUCKETS):
+        self.bounds: Tuple[float, ...] = tuple(sorted(bounds))
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        labels = [f"<={b:g}s" for b in self.bounds] + [f">{self.bounds[-1]:g}s" if self.bounds else "all"]
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 2) if self.count else None,
+            "max": round(self.max, 2),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class ScrapeSource:
+    """
+    Источник для супервизора: frontier + планировщик опроса + async-раунд парсера.
+    round_fn(frontier, sched) — один раунд (парсер сам берёт сегменты у планировщика);
+    после раунда — checkpoint frontier, даже если раунд упал: в него попадают только
+    URL, подтверждённые парсером (frontier.confirm), неподтверждённые отбрасываются.
+    """
+
+    def __init__(self, name: str, segments: Sequence[Hashable], page_size: int, round_fn: RoundFn):
+        self.name = name
+        self.segments = list(segments)
+        self.page_size = page_size
+        self.round_fn = round_fn
+        self.frontier: Optional[CrawlFrontier] = None
+        self.sched: Optional[PollScheduler] = None
+
+    async def open(self) -> None:
+        frontier = CrawlFrontier(self.name)
+        await asyncio.to_thread(frontier.load)
+        self.sched = PollScheduler(self.name, frontier, self.segments, self.page_size)
+        self.frontier = frontier
+
+    async def round(self) -> None:
+        completed = False
+        try:
+            await self.round_fn(self.frontier, self.sched)
+            completed = True
+        finally:
+            # попытки объявлений считаем только в доведённом до конца раунде
+            dropped = self.frontier.discard_pending(count_attempts=completed)
+            if dropped:
+                logger.info("%s: %d unconfirmed URLs will be re-polled", self.name, dropped)
+            await asyncio.to_thread(self.frontier.checkpoint)
+
+    def delay(self) -> float:
+        return max(1.0, self.sched.wait_time())
+
+    def snapshot(self) -> dict:
+        if self.sched is None:
+            return {}
+        return {"frontier": self.frontier.snapshot(), "scheduler": self.sched.snapshot()}
+
+
+class _SourceState:
+    __slots__ = ("source", "paused", "status", "wake", "backoff", "rounds", "last_error", "next_at", "durations")
+
+    def __init__(self, source: ScrapeSource, paused: bool):
+        self.source = source
+        self.paused = paused
+        self.status = "starting"   # starting | round | idle | backoff | paused
+        self.wake = asyncio.Event()
+        self.backoff = Backoff()
+        self.rounds = 0
+        self.last_error: Optional[str] = None
+        self.next_at: Optional[float] = None
+        self.durations = Histogram()
+
+
+class ScraperSupervisor:
+    """
+    Все источники парсинга — задачи одного event loop в одном потоке:
+      - раунд источника → пауза до следующего сегмента планировщика;
+      - исключение в раунде/старте → счётчик падений и пауза с экспоненциальным backoff,
+        успешный раунд сбрасывает серию;
+      - длительности раундов — в гистограмму по источнику;
+      - pause()/resume() можно звать из любого потока (админ-команды бота): текущий раунд
+        доигрывается, дальше источник ждёт resume. Пауза переживает рестарт потока.
+    Блокирующие шаги раундов (запросы к БД) парсеры выносят из loop через asyncio.to_thread.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._paused: set = set()
+        self._states: Dict[str, _SourceState] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    # ---------- точка входа потока ----------
+    def run(self, sources: Sequence[ScrapeSource], stop_event: Event) -> None:
+        asyncio.run(self._main(sources, stop_event))
+
+    async def _main(self, sources: Sequence[ScrapeSource], stop_event: Event) -> None:
+        self._stop = asyncio.Event()
+        with self._lock:
+            self._states = {s.name: _SourceState(s, s.name in self._paused) for s in sources}
+            self._loop = asyncio.get_running_loop()
+        watcher = asyncio.create_task(self._watch_stop(stop_event))
+        logger.info("Scraper supervisor started: %s", ", ".join(self._states))
+        try:
+            await asyncio.gather(*(self._supervise(st) for st in self._states.values()))
+        finally:
+            watcher.cancel()
+            await close_async_session_pool()
+            with self._lock:
+                self._loop = None
+            logger.info("Scraper supervisor stopped")
+
+    async def _watch_stop(self, stop_event: Event) -> None:
+        while not stop_event.is_set():
+            await asyncio.sleep(1)
+        self._stop.set()
+        for st in self._states.values():
+            st.wake.set()
+
+    async def _sleep(self, st: _SourceState, delay: Optional[float]) -> None:
+        """Спит delay сек (None — до пробуждения): раньше будят stop и pause/resume."""
+        st.next_at = time.time() + delay if delay is not None else None
+        try:
+            await asyncio.wait_for(st.wake.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+        st.wake.clear()
+
+    async def _supervise(self, st: _SourceState) -> None:
+        src = st.source
+        opened = False
+        while not self._stop.is_set():
+            if st.paused:
+                st.status = "paused"
+                await self._sleep(st, None)
+                continue
+
+            st.status = "round"
+            started = time.monotonic()
+            try:
+                if not opened:
+                    await src.open()
+                    opened = True
+                await src.round()
+            except Exception as e:
+                st.last_error = f"{type(e).__name__}: {e}"
+                delay = st.backoff.fail()
+                st.status = "backoff"
+                logger.exception(
+                    "Source %s crashed (%d in a row, %d total) — retry in %.0fs",
+                    src.name, st.backoff.failures, st.backoff.total, delay)
+            else:
+                st.rounds += 1
+                st.backoff.reset()
+                delay = src.delay()
+                st.status = "idle"
+            st.durations.observe(time.monotonic() - started)
+            await self._sleep(st, delay)
+
+    # ---------- управление из других потоков ----------
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._states)
+
+    def _set_paused(self, name: str, paused: bool) -> bool:
+        with self._lock:
+            st = self._states.get(name)
+            if st is None:
+                return False
+            (self._paused.add if paused else self._paused.discard)(name)
+            loop = self._loop
+
+        def apply() -> None:
+            st.paused = paused
+            st.wake.set()
+
+        if loop is not None:
+            loop.call_soon_threadsafe(apply)
+        return True
+
+    def pause(self, name: str) -> bool:
+        """Ставит источник на паузу после текущего раунда. False — такого источника нет."""
+        return self._set_paused(name, True)
+
+    def resume(self, name: str) -> bool:
+        """Снимает паузу и сразу запускает раунд. False — такого источника нет."""
+        return self._set_paused(name, False)
+
+    def snapshot(self) -> Dict[str, dict]:
+        now = time.time()
+        with self._lock:
+            states = dict(self._states)
+        return {
+            name: {
+                "status": st.status,
+                "rounds": st.rounds,
+                "crashes": st.backoff.total,
+                "crashes_in_row": st.backoff.failures,
+                "last_error": st.last_error,
+                "next_in": round(st.next_at - now, 1) if st.next_at else None,
+                "round_sec": st.durations.snapshot(),
+                **st.source.snapshot(),
+            }
+            for name, st in states.items()
+        }
+
+
+scrapers = ScraperSupervisor()
@@ -1,17 +1,18 @@
 # parser/translater_w.py
 from __future__ import annotations
+import asyncio
 import logging
 import threading
+from datetime import datetime, timedelta, timezone
 from time import sleep
-from random import random
-from typing import Optional
 
-from sqlalchemy import select, or_
+from sqlalchemy import select, update, or_
 from sqlalchemy.orm import Session, selectinload
 
-from db.session import get_sync_session
+from db.session import get_sync_session, get_sync_tx
 from db.models import Listing, City, District
-from ai.ai_module import process_listing_one_call, translate_places
+from ai.ai_module import aprocess_listings_batch, translate_places
+from ai.translation_cache import translation_cache
 
 logger = logging.getLogger("translator")
 
@@ -21,25 +22,93 @@ ROW_SLEEP  = 0.10
 CLAIM_LIMIT_CITIES = 200
 CLAIM_LIMIT_DISTRICTS = 400
 
-LISTING_WORKERS = 4        # потоков для листингов
+LISTING_WORKERS = 4        # async-воркеров листингов (claim -> LLM -> write-back)
+LISTING_BATCH = 6          # листингов на один claim / пакетный запрос к OpenAI
 PLACES_WORKERS  = 1        # потоков для городов/районов
-OPENAI_CONCURRENCY = 3     # одновременных вызовов к OpenAI
+OPENAI_CONCURRENCY = 3     # одновременных вызовов к OpenAI (на каждый из пулов)
+LEASE_SEC = 600            # сколько листинг считается «в работе» у воркера
+RETRY_DELAY_SEC = 60       # пауза перед первым повтором листинга, который не удалось перевести;
+RETRY_MAX_DELAY_SEC = 6 * 3600  # дальше удваивается с каждой неудачей подряд, но не больше этого
+CACHE_MAINTENANCE_SEC = 3600  # как часто чистим кэш переводов и пишем его метрики
 
 
 _openai_sema = threading.Semaphore(OPENAI_CONCURRENCY)
 
 
 # ============ claim'ы ============
-def _claim_one_listing(session: Session) -> Optional[Listing]:
-    stmt = (
-        select(Listing)
-        .where(Listing.is_translated.is_(False))
-        .order_by(Listing.id.asc())
-        .options(selectinload(Listing.city), selectinload(Listing.district))
-        .limit(1)
-        .with_for_update(skip_locked=True)
-    )
-    return session.execute(stmt).scalars().first()
+def _claim_listings_batch(limit: int = LISTING_BATCH) -> tuple[datetime, list[dict]]:
+    """
+    Короткая транзакция: помечаем до `limit` непереведённых листингов арендой
+    (translate_lease_until = now + LEASE_SEC) одним UPDATE ... RETURNING и сразу коммитим.
+    Просроченная аренда (упавший воркер) снова делает листинг доступным.
+    Возвращает (токен аренды, входы для LLM) — ORM-объекты и блокировки наружу не уходят.
+    """
+    now = datetime.now(timezone.utc)
+    lease_until = now + timedelta(seconds=LEASE_SEC)
+    with get_sync_tx() as session:
+        ids_subq = (
+            select(Listing.id)
+            .where(
+                Listing.is_translated.is_(False),
+                Listing.removed_at.is_(None),
+                or_(Listing.translate_lease_until.is_(None), Listing.translate_lease_until < now),
+            )
+            .order_by(Listing.id.asc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        ids = session.execute(
+            update(Listing)
+            .where(Listing.id.in_(ids_subq))
+            .values(translate_lease_until=lease_until)
+            .returning(Listing.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if not ids:
+            return lease_until, []
+        listings = session.execute(
+            select(Listing)
+            .where(Listing.id.in_(ids))
+            .options(selectinload(Listing.city), selectinload(Listing.district))
+            .order_by(Listing.id.asc())
+        ).scalars().all()
+        return lease_until, [_build_ai_input(l) for l in listings]
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    """Пауза после attempts-й неудачи подряд: RETRY_DELAY_SEC · 2^(attempts-1), не больше RETRY_MAX_DELAY_SEC."""
+    return timedelta(seconds=min(RETRY_MAX_DELAY_SEC, RETRY_DELAY_SEC * 2 ** max(attempts - 1, 0)))
+
+
+def _write_back(lease_until: datetime, ids: list[int], results: dict) -> int:
+    """
+    Короткая транзакция записи результатов. Пишем только в строки, аренда которых всё ещё наша
+    (если она истекла и листинг забрал другой воркер — результат отбрасываем).
+    Непереведённые получают аренду на паузу, растущую с числом неудач подряд (translate_attempts),
+    чтобы не крутиться вхолостую на листинге, который стабильно не переводится.
+    """
+    now = datetime.now(timezone.utc)
+    done = 0
+    with get_sync_tx() as session:
+        listings = session.execute(
+            select(Listing)
+            .where(Listing.id.in_(ids), Listing.translate_lease_until == lease_until)
+            .with_for_update()
+        ).scalars().all()
+        for l in listings:
+            result = results.get(l.id)
+            if isinstance(result, dict) and _apply_translations(l, result):
+                l.translate_lease_until = None
+                l.translate_attempts = 0
+                done += 1
+            else:
+                l.translate_attempts = (l.translate_attempts or 0) + 1
+                l.translate_lease_until = now + _retry_delay(l.translate_attempts)
+                if l.translate_attempts > 1:
+                    logger.warning("listing %s: translation failed %d times in a row, next try at %s",
+                                   l.id, l.translate_attempts, l.translate_lease_until)
+    return done
 
 def _claim_cities_batch(session: Session, limit: int = CLAIM_LIMIT_CITIES) -> list[City]:
     stmt = (
@@ -87,11 +156,15 @@ def _build_ai_input(l: Listing) -> dict:
     city_str = getattr(getattr(l, "city", None), "name_pl", None) or ""
     distr_str = getattr(getattr(l, "district", None), "name_pl", None) or ""
     return {
+        "id": l.id,
         "title": l.title or "",
         "description": l.description or "",
         "city": city_str,
         "district": distr_str,
-        "parsed_address": l.address or ""}
+        "parsed_address": l.address or "",
+        # комнаты известны и адрес собран уверенно (улица из источника или db/pre_extract) —
+        # хватит сокращённого промпта; сырой адрес без улицы по-прежнему уточняет LLM
+        "translate_only": bool(l.rooms is not None and l.address_confident)}
 
 def _apply_translations(l: Listing, result: dict) -> bool:
     updated = False
@@ -122,50 +195,84 @@ def _apply_translations(l: Listing, result: dict) -> bool:
         if new_rooms is not None and new_rooms != l.rooms:
             l.rooms = new_rooms
 
-    if updated and not l.is_translated:
+    # перевод полный, даже если ничего не поменялось (тот же ответ, что уже записан) —
+    # иначе такой листинг вечно оставался бы «непереведённым» и возвращался в claim
+    complete = bool(
+        (not l.title or (l.title_en and l.title_uk))
+        and (not l.description or (l.description_en and l.description_uk))
+    )
+    if (updated or complete) and not l.is_translated:
         l.is_translated = True
 
-    return updated
+    return updated or complete
 
 
 # ============ worker loops ============
-def _listing_worker(stop_evt: threading.Event, name: str):
+async def _wait_stop(stop_evt: threading.Event, timeout: float) -> None:
+    """Async-сон, прерываемый stop_event (проверяем раз в секунду)."""
+    end = asyncio.get_running_loop().time() + timeout
+    while not stop_evt.is_set():
+        left = end - asyncio.get_running_loop().time()
+        if left <= 0:
+            return
+        await asyncio.sleep(min(1.0, left))
+
+
+async def _listing_worker(stop_evt: threading.Event, name: str, sema: asyncio.Semaphore):
+    """
+    claim (короткая tx) -> LLM (AsyncOpenAI, без открытых сессий/блокировок) -> write-back (короткая tx).
+    """
     logger.info("ListingWorker %s started", name)
     while not stop_evt.is_set():
-        with get_sync_session() as session:
-            listing = _claim_one_listing(session)
-            if not listing:
-                session.rollback()
-                sleep(IDLE_SLEEP)
-                continue
+        try:
+            lease_until, payload = await asyncio.to_thread(_claim_listings_batch)
+        except Exception:
+            logger.exception("[%s] claim failed", name)
+            await _wait_stop(stop_evt, IDLE_SLEEP)
+            continue
+        if not payload:
+            await _wait_stop(stop_evt, IDLE_SLEEP)
+            continue
+
+        ids = [p["id"] for p in payload]
+        try:
+            async with sema:
+                results = await aprocess_listings_batch(payload)
+        except Exception:
+            logger.exception("[%s] error translating batch ids=%s", name, ids)
+            results = {}
 
-            try:
-                payload = _build_ai_input(listing)
-                with _openai_sema:
-                    result = process_listing_one_call(payload)
-
-                if not isinstance(result, dict):
-                    logger.warning("[%s] AI returned non-dict for id=%s, rollback", name, listing.id)
-                    session.rollback()
-                    sleep(ROW_SLEEP)
-                    continue
-
-                changed = _apply_translations(listing, result)
-                if changed:
-                    session.add(listing)
-                    session.commit()
-                    logger.info("[%s] ✅ listing %s translated", name, listing.id)
-                else:
-                    session.rollback()
-                    logger.info("[%s] ℹ️ nothing to update for %s", name, listing.id)
-            except Exception:
-                logger.exception("[%s] error translating id=%s, rollback", name, getattr(listing, "id", "?"))
-                session.rollback()
+        try:
+            done = await asyncio.to_thread(_write_back, lease_until, ids, results)
+            logger.info("[%s] ✅ translated %d/%d listings", name, done, len(ids))
+        except Exception:
+            logger.exception("[%s] write-back failed for ids=%s (lease will expire)", name, ids)
 
-        sleep(ROW_SLEEP)
+        await asyncio.sleep(ROW_SLEEP)
     logger.info("ListingWorker %s stopped", name)
 
 
+async def _cache_maintenance(stop_evt: threading.Event) -> None:
+    """Периодически: метрики кэша переводов в лог + вытеснение по возрасту/размеру."""
+    while not stop_evt.is_set():
+        await _wait_stop(stop_evt, CACHE_MAINTENANCE_SEC)
+        if stop_evt.is_set():
+            break
+        try:
+            removed = await asyncio.to_thread(translation_cache.evict)
+            logger.info("Translation cache: %s, evicted %d", translation_cache.snapshot(), removed)
+        except Exception:
+            logger.exception("translation cache maintenance failed")
+
+
+async def _run_listing_pipeline(stop_evt: threading.Event, workers: int) -> None:
+    sema = asyncio.Semaphore(OPENAI_CONCURRENCY)
+    await asyncio.gather(
+        _cache_maintenance(stop_evt),
+        *(_listing_worker(stop_evt, f"L{i+1}", sema) for i in range(workers)),
+    )
+
+
 def _places_worker(stop_evt: threading.Event, name: str):
     logger.info("PlacesWorker %s started", name)
     while not stop_evt.is_set():
@@ -215,17 +322,12 @@ def start_translation_pool(stop_event: threading.Event,
                            places_workers: int = PLACES_WORKERS) -> None:
     """
     Блокирующая точка входа (под твою run_thread(...)):
-    запускает N потоков переводов листингов + M потоков перевода городов/районов
-    и держит их, пока stop_event не будет установлен.
+    запускает M потоков перевода городов/районов и asyncio-пайплайн из N воркеров
+    листингов, и держит их, пока stop_event не будет установлен.
     """
     threads: list[threading.Thread] = []
 
-    # стартуем потоки
-    for i in range(listing_workers):
-        t = threading.Thread(target=_listing_worker, args=(stop_event, f"L{i+1}"), daemon=True)
-        t.start()
-        threads.append(t)
-
+    # города/районы — редкие пакеты, остаются в потоках
     for j in range(places_workers):
         t = threading.Thread(target=_places_worker, args=(stop_event, f"P{j+1}"), daemon=True)
         t.start()
@@ -233,10 +335,9 @@ def start_translation_pool(stop_event: threading.Event,
 
     logger.info("Translator pool started: %d listing workers, %d places workers", listing_workers, places_workers)
 
-    # блокируемся до остановки
+    # листинги — asyncio-пайплайн в этом потоке; блокируемся до остановки
     try:
-        while not stop_event.is_set():
-            sleep(1.0)
+        asyncio.run(_run_listing_pipeline(stop_event, listing_workers))
     finally:
         # graceful shutdown: ждём завершения потоков
         for t in threads: